@@ -1,9 +1,12 @@
+import json
+from datetime import datetime
 from typing import Optional
 
 import click
 from loguru import logger
 
-from easylink import runner
+from easylink.configuration import CACHE_DEFAULTS, SPARK_DEFAULTS
+from easylink.utilities import cache_utils, spark_utils
 from easylink.utilities.data_utils import get_results_directory
 from easylink.utilities.general_utils import (
     configure_logging_to_terminal,
@@ -15,7 +18,10 @@ from easylink.utilities.general_utils import (
 def easylink():
     """A command line utility for running an EasyLink pipeline.
 
-    You may initiate a new run with the ``run`` sub-command.
+    You may initiate a new run with the ``run`` sub-command, plan one without
+    running anything with the ``dry-run`` sub-command, manage the
+    step output cache with the ``cache`` sub-commands and manage a long-lived
+    spark cluster with the ``spark`` sub-commands.
     """
     pass
 
@@ -51,6 +57,25 @@ def easylink():
     show_default=True,
     help="Save the results in a timestamped sub-directory of --output-dir.",
 )
+@click.option(
+    "--resume",
+    "resume_dir",
+    default=None,
+    type=click.Path(exists=True, file_okay=False, resolve_path=True),
+    help=(
+        "Resume an interrupted run in place in this existing results directory "
+        "instead of starting a new one. Completed outputs are reused and only "
+        "incomplete jobs are run."
+    ),
+)
+@click.option(
+    "--unlock",
+    is_flag=True,
+    help=(
+        "Remove the lock left on the --resume directory by a run that died "
+        "mid-pipeline. Only use this if no other run is active in that directory."
+    ),
+)
 @click.option(
     "-e",
     "--computing-environment",
@@ -59,6 +84,17 @@ def easylink():
     type=click.Path(exists=True, dir_okay=False, resolve_path=True),
     help=("Path to a computing environment yaml file on which to launch the step."),
 )
+@click.option(
+    "--retries",
+    default=0,
+    show_default=True,
+    type=click.IntRange(min=0),
+    help=(
+        "The number of times to resubmit a failed job. On slurm, each attempt "
+        "requests more memory and time according to the implementation's "
+        "'memory_growth_factor' and 'time_limit_growth_factor' resources."
+    ),
+)
 @click.option("-v", "--verbose", count=True, help="Increase logging verbosity.", hidden=True)
 @click.option(
     "--pdb",
@@ -72,17 +108,36 @@ def run(
     input_data: str,
     output_dir: Optional[str],
     timestamp: bool,
+    resume_dir: Optional[str],
+    unlock: bool,
     computing_environment: Optional[str],
+    retries: int,
     verbose: int,
     with_debugger: bool,
 ) -> None:
     """Run a pipeline from the command line."""
     configure_logging_to_terminal(verbose)
-    logger.info("Running pipeline")
-    results_dir = get_results_directory(output_dir, timestamp).as_posix()
+    if unlock and not resume_dir:
+        raise click.BadParameter(
+            "--unlock can only be used with --resume.", param_hint="--unlock"
+        )
+    if resume_dir:
+        if output_dir:
+            raise click.BadParameter(
+                "--output-dir cannot be used with --resume.", param_hint="--output-dir"
+            )
+        logger.info("Resuming pipeline")
+        results_dir = resume_dir
+    else:
+        logger.info("Running pipeline")
+        results_dir = get_results_directory(output_dir, timestamp).as_posix()
     logger.info(f"Results directory: {results_dir}")
     # TODO [MIC-4493]: Add configuration validation
 
+    # The runner (and so snakemake) is only imported once a run starts so that the
+    # other commands start quickly
+    from easylink import runner
+
     main = handle_exceptions(
         func=runner.main, exceptions_logger=logger, with_debugger=with_debugger
     )
@@ -91,5 +146,209 @@ def run(
         input_data=input_data,
         computing_environment=computing_environment,
         results_dir=results_dir,
+        resume=bool(resume_dir),
+        unlock=unlock,
+        retries=retries,
     )
     logger.info("*** FINISHED ***")
+
+
+@easylink.command(name="dry-run")
+@click.option(
+    "-p",
+    "--pipeline-specification",
+    required=True,
+    type=click.Path(exists=True, dir_okay=False, resolve_path=True),
+    help="The path to the pipeline specification yaml file.",
+)
+@click.option(
+    "-i",
+    "--input-data",
+    required=True,
+    type=click.Path(exists=True, dir_okay=False, resolve_path=True),
+    help="The path to the input data specification yaml file (not the paths to the input data themselves).",
+)
+@click.option(
+    "-e",
+    "--computing-environment",
+    default=None,
+    show_default=True,
+    type=click.Path(exists=True, dir_okay=False, resolve_path=True),
+    help=("Path to a computing environment yaml file on which to launch the step."),
+)
+@click.option(
+    "-o",
+    "--output-dir",
+    default=None,
+    type=click.Path(exists=True, file_okay=False, resolve_path=True),
+    help=(
+        "An existing results directory (e.g. of an interrupted run) to plan the run "
+        "in. If no value is passed, the run is planned in a new results directory."
+    ),
+)
+@click.option("--json", "as_json", is_flag=True, help="Print the plan as JSON.")
+@click.option("-v", "--verbose", count=True, help="Increase logging verbosity.", hidden=True)
+@click.option(
+    "--pdb",
+    "with_debugger",
+    is_flag=True,
+    help="Drop into python debugger if an error occurs.",
+    hidden=True,
+)
+def dry_run(
+    pipeline_specification: str,
+    input_data: str,
+    computing_environment: Optional[str],
+    output_dir: Optional[str],
+    as_json: bool,
+    verbose: int,
+    with_debugger: bool,
+) -> None:
+    """Plan a pipeline run without running anything.
+
+    Reports the jobs that would run and those whose outputs are already up to
+    date, the critical path through the implementations that would run and the
+    core-hours requested by their jobs.
+    """
+    configure_logging_to_terminal(verbose)
+    from easylink import runner
+
+    plan = handle_exceptions(
+        func=runner.dry_run, exceptions_logger=logger, with_debugger=with_debugger
+    )(
+        pipeline_specification=pipeline_specification,
+        input_data=input_data,
+        computing_environment=computing_environment,
+        results_dir=output_dir,
+    )
+    if as_json:
+        click.echo(json.dumps(plan, indent=2))
+        return
+    click.echo(f"Jobs to run ({len(plan['pending_jobs'])}):")
+    for job in plan["pending_jobs"]:
+        click.echo(f"  {job}")
+    click.echo(f"Jobs to restore from the cache ({len(plan['cache_hit_jobs'])}):")
+    for job in plan["cache_hit_jobs"]:
+        click.echo(f"  {job}")
+    click.echo(f"Jobs already up to date ({len(plan['up_to_date_jobs'])}):")
+    for job in plan["up_to_date_jobs"]:
+        click.echo(f"  {job}")
+    click.echo(
+        f"Outputs to (re)build: {plan['num_pending_outputs']} of {plan['num_outputs']} "
+        f"({plan['num_cached_outputs']} more to restore from the cache)"
+    )
+    click.echo(
+        f"Critical path ({plan['critical_path_hours']:g} hours): "
+        f"{' -> '.join(plan['critical_path']) or 'none'}"
+    )
+    core_hours = plan["core_hours"]
+    click.echo(
+        f"Requested core-hours: {core_hours['total']:g} (implementations: "
+        f"{core_hours['implementations']:g}, spark: {core_hours['spark']:g})"
+    )
+
+
+@easylink.group()
+def cache():
+    """Inspect and manage the step output cache shared across pipeline runs."""
+    pass
+
+
+cache_dir_option = click.option(
+    "--cache-dir",
+    default=CACHE_DEFAULTS["directory"],
+    show_default=True,
+    type=click.Path(file_okay=False, resolve_path=True),
+    help="The step output cache directory.",
+)
+
+
+@cache.command(name="ls")
+@cache_dir_option
+def cache_ls(cache_dir: str) -> None:
+    """List the entries in the step output cache, least recently used first."""
+    for entry in cache_utils.get_cache_entries(cache_dir):
+        last_used = datetime.fromtimestamp(entry["last_used"]).strftime("%Y-%m-%d %H:%M:%S")
+        click.echo(
+            f"{entry['key']}  {_format_size(entry['size']):>10}  {last_used}  "
+            f"{entry['implementation']}"
+        )
+
+
+@cache.command(name="prune")
+@cache_dir_option
+@click.option(
+    "--max-size",
+    default=CACHE_DEFAULTS["max_size"],
+    show_default=True,
+    type=float,
+    help="Evict least recently used entries until the cache is at most this size (GB).",
+)
+def cache_prune(cache_dir: str, max_size: float) -> None:
+    """Evict least recently used entries from the step output cache."""
+    evicted = cache_utils.prune_cache(cache_dir, int(max_size * 1024**3))
+    freed = sum(entry["size"] for entry in evicted)
+    click.echo(f"Evicted {len(evicted)} entries ({_format_size(freed)}).")
+
+
+@cache.command(name="stats")
+@cache_dir_option
+def cache_stats(cache_dir: str) -> None:
+    """Summarize the contents of the step output cache."""
+    stats = cache_utils.get_cache_stats(cache_dir)
+    click.echo(f"Directory: {stats['directory']}")
+    click.echo(f"Entries: {stats['num_entries']}")
+    click.echo(f"Implementations: {stats['num_implementations']}")
+    click.echo(f"Total size: {_format_size(stats['total_size'])}")
+    click.echo(f"Memoized file digests: {stats['num_memoized_digests']}")
+    click.echo(f"Resolved pipelines: {stats['num_cached_pipelines']}")
+
+
+@easylink.group()
+def spark():
+    """Manage the long-lived spark cluster started by runs with 'keep_alive: true'."""
+    pass
+
+
+cluster_dir_option = click.option(
+    "--cluster-dir",
+    default=SPARK_DEFAULTS["cluster_directory"],
+    show_default=True,
+    type=click.Path(file_okay=False, resolve_path=True),
+    help="The long-lived spark cluster directory.",
+)
+
+
+@spark.command(name="status")
+@cluster_dir_option
+def spark_status(cluster_dir: str) -> None:
+    """Report whether a long-lived spark cluster is running."""
+    state = spark_utils.get_cluster_state(cluster_dir)
+    if state is None:
+        click.echo("No spark cluster is running.")
+        return
+    started = datetime.fromtimestamp(state["started"]).strftime("%Y-%m-%d %H:%M:%S")
+    healthy = spark_utils.is_cluster_healthy(cluster_dir)
+    click.echo(f"Master URL: {state['master_url']}")
+    click.echo(f"Web UI: {state.get('web_ui_url') or 'unknown'}")
+    click.echo(f"Workers: {state['num_workers']}")
+    click.echo(f"Started: {started} (on {state['host']}, pid {state['pid']})")
+    click.echo(f"Status: {'healthy' if healthy else 'unreachable'}")
+
+
+@spark.command(name="stop")
+@cluster_dir_option
+def spark_stop(cluster_dir: str) -> None:
+    """Stop the long-lived spark cluster."""
+    if spark_utils.stop_cluster(cluster_dir):
+        click.echo("Stopping spark cluster.")
+    else:
+        click.echo("No spark cluster is running.")
+
+
+def _format_size(num_bytes: float) -> str:
+    for unit in ["B", "KB", "MB", "GB"]:
+        if num_bytes < 1024:
+            return f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f} TB"
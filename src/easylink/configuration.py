@@ -4,9 +4,12 @@ from typing import Any, Dict, List, Optional, Union
 
 from layered_config_tree import LayeredConfigTree
 
-from easylink.pipeline_schema import PIPELINE_SCHEMAS, PipelineSchema
-from easylink.utilities.data_utils import load_yaml
+from easylink import pipeline_schema
+from easylink.implementation import validate_resources
+from easylink.pipeline_schema import PipelineSchema
+from easylink.utilities.data_utils import INTERMEDIATE_FORMATS, load_yaml
 from easylink.utilities.general_utils import exit_with_validation_error
+from easylink.utilities.paths import EASYLINK_CACHE, EASYLINK_SPARK_CLUSTER
 
 PIPELINE_ERRORS_KEY = "PIPELINE ERRORS"
 INPUT_DATA_ERRORS_KEY = "INPUT DATA ERRORS"
@@ -20,9 +23,19 @@ DEFAULT_ENVIRONMENT = {
             "memory": 1,  # GB
             "cpus": 1,
             "time_limit": 1,  # hours
+            # Multiplier applied to memory/time_limit on each retry of a failed job
+            "memory_growth_factor": 1,
+            "time_limit_growth_factor": 1,
         },
+        # Default format of data passed between implementations
+        "intermediate_format": "parquet",
+        # Granularity of input validation jobs; see VALIDATION_BATCHING
+        "validation_batching": "slot",
     }
 }
+# One validation job per input slot, per implementation or per topological level
+# of the pipeline graph
+VALIDATION_BATCHING = ["slot", "node", "level"]
 SPARK_DEFAULTS = {
     "workers": {
         "num_workers": 2,
@@ -30,7 +43,20 @@ SPARK_DEFAULTS = {
         "mem_per_node": 1,  # GB
         "time_limit": 1,  # hours
     },
+    # Leave the cluster running after the pipeline finishes so that later runs can
+    # attach to it; see `easylink spark`
     "keep_alive": False,
+    "cluster_directory": str(EASYLINK_SPARK_CLUSTER),
+    # Cluster readiness polling (seconds)
+    "master_timeout": 210,
+    "worker_timeout": 420,
+    "poll_interval": 0.1,
+    "max_poll_interval": 5,
+}
+CACHE_DEFAULTS = {
+    "enabled": False,
+    "directory": str(EASYLINK_CACHE),
+    "max_size": 100,  # GB
 }
 
 # Allow some buffer so that slurm doesn't kill spark workers
@@ -81,6 +107,16 @@ def _load_computing_environment(
         return load_yaml(computing_environment_specification_path)
 
 
+def get_cache_dir(environment: Dict[str, Any]) -> Optional[Path]:
+    """The step output cache directory of a computing environment specification, or
+    None if caching is disabled. Unlike ``Config.cache_dir``, it is available before
+    the pipeline is resolved."""
+    cache = {**CACHE_DEFAULTS, **(environment.get("cache") or {})}
+    if not cache["enabled"]:
+        return None
+    return Path(cache["directory"]).expanduser().resolve()
+
+
 class Config(LayeredConfigTree):
     """A container for configuration information where each value is exposed
     as an attribute. This class combines the pipeline, input data, and computing
@@ -91,17 +127,24 @@ class Config(LayeredConfigTree):
     def __init__(
         self,
         config_params: Dict[str, Any],
+        schema: Optional[PipelineSchema] = None,
     ):
+        """If the schema that the pipeline specification matches is already known
+        (e.g. from a cached, previously resolved pipeline), it can be passed to skip
+        matching the pipeline against each supported schema."""
         super().__init__(layers=["initial_data", "default", "user_configured"])
         self.update(DEFAULT_ENVIRONMENT, layer="default")
         self.update(config_params, layer="user_configured")
         self.update({"environment": {"spark": SPARK_DEFAULTS}}, layer="default")
+        self.update({"environment": {"cache": CACHE_DEFAULTS}}, layer="default")
         if self.environment.computing_environment == "slurm":
             # Set slurm defaults to empty dict instead of None so that we don't get errors
             # In slurm resources property
             self.update({"environment": {"slurm": {}}}, layer="default")
 
-        self.update({"schema": self._get_schema()}, layer="initial_data")
+        if schema is None:
+            schema = self._get_schema()
+        self.update({"schema": schema}, layer="initial_data")
         self._validate()
         self.freeze()
 
@@ -123,15 +166,121 @@ class Config(LayeredConfigTree):
         """A dictionary of spark configuration settings."""
         return self.environment.spark.to_dict()
 
+    @property
+    def spark_cluster_dir(self) -> Optional[Path]:
+        """The directory of the long-lived spark cluster, or None if the spark
+        cluster is not kept alive between runs."""
+        if not self.spark["keep_alive"]:
+            return None
+        return Path(self.spark["cluster_directory"]).expanduser().resolve()
+
+    @property
+    def cache(self) -> Dict[str, Any]:
+        """A dictionary of step output cache settings."""
+        return self.environment.cache.to_dict()
+
+    @property
+    def cache_dir(self) -> Optional[Path]:
+        """The step output cache directory, or None if caching is disabled."""
+        return get_cache_dir(self.environment.to_dict())
+
     @property
     def slurm_resources(self) -> Dict[str, str]:
         """Return the slurm resources as a flat dictionary in format required by snakemake."""
         if not self.computing_environment == "slurm":
             return {}
+        return self._format_slurm_resources(self._get_raw_slurm_resources())
+
+    def get_implementation_resources(
+        self, implementation_resources: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, str]:
+        """Return the slurm resources of a single implementation as a flat dictionary
+        in format required by snakemake.
+
+        Any implementation-specific resources (memory, cpus, time_limit, partition
+        and growth factors) take precedence over the environment's
+        ``implementation_resources`` and ``slurm`` settings. If a memory or
+        time_limit growth factor other than 1 is requested, the corresponding
+        resource is a callable of the snakemake job attempt so that a job that is
+        retried (e.g. after running out of memory) requests more of it.
+        """
+        if not self.computing_environment == "slurm":
+            return {}
+        return self._get_slurm_resources(
+            self._get_raw_slurm_resources(implementation_resources)
+        )
+
+    def get_fused_implementation_resources(
+        self, implementations_resources: List[Dict[str, Any]]
+    ) -> Dict[str, str]:
+        """Return the slurm resources of a single job that runs several implementations
+        back-to-back, i.e. the most memory and cpus and the total time limit of any
+        of them."""
+        if not self.computing_environment == "slurm":
+            return {}
+        raw_resources = [
+            self._get_raw_slurm_resources(implementation_resources)
+            for implementation_resources in implementations_resources
+        ]
         raw_slurm_resources = {
-            **self.slurm,
-            **self.environment.implementation_resources.to_dict(),
+            **raw_resources[0],
+            "memory": max(resources["memory"] for resources in raw_resources),
+            "cpus": max(resources["cpus"] for resources in raw_resources),
+            "time_limit": sum(resources["time_limit"] for resources in raw_resources),
         }
+        for growth_factor_key in ["memory_growth_factor", "time_limit_growth_factor"]:
+            raw_slurm_resources[growth_factor_key] = max(
+                resources.get(growth_factor_key, 1) for resources in raw_resources
+            )
+        return self._get_slurm_resources(raw_slurm_resources)
+
+    def get_core_hours(self, implementations_resources: List[Dict[str, Any]]) -> float:
+        """Return the core-hours requested by (the first attempt of) a single job that
+        runs one or more implementations back-to-back; see
+        ``get_fused_implementation_resources``."""
+        raw_resources = [
+            self._get_raw_slurm_resources(implementation_resources)
+            for implementation_resources in implementations_resources
+        ]
+        return max(resources["cpus"] for resources in raw_resources) * sum(
+            resources["time_limit"] for resources in raw_resources
+        )
+
+    def get_requested_resources(
+        self, implementation_resources: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Return the memory (GB), cpus and time limit (hours) requested by (the first
+        attempt of) an implementation, whatever the computing environment."""
+        return self._get_raw_slurm_resources(implementation_resources)
+
+    def _get_slurm_resources(self, raw_slurm_resources: Dict[str, Any]) -> Dict[str, str]:
+        resources = self._format_slurm_resources(raw_slurm_resources)
+        for resource, growth_factor_key in [
+            ("mem_mb", "memory_growth_factor"),
+            ("runtime", "time_limit_growth_factor"),
+        ]:
+            growth_factor = raw_slurm_resources.get(growth_factor_key, 1)
+            if growth_factor != 1:
+                resources[resource] = (
+                    f"lambda wildcards, attempt: "
+                    f"int({resources[resource]} * {growth_factor} ** (attempt - 1))"
+                )
+        return resources
+
+    def _get_raw_slurm_resources(
+        self, implementation_resources: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        resources = LayeredConfigTree(layers=["environment", "implementation"])
+        resources.update(
+            {**self.slurm, **self.environment.implementation_resources.to_dict()},
+            layer="environment",
+        )
+        if implementation_resources:
+            resources.update(implementation_resources, layer="implementation")
+        return resources.to_dict()
+
+    @staticmethod
+    def _format_slurm_resources(raw_slurm_resources: Dict[str, Any]) -> Dict[str, str]:
         return {
             "slurm_account": f"'{raw_slurm_resources.get('account')}'",
             "slurm_partition": f"'{raw_slurm_resources.get('partition')}'",
@@ -159,6 +308,12 @@ class Config(LayeredConfigTree):
             **{k: v for k, v in self.spark.items() if k != "workers"},
         }
 
+    @property
+    def spark_core_hours(self) -> float:
+        """Return the core-hours requested by a spark cluster, i.e. its master and workers."""
+        workers = self.spark["workers"]
+        return (workers["num_workers"] + 1) * workers["cpus_per_node"] * workers["time_limit"]
+
     #################
     # Setup Methods #
     #################
@@ -168,16 +323,15 @@ class Config(LayeredConfigTree):
         NOTE: this acts as the pipeline configuration file's validation method since
         we can only find a matching schema if the file is valid.
         """
-        errors = defaultdict(dict)
-        # Try each schema until one is validated
-        for schema in PIPELINE_SCHEMAS:
-            logs = schema.validate_step(self.pipeline)
-            if logs:
-                errors[PIPELINE_ERRORS_KEY][schema.name] = logs
-                pass  # try the next schema
-            else:
+        # Only schemas with exactly the configured top-level steps can match
+        for schema in pipeline_schema.get_candidate_schemas(self.pipeline):
+            if not schema.validate_step(self.pipeline):
                 return schema
-        # No schemas were validated
+        # No schemas were validated; only now find out why not for those that the
+        # pipeline was most likely meant for
+        errors = defaultdict(dict)
+        for schema in pipeline_schema.get_closest_schemas(self.pipeline):
+            errors[PIPELINE_ERRORS_KEY][schema.name] = schema.validate_step(self.pipeline)
         exit_with_validation_error(dict(errors))
 
     def _validate(self) -> None:
@@ -204,6 +358,24 @@ class Config(LayeredConfigTree):
                 f"The value '{self.environment.container_engine}' is not supported."
             ]
 
+        if self.environment.intermediate_format not in INTERMEDIATE_FORMATS:
+            errors[ENVIRONMENT_ERRORS_KEY]["intermediate_format"] = [
+                f"The value '{self.environment.intermediate_format}' is not supported. "
+                f"Supported formats are: {list(INTERMEDIATE_FORMATS)}."
+            ]
+
+        if self.environment.validation_batching not in VALIDATION_BATCHING:
+            errors[ENVIRONMENT_ERRORS_KEY]["validation_batching"] = [
+                f"The value '{self.environment.validation_batching}' is not supported. "
+                f"Supported values are: {VALIDATION_BATCHING}."
+            ]
+
+        resource_errors = validate_resources(
+            self.environment.implementation_resources.to_dict()
+        )
+        if resource_errors:
+            errors[ENVIRONMENT_ERRORS_KEY]["implementation_resources"] = resource_errors
+
         if self.environment.computing_environment == "slurm" and not self.environment.slurm:
             errors[ENVIRONMENT_ERRORS_KEY]["slurm"] = [
                 "The environment configuration file must include a 'slurm' key "
@@ -4,11 +4,19 @@ from typing import Callable, Optional
 
 @dataclass
 class InputSlot:
-    """InputSlot  represents a single input slot for a step."""
+    """InputSlot  represents a single input slot for a step.
+
+    The validator is called with the path of each file passed to the slot and
+    raises an error if it is invalid. It can be a function or a TableSchema.
+
+    A slot that is not required may be left unfilled by the input data, in which
+    case its environment variable is not set.
+    """
 
     name: str
     env_var: Optional[str]
     validator: Callable
+    required: bool = True
 
 
 @dataclass
@@ -1,10 +1,142 @@
+import os
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from layered_config_tree import LayeredConfigTree
 
 from easylink.utilities import paths
-from easylink.utilities.data_utils import load_yaml
+from easylink.utilities.data_utils import INTERMEDIATE_FORMATS, load_yaml
+
+# Resources that can be requested per implementation
+RESOURCE_KEYS = [
+    "memory",
+    "cpus",
+    "time_limit",
+    "partition",
+    "memory_growth_factor",
+    "time_limit_growth_factor",
+]
+# Additional directories of implementation metadata yaml files (separated by
+# os.pathsep), e.g. for site-specific implementations
+METADATA_DIRS_ENV_VAR = "EASYLINK_IMPLEMENTATION_METADATA_DIRS"
+
+
+def validate_resources(resources: Dict[str, Any]) -> List[str]:
+    """Validate the resources requested by an implementation, or by default for
+    every implementation by the computing environment's ``implementation_resources``."""
+    logs = []
+    for key, value in resources.items():
+        if key not in RESOURCE_KEYS:
+            logs.append(
+                f"Resource '{key}' is not supported. Supported resources are: {RESOURCE_KEYS}."
+            )
+        elif key == "partition":
+            if not isinstance(value, str):
+                logs.append("Resource 'partition' must be a string.")
+        elif isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+            logs.append(f"Resource '{key}' must be a positive number.")
+        elif key.endswith("_growth_factor") and value < 1:
+            logs.append(f"Resource '{key}' must be at least 1.")
+    return logs
+
+
+class ImplementationRegistry:
+    """
+    The metadata of every supported implementation, indexed by implementation name
+    and by step.
+
+    Metadata is loaded lazily, once per process, from easylink's own
+    implementation_metadata.yaml and any yaml files in additional metadata
+    directories (see ``METADATA_DIRS_ENV_VAR`` and ``add_metadata_directory``). If
+    ``check_mtime`` is True, it is reloaded whenever any of these files change.
+    """
+
+    def __init__(self, check_mtime: bool = True):
+        self.check_mtime = check_mtime
+        self._metadata_directories: List[Path] = []
+        self._metadata: Optional[Dict[str, Dict[str, Any]]] = None
+        self._steps: Dict[str, List[str]] = {}
+        self._file_stats: Dict[Path, Tuple[int, int]] = {}
+
+    @property
+    def metadata_files(self) -> List[Path]:
+        """The implementation metadata files, in the order they are loaded."""
+        directories = self._metadata_directories + [
+            Path(directory)
+            for directory in os.environ.get(METADATA_DIRS_ENV_VAR, "").split(os.pathsep)
+            if directory
+        ]
+        return [paths.IMPLEMENTATION_METADATA] + [
+            file for directory in directories for file in sorted(directory.glob("*.yaml"))
+        ]
+
+    @property
+    def metadata(self) -> Dict[str, Dict[str, Any]]:
+        """The metadata of every implementation, keyed by implementation name."""
+        self._refresh()
+        return self._metadata
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.metadata)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.metadata
+
+    def get(self, name: str) -> Dict[str, Any]:
+        """Get the metadata of an implementation."""
+        return self.metadata[name]
+
+    def get_step_implementations(self, step_name: str) -> List[str]:
+        """Get the names of the implementations of a step."""
+        self._refresh()
+        return self._steps.get(step_name, [])
+
+    def add_metadata_directory(self, directory: Path) -> None:
+        """Add a directory of implementation metadata yaml files."""
+        self._metadata_directories.append(Path(directory))
+        self.clear()
+
+    def clear(self) -> None:
+        """Forget any loaded metadata so that it is reloaded on next use."""
+        self._metadata = None
+
+    def _refresh(self) -> None:
+        if self._metadata is None or (self.check_mtime and self._is_stale()):
+            self._load()
+
+    def _load(self) -> None:
+        metadata = {}
+        sources = {}
+        file_stats = {}
+        for file in self.metadata_files:
+            file_stats[file] = self._get_file_stat(file)
+            for name, implementation_metadata in (load_yaml(file) or {}).items():
+                if name in metadata:
+                    raise ValueError(
+                        f"Implementation '{name}' is defined in both {sources[name]} "
+                        f"and {file}."
+                    )
+                metadata[name] = implementation_metadata
+                sources[name] = file
+        steps = {}
+        for name, implementation_metadata in metadata.items():
+            steps.setdefault(implementation_metadata.get("step"), []).append(name)
+        self._metadata, self._steps, self._file_stats = metadata, steps, file_stats
+
+    def _is_stale(self) -> bool:
+        files = self.metadata_files
+        return list(self._file_stats) != files or any(
+            self._get_file_stat(file) != stat for file, stat in self._file_stats.items()
+        )
+
+    @staticmethod
+    def _get_file_stat(file: Path) -> Tuple[int, int]:
+        stat = file.stat()
+        return stat.st_mtime_ns, stat.st_size
+
+
+IMPLEMENTATION_REGISTRY = ImplementationRegistry()
 
 
 class Implementation:
@@ -18,6 +150,14 @@ class Implementation:
     def __init__(self, step_name: str, implementation_config: LayeredConfigTree):
         self.name = implementation_config.name
         self.environment_variables = implementation_config.to_dict().get("configuration", {})
+        self.partitioning = implementation_config.to_dict().get("partitioning", {})
+        self._resources = implementation_config.to_dict().get("resources", {})
+        # Overrides the environment's default intermediate format for this
+        # implementation's outputs
+        self.intermediate_format = implementation_config.to_dict().get("intermediate_format")
+        # Whether this implementation may be run back-to-back with adjacent
+        # implementations that use the same container in a single job
+        self.fuse = implementation_config.to_dict().get("fuse", False)
         self._metadata = self._load_metadata()
         self.metadata_step_name = self._metadata["step"]
         self.schema_step_name = step_name
@@ -33,6 +173,10 @@ class Implementation:
         logs = []
         logs = self._validate_expected_step(logs)
         logs = self._validate_container_exists(logs)
+        logs = self._validate_partitioning(logs)
+        logs = self._validate_resources(logs)
+        logs = self._validate_intermediate_format(logs)
+        logs = self._validate_fuse(logs)
         return logs
 
     ##################
@@ -40,8 +184,7 @@ class Implementation:
     ##################
 
     def _load_metadata(self) -> Dict[str, str]:
-        metadata = load_yaml(paths.IMPLEMENTATION_METADATA)
-        return metadata[self.name]
+        return IMPLEMENTATION_REGISTRY.get(self.name)
 
     def _validate_expected_step(self, logs: List[Optional[str]]) -> List[Optional[str]]:
         if self.metadata_step_name != self.schema_step_name:
@@ -57,6 +200,45 @@ class Implementation:
             logs.append(err_str)
         return logs
 
+    def _validate_partitioning(self, logs: List[Optional[str]]) -> List[Optional[str]]:
+        if not self.partitioning:
+            return logs
+        if not isinstance(self.partitioning.get("key_column"), str):
+            logs.append("Partitioning requires a 'key_column' to partition on.")
+        num_partitions = self.partitioning.get("num_partitions")
+        if not isinstance(num_partitions, int) or num_partitions < 1:
+            logs.append("Partitioning requires 'num_partitions' to be a positive integer.")
+        if self.requires_spark:
+            logs.append("Implementations that require spark cannot be partitioned.")
+        return logs
+
+    def _validate_resources(self, logs: List[Optional[str]]) -> List[Optional[str]]:
+        return logs + validate_resources(self.resources)
+
+    def _validate_intermediate_format(self, logs: List[Optional[str]]) -> List[Optional[str]]:
+        if self.intermediate_format and self.intermediate_format not in INTERMEDIATE_FORMATS:
+            logs.append(
+                f"Intermediate format '{self.intermediate_format}' is not supported. "
+                f"Supported formats are: {list(INTERMEDIATE_FORMATS)}."
+            )
+        return logs
+
+    def _validate_fuse(self, logs: List[Optional[str]]) -> List[Optional[str]]:
+        if not isinstance(self.fuse, bool):
+            logs.append("'fuse' must be either true or false.")
+        return logs
+
+    @property
+    def resources(self) -> Dict[str, Any]:
+        """The resources requested by this implementation. Those defined in the
+        pipeline specification take precedence over the implementation's metadata
+        defaults; anything not defined falls back to the environment's
+        ``implementation_resources``."""
+        resources = LayeredConfigTree(layers=["metadata", "pipeline"])
+        resources.update(self._metadata.get("resources", {}), layer="metadata")
+        resources.update(self._resources, layer="pipeline")
+        return resources.to_dict()
+
     @property
     def singularity_image_path(self) -> str:
         return self._metadata["image_path"]
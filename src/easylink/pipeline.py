@@ -1,26 +1,53 @@
+import os
+import pprint
 from collections import defaultdict
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 from loguru import logger
 
 from easylink.configuration import Config
+from easylink.implementation import Implementation
 from easylink.pipeline_graph import PipelineGraph
-from easylink.rule import ImplementedRule, InputValidationRule, TargetRule
+from easylink.rule import (
+    SCATTERITEM,
+    BatchedInputValidationRule,
+    CacheKeyRule,
+    FusedImplementedRule,
+    GatherRule,
+    ImplementedRule,
+    InputValidationRule,
+    ScatterRule,
+    TargetRule,
+)
+from easylink.utilities import cache_utils
 from easylink.utilities.general_utils import exit_with_validation_error
 from easylink.utilities.paths import SPARK_SNAKEFILE
-from easylink.utilities.validation_utils import validate_input_file_dummy
+from easylink.utilities.spark_utils import CLUSTER_STATE_FILE, is_cluster_healthy
 
 
 class Pipeline:
     """Abstraction to handle pipeline specification and execution."""
 
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, pipeline_graph: Optional[PipelineGraph] = None):
+        """A previously resolved pipeline graph (e.g. from the pipeline cache) can be
+        passed to skip building it from the configuration."""
         self.config = config
-        self.pipeline_graph = PipelineGraph(config)
+        self.pipeline_graph = (
+            PipelineGraph(config) if pipeline_graph is None else pipeline_graph
+        )
         self.spark_is_required = self.pipeline_graph.spark_is_required()
         # TODO [MIC-4880]: refactor into validation object
         self._validate()
+        self.fused_chains = self.pipeline_graph.get_fused_chains()
+        if self.fused_chains and self.config.cache_dir:
+            # Cache keys are per implementation and so fused implementations are not cached
+            logger.warning(
+                f"Not fusing implementations {self.fused_chains} because the output "
+                "cache is enabled; implementations are only cached when run as "
+                "separate jobs."
+            )
+            self.fused_chains = []
 
     def _validate(self) -> None:
         """Validates the pipeline."""
@@ -47,18 +74,134 @@ class Pipeline:
         if self.snakefile_path.is_file():
             logger.warning("Snakefile already exists, overwriting.")
             self.snakefile_path.unlink()
+        self.create_diagnostics_directories()
         self.write_imports()
         self.write_config()
         self.write_target_rules()
         if self.spark_is_required:
-            self.write_spark_module()
+            if self.config.spark_cluster_dir:
+                self.write_spark_attach_rules()
+            else:
+                self.write_spark_module()
+        if self.config.environment.validation_batching != "slot":
+            self.write_batched_validation_rules()
+        self.run_report_jobs = {}
         for node in self.pipeline_graph.implementation_nodes:
-            self.write_implementation_rules(node)
+            chain = self._get_fused_chain(node)
+            if not chain:
+                self.write_implementation_rules(node)
+            elif node == chain[0]:
+                self.write_fused_implementation_rules(chain)
+        self.write_run_report_handlers()
         return self.snakefile_path
 
+    def create_diagnostics_directories(self) -> None:
+        """Create the directory each implementation writes its diagnostics to. This
+        must also be done when a previously built Snakefile is reused."""
+        for node in self.pipeline_graph.implementation_nodes:
+            (Path("diagnostics") / node).mkdir(parents=True, exist_ok=True)
+
+    def get_plan(self, pending_outputs: Set[str]) -> Dict[str, Any]:
+        """Estimate the cost of (re)building the given outputs (relative to the
+        results directory).
+
+        Returns the implementations that would run, the critical path through them
+        and its length in hours of requested time limits as well as the core-hours
+        requested by their jobs and by any spark cluster that would be started.
+        """
+        pending_outputs = {os.path.normpath(output) for output in pending_outputs}
+        durations = {}
+        implementation_core_hours = 0
+        requires_spark = False
+        for node in self.pipeline_graph.implementation_nodes:
+            chain = self._get_fused_chain(node) or [node]
+            # Only the final outputs of a fused chain are ever written to the results directory
+            _, output_files = self.pipeline_graph.get_input_output_files(chain[-1])
+            if not pending_outputs.intersection(map(os.path.normpath, output_files)):
+                continue
+            implementation = self.pipeline_graph.nodes[node]["implementation"]
+            durations[node] = self.config.get_requested_resources(implementation.resources)[
+                "time_limit"
+            ]
+            requires_spark |= implementation.requires_spark
+            if node == chain[0]:
+                implementation_core_hours += self.config.get_core_hours(
+                    [self.pipeline_graph.nodes[n]["implementation"].resources for n in chain]
+                ) * implementation.partitioning.get("num_partitions", 1)
+        spark_core_hours = (
+            self.config.spark_core_hours
+            if requires_spark
+            and not (
+                self.config.spark_cluster_dir
+                and is_cluster_healthy(self.config.spark_cluster_dir)
+            )
+            else 0
+        )
+        critical_path, critical_path_hours = self.pipeline_graph.get_critical_path(durations)
+        return {
+            "implementations": list(durations),
+            "critical_path": [node for node in critical_path if node in durations],
+            "critical_path_hours": critical_path_hours,
+            "core_hours": {
+                "implementations": implementation_core_hours,
+                "spark": spark_core_hours,
+                "total": implementation_core_hours + spark_core_hours,
+            },
+        }
+
+    def get_cache_hits(self, pending_outputs: Set[str], results_dir: Path) -> List[str]:
+        """Get the implementations whose pending outputs (relative to the results
+        directory) would be restored from the step output cache rather than built.
+
+        A cache key can only be computed once all of an implementation's inputs are
+        known, i.e. they are up to date in the results directory or would
+        themselves be restored from the cache. Partitioned implementations are
+        cached per shard and so are never reported as hits.
+        """
+        if not self.config.cache_dir:
+            return []
+        pending_outputs = {os.path.normpath(output) for output in pending_outputs}
+        # The cached copies of the outputs that would be restored
+        restored_outputs = {}
+        cache_hits = []
+        for node in self.pipeline_graph.implementation_nodes:
+            implementation = self.pipeline_graph.nodes[node]["implementation"]
+            input_files, output_files = self.pipeline_graph.get_input_output_files(node)
+            if (
+                implementation.partitioning
+                or not Path(implementation.singularity_image_path).exists()
+                or not pending_outputs.intersection(map(os.path.normpath, output_files))
+            ):
+                continue
+            input_paths = []
+            for file in map(os.path.normpath, input_files):
+                path = restored_outputs.get(file, results_dir / file)
+                if (
+                    file in pending_outputs and file not in restored_outputs
+                ) or not path.exists():
+                    break
+                input_paths.append(str(path))
+            else:
+                key = cache_utils.get_cache_key(
+                    input_paths,
+                    self.config.cache_dir,
+                    implementation.singularity_image_path,
+                    implementation.script_cmd,
+                    self._get_environment_variables(node),
+                    output_files,
+                )
+                entry = cache_utils.get_complete_entry(self.config.cache_dir, key)
+                if entry:
+                    cache_hits.append(node)
+                    for file in output_files:
+                        restored_outputs[os.path.normpath(file)] = entry / Path(file).name
+        return cache_hits
+
     def write_imports(self) -> None:
         with open(self.snakefile_path, "a") as f:
-            f.write("from easylink.utilities import validation_utils")
+            f.write(
+                "from easylink.utilities import cache_utils, partition_utils, report_utils, spark_utils, validation_utils"
+            )
 
     def write_target_rules(self) -> None:
         """Write the rule for the final output and its validation"""
@@ -70,13 +213,20 @@ class Pipeline:
         target_rule = TargetRule(
             target_files=final_output,
             validation=validator_file,
-            requires_spark=self.spark_is_required,
+            # A long-lived spark cluster is not shut down by the pipeline
+            requires_spark=self.spark_is_required and not self.config.spark_cluster_dir,
+            output_directories=[
+                directory
+                for node in self.pipeline_graph.implementation_nodes
+                for directory in self.pipeline_graph.get_output_directories(node)
+                if directory in final_output
+            ],
         )
         final_validation = InputValidationRule(
             name="results",
             input=final_output,
             output=validator_file,
-            validator=validate_input_file_dummy,
+            validator=self.pipeline_graph.get_results_validator(),
         )
         target_rule.write_to_snakefile(self.snakefile_path)
         final_validation.write_to_snakefile(self.snakefile_path)
@@ -87,54 +237,332 @@ class Pipeline:
         input_files, output_files = self.pipeline_graph.get_input_output_files(node)
         input_slots = self.pipeline_graph.get_input_slots(node)
         diagnostics_dir = Path("diagnostics") / node
-        diagnostics_dir.mkdir(parents=True, exist_ok=True)
         resources = (
-            self.config.slurm_resources
+            self.config.get_implementation_resources(implementation.resources)
             if self.config.computing_environment == "slurm"
             else None
         )
         validation_files, validation_rules = self.get_validations(node)
+        if self.config.environment.validation_batching == "slot":
+            for validation_rule in validation_rules:
+                validation_rule.write_to_snakefile(self.snakefile_path)
+
+        output_directories = self.pipeline_graph.get_output_directories(node)
+        rule_input_files, rule_output_files = input_files, output_files
+        rule_output_directories = output_directories
+        if implementation.partitioning:
+            # Run the implementation once per shard of its (partitioned) inputs
+            shard_input_files = {
+                file: str(
+                    Path("intermediate")
+                    / node
+                    / "partitions"
+                    / "input"
+                    / SCATTERITEM
+                    / f"{i}_{Path(file).stem}.parquet"
+                )
+                for i, file in enumerate(input_files)
+            }
+            shard_output_files = [
+                str(
+                    Path("intermediate")
+                    / node
+                    / "partitions"
+                    / "output"
+                    / SCATTERITEM
+                    / Path(file).name
+                )
+                for file in output_files
+            ]
+            input_slots = {
+                slot: [shard_input_files[file] for file in files]
+                for slot, files in input_slots.items()
+            }
+            diagnostics_dir = diagnostics_dir / SCATTERITEM
+            rule_input_files = list(shard_input_files.values())
+            rule_output_files = shard_output_files
+            rule_output_directories = [
+                shard_file
+                for file, shard_file in zip(output_files, shard_output_files)
+                if file in output_directories
+            ]
+            ScatterRule(
+                name=node,
+                input=input_files,
+                output=rule_input_files,
+                key_column=implementation.partitioning["key_column"],
+            ).write_to_snakefile(self.snakefile_path)
+
+        envvars = self._get_environment_variables(node)
+        cache_dir = str(self.config.cache_dir) if self.config.cache_dir else None
         implementation_rule = ImplementedRule(
             step_name=implementation.schema_step_name,
             implementation_name=implementation.name,
             input_slots=input_slots,
             validations=validation_files,
-            output=output_files,
+            output=rule_output_files,
             resources=resources,
-            envvars=implementation.environment_variables,
+            envvars=envvars,
             diagnostics_dir=str(diagnostics_dir),
             image_path=implementation.singularity_image_path,
             script_cmd=implementation.script_cmd,
             requires_spark=implementation.requires_spark,
+            cache_dir=cache_dir,
+            output_directories=rule_output_directories,
         )
-        for validation_rule in validation_rules:
-            validation_rule.write_to_snakefile(self.snakefile_path)
+        if cache_dir:
+            CacheKeyRule(
+                name=implementation.name,
+                input=rule_input_files,
+                output=implementation_rule.cache_key_file,
+                cache_dir=cache_dir,
+                image_path=implementation.singularity_image_path,
+                script_cmd=implementation.script_cmd,
+                envvars=envvars,
+                outputs=rule_output_files,
+            ).write_to_snakefile(self.snakefile_path)
         implementation_rule.write_to_snakefile(self.snakefile_path)
+        self._add_run_report_job(
+            implementation_rule.implementation_name,
+            implementation_rule.benchmark_file,
+            [implementation],
+        )
+        if implementation.partitioning:
+            GatherRule(
+                name=node,
+                input=rule_output_files,
+                output=output_files,
+                output_directories=output_directories,
+            ).write_to_snakefile(self.snakefile_path)
+
+    def write_fused_implementation_rules(self, chain: List[str]) -> None:
+        """Write a single rule running a chain of implementations back-to-back,
+        along with the validations of the chain's inputs. Files passed between the
+        implementations of the chain are not validated."""
+        rules = []
+        validation_files = []
+        for node in chain:
+            implementation = self.pipeline_graph.nodes[node]["implementation"]
+            _, output_files = self.pipeline_graph.get_input_output_files(node)
+            diagnostics_dir = Path("diagnostics") / node
+            node_validation_files, validation_rules = self.get_validations(node)
+            if self.config.environment.validation_batching == "slot":
+                for validation_rule in validation_rules:
+                    validation_rule.write_to_snakefile(self.snakefile_path)
+            validation_files.extend(node_validation_files)
+            rules.append(
+                ImplementedRule(
+                    step_name=implementation.schema_step_name,
+                    implementation_name=implementation.name,
+                    input_slots=self.pipeline_graph.get_input_slots(node),
+                    validations=node_validation_files,
+                    output=output_files,
+                    resources=None,
+                    envvars=self._get_environment_variables(node),
+                    diagnostics_dir=str(diagnostics_dir),
+                    image_path=implementation.singularity_image_path,
+                    script_cmd=implementation.script_cmd,
+                    requires_spark=False,
+                    output_directories=self.pipeline_graph.get_output_directories(node),
+                )
+            )
+        resources = (
+            self.config.get_fused_implementation_resources(
+                [
+                    self.pipeline_graph.nodes[node]["implementation"].resources
+                    for node in chain
+                ]
+            )
+            if self.config.computing_environment == "slurm"
+            else None
+        )
+        fused_rule = FusedImplementedRule(
+            rules=rules,
+            scratch_files=[file for rule in rules[:-1] for file in rule.output],
+            validations=validation_files,
+            resources=resources,
+        )
+        fused_rule.write_to_snakefile(self.snakefile_path)
+        self._add_run_report_job(
+            fused_rule.name,
+            fused_rule.benchmark_file,
+            [self.pipeline_graph.nodes[node]["implementation"] for node in chain],
+        )
+
+    def write_run_report_handlers(self) -> None:
+        """Write the handlers that aggregate the benchmarks of the implementation jobs
+        into a run report once the pipeline finishes, whether or not it succeeds.
+        See ``report_utils.write_run_report``."""
+        with open(self.snakefile_path, "a") as f:
+            f.write(
+                f"""
+RUN_REPORT_JOBS = {pprint.pformat(self.run_report_jobs, sort_dicts=False)}
+onsuccess:
+    report_utils.write_run_report(RUN_REPORT_JOBS, "success")
+onerror:
+    report_utils.write_run_report(RUN_REPORT_JOBS, "error")"""
+            )
+
+    def _add_run_report_job(
+        self, name: str, benchmark_file: str, implementations: List[Implementation]
+    ) -> None:
+        """Record a job that runs one or more implementations back-to-back (each shard
+        of a partitioned implementation being a job of its own) for the run report."""
+        requested_resources = [
+            self.config.get_requested_resources(implementation.resources)
+            for implementation in implementations
+        ]
+        self.run_report_jobs[name] = {
+            "implementations": [implementation.name for implementation in implementations],
+            "benchmark": benchmark_file,
+            "memory": max(resources["memory"] for resources in requested_resources) * 1024,
+            "cpus": max(resources["cpus"] for resources in requested_resources),
+            "time_limit": sum(resources["time_limit"] for resources in requested_resources),
+        }
+
+    def _get_environment_variables(self, node: str) -> Dict[str, str]:
+        implementation = self.pipeline_graph.nodes[node]["implementation"]
+        envvars = implementation.environment_variables
+        intermediate_format = self.pipeline_graph.get_intermediate_format(node, self.config)
+        if intermediate_format != "parquet":
+            envvars = {"DUMMY_CONTAINER_OUTPUT_FILE_FORMAT": intermediate_format, **envvars}
+        return envvars
+
+    def _get_fused_chain(self, node: str) -> Optional[List[str]]:
+        """Get the chain of implementations that a node is fused into, if any."""
+        for chain in self.fused_chains:
+            if node in chain:
+                return chain
+        return None
+
+    def write_batched_validation_rules(self) -> None:
+        """Write a single rule validating the inputs of each implementation or,
+        for fewer jobs still, of each level of the pipeline graph. A level's
+        validations wait for all of its inputs before any of its implementations
+        can run."""
+        if self.config.environment.validation_batching == "node":
+            batches = {node: [node] for node in self.pipeline_graph.implementation_nodes}
+        else:
+            batches = {
+                f"level_{i}": generation
+                for i, generation in enumerate(self.pipeline_graph.implementation_generations)
+            }
+        for name, nodes in batches.items():
+            validations = [
+                validation_rule
+                for node in nodes
+                for validation_rule in self.get_validations(node)[1]
+            ]
+            if validations:
+                BatchedInputValidationRule(
+                    name=name, validations=validations
+                ).write_to_snakefile(self.snakefile_path)
 
     def write_config(self) -> None:
         """Write any configuration settings to the Snakefile.
-        Currently only applicable for spark-dependent rules."""
-        with open(self.snakefile_path, "a") as f:
-            if self.spark_is_required:
-                f.write(
-                    f"\nscattergather:\n\tnum_workers={self.config.spark_resources['num_workers']},"
-                )
+        Currently only applicable for spark-dependent rules and partitioned
+        implementations, which use Snakemake's scatter/gather."""
+        scattergather = {}
+        if self.spark_is_required:
+            scattergather["num_workers"] = self.config.spark_resources["num_workers"]
+        for node in self.pipeline_graph.implementation_nodes:
+            partitioning = self.pipeline_graph.nodes[node]["implementation"].partitioning
+            if partitioning:
+                scattergather[node] = partitioning["num_partitions"]
+        if scattergather:
+            with open(self.snakefile_path, "a") as f:
+                f.write("\nscattergather:")
+                for name, num_items in scattergather.items():
+                    f.write(f"\n\t{name}={num_items},")
 
     def write_spark_module(self) -> None:
         "'Import' the spark .smk module into the Snakefile."
+        with open(self.snakefile_path, "a") as f:
+            f.write(
+                self._get_spark_module()
+                + """
+use rule terminate_spark from spark_cluster with:
+    input: rules.all.input.final_output"""
+            )
+
+    def write_spark_attach_rules(self) -> None:
+        """Write rules that attach to a running long-lived spark cluster in place
+        of those that start (and stop) a spark cluster for this pipeline."""
+        with open(self.snakefile_path, "a") as f:
+            f.write(
+                f"""
+rule wait_for_spark_master:
+    output: temp("spark_logs/spark_master_uri.txt")
+    localrule: True
+    run:
+        spark_utils.write_master_url("{self.config.spark_cluster_dir}", output[0])
+rule wait_for_spark_worker:
+    input: rules.wait_for_spark_master.output
+    output: temp(touch("spark_logs/spark_worker_started_{{scatteritem}}.txt"))
+    localrule: True"""
+            )
+
+    def build_spark_cluster_snakefile(self, cluster_dir: Path) -> Path:
+        """Build the Snakefile of a long-lived spark cluster. It runs until
+        the cluster is asked to stop and registers the cluster once its master
+        and workers are up so that pipeline runs can attach to it."""
+        snakefile_path = cluster_dir / "Snakefile"
+        snakefile_path.unlink(missing_ok=True)
+        with open(snakefile_path, "a") as f:
+            f.write(
+                f"""from easylink.utilities import spark_utils
+
+scattergather:
+    num_workers={self.config.spark_resources["num_workers"]},
+
+onsuccess:
+    spark_utils.remove_cluster_state("{cluster_dir}")
+onerror:
+    spark_utils.remove_cluster_state("{cluster_dir}")
+
+rule all:
+    localrule: True
+    input:
+        state="{CLUSTER_STATE_FILE}",
+        master_log="spark_logs/spark_master_log.txt",
+        worker_logs=gather.num_workers("spark_logs/spark_worker_log_{{scatteritem}}.txt"),
+
+rule register_spark_cluster:
+    localrule: True
+    input:
+        master_url="spark_logs/spark_master_uri.txt",
+        workers=gather.num_workers("spark_logs/spark_worker_started_{{scatteritem}}.txt"),
+    output: "{CLUSTER_STATE_FILE}"
+    run:
+        spark_utils.write_cluster_state(output[0], input.master_url, len(input.workers))
+"""
+                + self._get_spark_module()
+            )
+        return snakefile_path
+
+    def _get_spark_module(self) -> str:
         slurm_resources = self.config.slurm_resources
         spark_resources = self.config.spark_resources
-        with open(self.snakefile_path, "a") as f:
-            module = f"""
+        module = f"""
 module spark_cluster:
     snakefile: '{SPARK_SNAKEFILE}'
     config: config
 
 use rule * from spark_cluster
-use rule terminate_spark from spark_cluster with:
-    input: rules.all.input.final_output"""
-            if self.config.computing_environment == "slurm":
-                module += f"""
+use rule wait_for_spark_master from spark_cluster with:
+    params:
+        spark_master_log_file=rules.start_spark_master.output,
+        timeout={spark_resources['master_timeout']},
+        poll_interval={spark_resources['poll_interval']},
+        max_poll_interval={spark_resources['max_poll_interval']}
+use rule wait_for_spark_worker from spark_cluster with:
+    params:
+        spark_worker_log_file="spark_logs/spark_worker_log_{{scatteritem}}.txt",
+        timeout={spark_resources['worker_timeout']},
+        poll_interval={spark_resources['poll_interval']},
+        max_poll_interval={spark_resources['max_poll_interval']}"""
+        if self.config.computing_environment == "slurm":
+            module += f"""
 use rule start_spark_master from spark_cluster with:
     resources:
         slurm_account={slurm_resources['slurm_account']},
@@ -157,14 +585,18 @@ use rule start_spark_worker from spark_cluster with:
         cores={spark_resources['cpus_per_task']},
         memory={spark_resources['mem_mb']}
                         """
-            f.write(module)
+        return module
 
     def get_validations(self, node) -> Tuple[List[str], List[InputValidationRule]]:
         """Get validator file and validation rule for each slot for a given node"""
         validation_files = []
         validation_rules = []
 
-        for _, _, edge_attrs in self.pipeline_graph.in_edges(node, data=True):
+        chain = self._get_fused_chain(node)
+        for source, _, edge_attrs in self.pipeline_graph.in_edges(node, data=True):
+            if chain and source in chain:
+                # Passed within a fused job and so never written to the results directory
+                continue
             input_slot = edge_attrs["input_slot"]
             input_files = edge_attrs["filepaths"]
             validation_file = f"input_validations/{node}/{input_slot.name}_validator"
@@ -1,12 +1,13 @@
 import itertools
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 
 import networkx as nx
 from networkx import MultiDiGraph
 
 from easylink.configuration import Config
 from easylink.implementation import Implementation
+from easylink.utilities.data_utils import INTERMEDIATE_FORMATS
 
 
 class PipelineGraph(MultiDiGraph):
@@ -34,6 +35,17 @@ class PipelineGraph(MultiDiGraph):
             if node != "pipeline_graph_input_data" and node != "pipeline_graph_results"
         ]
 
+    @property
+    def implementation_generations(self) -> List[List[str]]:
+        """Return implementation nodes grouped into topological levels, i.e. each
+        node only depends on nodes in earlier levels."""
+        implementation_nodes = self.implementation_nodes
+        generations = [
+            [node for node in implementation_nodes if node in generation]
+            for generation in nx.topological_generations(self)
+        ]
+        return [generation for generation in generations if generation]
+
     @property
     def implementations(self) -> List[Implementation]:
         """Convenience property to get all implementations in the graph."""
@@ -42,26 +54,107 @@ class PipelineGraph(MultiDiGraph):
     def update_slot_filepaths(self, config: Config) -> None:
         """Fill graph edges with appropriate filepath information."""
         # Update input data edges to direct to correct filenames from config
-        for source, sink, edge_attrs in self.out_edges(
-            "pipeline_graph_input_data", data=True
+        # NOTE: edge_attrs are the edges' own attributes, so are updated in place; a
+        # pair of nodes can be joined by several edges for different slots
+        unfilled_edges = []
+        for _, out_node, key, edge_attrs in self.out_edges(
+            "pipeline_graph_input_data", keys=True, data=True
         ):
-            for edge_idx in self[source][sink]:
-                self[source][sink][edge_idx]["filepaths"] = [
-                    str(config.input_data[edge_attrs["output_slot"].name])
-                ]
+            slot_name = edge_attrs["output_slot"].name
+            if slot_name in config.input_data:
+                edge_attrs["filepaths"] = [str(config.input_data[slot_name])]
+            elif not edge_attrs["input_slot"].required:
+                unfilled_edges.append(("pipeline_graph_input_data", out_node, key))
+        # Optional slots that the input data does not fill are left out altogether
+        self.remove_edges_from(unfilled_edges)
 
         # Update implementation nodes with yaml metadata
         for node in self.implementation_nodes:
-            imp_outputs = self.nodes[node]["implementation"].outputs
-            for source, sink, edge_attrs in self.out_edges(node, data=True):
-                for edge_idx in self[node][sink]:
-                    self[source][sink][edge_idx]["filepaths"] = [
-                        str(
-                            Path("intermediate")
-                            / node
-                            / imp_outputs[edge_attrs["output_slot"].name]
-                        )
-                    ]
+            implementation = self.nodes[node]["implementation"]
+            intermediate_format = self.get_intermediate_format(node, config)
+            for _, _, edge_attrs in self.out_edges(node, data=True):
+                output = Path(implementation.outputs[edge_attrs["output_slot"].name])
+                if intermediate_format != "parquet" and output.suffix == ".parquet":
+                    output = output.with_suffix(INTERMEDIATE_FORMATS[intermediate_format])
+                edge_attrs["filepaths"] = [str(Path("intermediate") / node / output)]
+
+    def get_output_directories(self, node: str) -> List[str]:
+        """Get those of a node's output files that are directories, i.e. whose
+        implementation metadata output ends with a slash. These are typically
+        partitioned parquet datasets written in parallel."""
+        implementation = self.nodes[node]["implementation"]
+        output_directories = []
+        for _, _, edge_attrs in self.out_edges(node, data=True):
+            if implementation.outputs[edge_attrs["output_slot"].name].endswith("/"):
+                output_directories.extend(
+                    file for file in edge_attrs["filepaths"] if file not in output_directories
+                )
+        return output_directories
+
+    def get_intermediate_format(self, node: str, config: Config) -> str:
+        """Get the format in which a node hands off its outputs to downstream nodes.
+
+        Nodes that produce the final pipeline results always write their outputs
+        in the format defined in their implementation metadata (i.e. parquet)."""
+        if self.has_edge(node, "pipeline_graph_results"):
+            return "parquet"
+        return (
+            self.nodes[node]["implementation"].intermediate_format
+            or config.environment.intermediate_format
+        )
+
+    def get_fused_chains(self) -> List[List[str]]:
+        """Get the (maximal, in topological order) linear chains of implementation
+        nodes that can be run back-to-back in a single job. See
+        ``_get_fusable_successor``."""
+        chains = []
+        chained = set()
+        for node in self.implementation_nodes:
+            if node in chained:
+                continue
+            chain = [node]
+            successor = self._get_fusable_successor(node)
+            while successor:
+                chain.append(successor)
+                successor = self._get_fusable_successor(successor)
+            if len(chain) > 1:
+                chains.append(chain)
+                chained.update(chain)
+        return chains
+
+    def _get_fusable_successor(self, node: str) -> Optional[str]:
+        """Get the node that a node can be fused with, if any.
+
+        Both implementations must opt in to fusing and run in the same container;
+        neither can require spark or be partitioned. The node's outputs must only be
+        used by its successor, which in turn must not depend on any other
+        implementation, so that the outputs never need to leave the fused job.
+        """
+        successors = set(self.successors(node))
+        if len(successors) != 1:
+            return None
+        successor = successors.pop()
+        if successor == "pipeline_graph_results":
+            return None
+        if set(self.predecessors(successor)) - {"pipeline_graph_input_data"} != {node}:
+            return None
+        implementations = [
+            self.nodes[node]["implementation"],
+            self.nodes[successor]["implementation"],
+        ]
+        if not all(
+            implementation.fuse
+            and not implementation.requires_spark
+            and not implementation.partitioning
+            for implementation in implementations
+        ):
+            return None
+        if (
+            implementations[0].singularity_image_path
+            != implementations[1].singularity_image_path
+        ):
+            return None
+        return successor
 
     def get_input_slots(self, node: str) -> Dict[str, List[str]]:
         """Get all of a node's input slots from edges."""
@@ -76,25 +169,75 @@ class PipelineGraph(MultiDiGraph):
         return input_slots
 
     def get_input_output_files(self, node: str) -> Tuple[List[str], List[str]]:
-        """Get all of a node's input and output files from edges."""
+        """Get all of a node's input and output files from edges. Files used by
+        several slots (e.g. an output passed to more than one downstream node)
+        are only listed once."""
         input_files = list(
-            itertools.chain.from_iterable(
-                [
-                    edge_attrs["filepaths"]
-                    for _, _, edge_attrs in self.in_edges(node, data=True)
-                ]
+            dict.fromkeys(
+                itertools.chain.from_iterable(
+                    [
+                        edge_attrs["filepaths"]
+                        for _, _, edge_attrs in self.in_edges(node, data=True)
+                    ]
+                )
             )
         )
         output_files = list(
-            itertools.chain.from_iterable(
-                [
-                    edge_attrs["filepaths"]
-                    for _, _, edge_attrs in self.out_edges(node, data=True)
-                ]
+            dict.fromkeys(
+                itertools.chain.from_iterable(
+                    [
+                        edge_attrs["filepaths"]
+                        for _, _, edge_attrs in self.out_edges(node, data=True)
+                    ]
+                )
             )
         )
         return input_files, output_files
 
+    def get_results_validator(self) -> Callable:
+        """Get the validator of the pipeline's final output, i.e. that of the
+        results node's input slot."""
+        validators = {
+            edge_attrs["input_slot"].validator
+            for _, _, edge_attrs in self.in_edges("pipeline_graph_results", data=True)
+        }
+        if len(validators) != 1:
+            raise NotImplementedError(
+                "Pipeline results with more than one validator are not supported."
+            )
+        return validators.pop()
+
+    def get_incomplete_nodes(self, results_dir: Path) -> List[str]:
+        """Get the implementation nodes that still need to run, i.e. those missing
+        any output as well as everything downstream of them, in topological order."""
+        incomplete = set()
+        for node in self.implementation_nodes:
+            _, output_files = self.get_input_output_files(node)
+            if any(not (results_dir / output).exists() for output in output_files):
+                incomplete.add(node)
+                incomplete.update(nx.descendants(self, node))
+        return [node for node in self.implementation_nodes if node in incomplete]
+
+    def get_critical_path(self, durations: Dict[str, float]) -> Tuple[List[str], float]:
+        """Get the chain of implementation nodes with the longest total duration,
+        i.e. the least amount of time that running them all could take, along with
+        that duration. Nodes missing from ``durations`` take no time."""
+        longest = {}
+        for node in self.implementation_nodes:
+            path, duration = max(
+                (
+                    longest[predecessor]
+                    for predecessor in self.predecessors(node)
+                    if predecessor in longest
+                ),
+                key=lambda path_duration: path_duration[1],
+                default=([], 0),
+            )
+            longest[node] = (path + [node], duration + durations.get(node, 0))
+        return max(
+            longest.values(), key=lambda path_duration: path_duration[1], default=([], 0)
+        )
+
     def spark_is_required(self) -> bool:
         """Check if the pipeline requires spark resources."""
         return any([implementation.requires_spark for implementation in self.implementations])
@@ -1,10 +1,12 @@
+import functools
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Any, Dict, FrozenSet, List, Optional
 
 import networkx as nx
 from layered_config_tree import LayeredConfigTree
 
-from easylink.pipeline_schema_constants import ALLOWED_SCHEMA_PARAMS
 from easylink.step import CompositeStep, Step
 
 
@@ -36,33 +38,90 @@ class PipelineSchema(CompositeStep):
         """Convenience property to get all steps in the graph."""
         return [self.graph.nodes[node]["step"] for node in self.step_nodes]
 
+    @property
+    def step_keys(self) -> FrozenSet[str]:
+        """The top-level steps that a pipeline configuration must (exactly) have
+        to match this schema."""
+        return frozenset(self.step_nodes)
+
     @classmethod
     def _get_schemas(cls) -> List["PipelineSchema"]:
         """Creates the allowable schemas for the pipeline."""
+        # Imported here since the schema constants import the (heavy) validators
+        from easylink.pipeline_schema_constants import ALLOWED_SCHEMA_PARAMS
+
         return [
             cls(name, nodes=nodes, edges=edges)
             for name, (nodes, edges) in ALLOWED_SCHEMA_PARAMS.items()
         ]
 
     def validate_inputs(self, input_data: Dict[str, Path]) -> Optional[List[str]]:
-        "For each file slot used from the input data, validate that the file's existence and properties."
+        """For each file slot used from the input data, validate that the file's existence and properties.
+
+        Validators are run concurrently since they are typically I/O bound.
+        """
         errors = {}
+        validations = {}
         for _, _, edge_attrs in self.graph.out_edges("input_data", data=True):
             validator = edge_attrs["input_slot"].validator
             slot_name = edge_attrs["output_slot"].name
             try:
                 file = input_data[slot_name]
             except KeyError:
-                errors[str(slot_name)] = ["Missing required input data"]
+                if edge_attrs["input_slot"].required:
+                    errors[str(slot_name)] = ["Missing required input data"]
                 continue
             if not file.exists():
                 errors[str(file)] = ["File not found."]
                 continue
-            try:
-                validator(file)
-            except Exception as e:
-                errors[str(file)] = [e.args[0]]
+            validations[(validator, file)] = None
+        with ThreadPoolExecutor() as executor:
+            futures = [
+                (file, executor.submit(validator, file)) for validator, file in validations
+            ]
+            for file, future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    errors.setdefault(str(file), []).append(str(e))
         return errors
 
 
-PIPELINE_SCHEMAS = PipelineSchema._get_schemas()
+@functools.lru_cache(maxsize=None)
+def get_pipeline_schemas() -> List[PipelineSchema]:
+    """Get all pipeline schemas. They are only built on first use rather than on
+    import so that e.g. `easylink --help` stays fast."""
+    return PipelineSchema._get_schemas()
+
+
+def get_candidate_schemas(pipeline_config: LayeredConfigTree) -> List[PipelineSchema]:
+    """Get the schemas that a pipeline configuration could match, i.e. those whose
+    top-level steps are exactly the configured ones. No other schema can match."""
+    return _get_schema_index().get(frozenset(pipeline_config.keys()), [])
+
+
+def get_closest_schemas(pipeline_config: LayeredConfigTree) -> List[PipelineSchema]:
+    """Get the schemas sharing the most top-level steps with a pipeline configuration,
+    i.e. those it was most likely meant for. If it shares no steps with any schema,
+    all schemas are returned."""
+    configured_steps = set(pipeline_config.keys())
+    overlaps = {
+        schema: len(schema.step_keys & configured_steps) for schema in get_pipeline_schemas()
+    }
+    max_overlap = max(overlaps.values())
+    return [schema for schema, overlap in overlaps.items() if overlap == max_overlap]
+
+
+@functools.lru_cache(maxsize=None)
+def _get_schema_index() -> Dict[FrozenSet[str], List[PipelineSchema]]:
+    index = defaultdict(list)
+    for schema in get_pipeline_schemas():
+        index[schema.step_keys].append(schema)
+    return dict(index)
+
+
+def __getattr__(name: str) -> Any:
+    # Backwards-compatible access to the pipeline schemas as a module attribute
+    if name == "PIPELINE_SCHEMAS":
+        return get_pipeline_schemas()
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
@@ -1,7 +1,8 @@
-from easylink.pipeline_schema_constants import development, integration_test
+from easylink.pipeline_schema_constants import development, integration_test, pvs_like
 
 ALLOWED_SCHEMA_PARAMS = {
     "development": development.SCHEMA_PARAMS,
+    "pvs_like": pvs_like.SCHEMA_PARAMS,
 }
 
 TESTING_SCHEMA_PARAMS = {
@@ -0,0 +1,231 @@
+from easylink.graph_components import Edge, InputSlot, OutputSlot
+from easylink.step import BasicStep, IOStep
+from easylink.utilities.validation_utils import (
+    CENSUS_2030_WITH_PIKS_SCHEMA,
+    CENSUS_SCHEMA,
+    GROUND_TRUTH_SCHEMA,
+    PVS_LIKE_LINKS_SCHEMA,
+    PVS_LIKE_RECORDS_SCHEMA,
+    REFERENCE_FILE_SCHEMA,
+    validate_splink_model,
+)
+
+# The PVS-like person linkage case study: each census record is linked to the
+# PIK of a reference file record by a series of matching passes with increasingly
+# loose blocking. The passes of the geosearch and namesearch steps are scored
+# independently of each other, so those steps run in parallel; the resolve step
+# then gives each census record the PIK of the first pass to find it, unless that
+# pass found several PIKs for it. A model trained by a previous run can be passed
+# as the optional "pretrained_model" input data to skip training.
+
+
+def _records_slot(step_name: str) -> InputSlot:
+    return InputSlot(
+        name=f"{step_name}_records",
+        env_var="DUMMY_CONTAINER_RECORDS_FILE_PATHS",
+        validator=PVS_LIKE_RECORDS_SCHEMA,
+    )
+
+
+def _model_slot(step_name: str, required: bool = True) -> InputSlot:
+    return InputSlot(
+        name=f"{step_name}_model",
+        env_var="DUMMY_CONTAINER_MODEL_FILE_PATHS",
+        validator=validate_splink_model,
+        required=required,
+    )
+
+
+NODES = [
+    IOStep(
+        "input_data",
+        input_slots=[],
+        output_slots=[
+            OutputSlot("census_2030"),
+            OutputSlot("reference_file"),
+            OutputSlot("census_2030_ground_truth"),
+            OutputSlot("reference_file_ground_truth"),
+            OutputSlot("pretrained_model"),
+        ],
+    ),
+    BasicStep(
+        "preprocess",
+        input_slots=[
+            InputSlot(
+                name="preprocess_census_2030",
+                env_var="DUMMY_CONTAINER_CENSUS_2030_FILE_PATHS",
+                validator=CENSUS_SCHEMA,
+            ),
+            InputSlot(
+                name="preprocess_reference_file",
+                env_var="DUMMY_CONTAINER_REFERENCE_FILE_PATHS",
+                validator=REFERENCE_FILE_SCHEMA,
+            ),
+        ],
+        output_slots=[OutputSlot("preprocess_records")],
+    ),
+    BasicStep(
+        "train",
+        input_slots=[_records_slot("train"), _model_slot("train", required=False)],
+        output_slots=[OutputSlot("train_model")],
+    ),
+    BasicStep(
+        "geosearch",
+        input_slots=[_records_slot("geosearch"), _model_slot("geosearch")],
+        output_slots=[OutputSlot("geosearch_links")],
+    ),
+    BasicStep(
+        "namesearch",
+        input_slots=[_records_slot("namesearch"), _model_slot("namesearch")],
+        output_slots=[OutputSlot("namesearch_links")],
+    ),
+    BasicStep(
+        "resolve",
+        input_slots=[
+            InputSlot(
+                name="resolve_census_2030",
+                env_var="DUMMY_CONTAINER_CENSUS_2030_FILE_PATHS",
+                validator=CENSUS_SCHEMA,
+            ),
+            InputSlot(
+                name="resolve_geosearch_links",
+                env_var="DUMMY_CONTAINER_GEOSEARCH_LINKS_FILE_PATHS",
+                validator=PVS_LIKE_LINKS_SCHEMA,
+            ),
+            InputSlot(
+                name="resolve_namesearch_links",
+                env_var="DUMMY_CONTAINER_NAMESEARCH_LINKS_FILE_PATHS",
+                validator=PVS_LIKE_LINKS_SCHEMA,
+            ),
+        ],
+        output_slots=[OutputSlot("resolve_census_2030_with_piks")],
+    ),
+    BasicStep(
+        "evaluate",
+        input_slots=[
+            _records_slot("evaluate"),
+            InputSlot(
+                name="evaluate_census_2030_with_piks",
+                env_var="DUMMY_CONTAINER_CENSUS_2030_WITH_PIKS_FILE_PATHS",
+                validator=CENSUS_2030_WITH_PIKS_SCHEMA,
+            ),
+            InputSlot(
+                name="evaluate_census_2030_ground_truth",
+                env_var="DUMMY_CONTAINER_CENSUS_2030_GROUND_TRUTH_FILE_PATHS",
+                validator=GROUND_TRUTH_SCHEMA,
+            ),
+            InputSlot(
+                name="evaluate_reference_file_ground_truth",
+                env_var="DUMMY_CONTAINER_REFERENCE_FILE_GROUND_TRUTH_FILE_PATHS",
+                validator=GROUND_TRUTH_SCHEMA,
+            ),
+        ],
+        output_slots=[OutputSlot("evaluate_census_2030_with_piks")],
+    ),
+    IOStep(
+        "results",
+        input_slots=[
+            InputSlot(name="result", env_var=None, validator=CENSUS_2030_WITH_PIKS_SCHEMA)
+        ],
+        output_slots=[],
+    ),
+]
+EDGES = [
+    Edge(
+        in_node="input_data",
+        out_node="preprocess",
+        output_slot="census_2030",
+        input_slot="preprocess_census_2030",
+    ),
+    Edge(
+        in_node="input_data",
+        out_node="preprocess",
+        output_slot="reference_file",
+        input_slot="preprocess_reference_file",
+    ),
+    Edge(
+        in_node="preprocess",
+        out_node="train",
+        output_slot="preprocess_records",
+        input_slot="train_records",
+    ),
+    Edge(
+        in_node="input_data",
+        out_node="train",
+        output_slot="pretrained_model",
+        input_slot="train_model",
+    ),
+    Edge(
+        in_node="preprocess",
+        out_node="geosearch",
+        output_slot="preprocess_records",
+        input_slot="geosearch_records",
+    ),
+    Edge(
+        in_node="train",
+        out_node="geosearch",
+        output_slot="train_model",
+        input_slot="geosearch_model",
+    ),
+    Edge(
+        in_node="preprocess",
+        out_node="namesearch",
+        output_slot="preprocess_records",
+        input_slot="namesearch_records",
+    ),
+    Edge(
+        in_node="train",
+        out_node="namesearch",
+        output_slot="train_model",
+        input_slot="namesearch_model",
+    ),
+    Edge(
+        in_node="input_data",
+        out_node="resolve",
+        output_slot="census_2030",
+        input_slot="resolve_census_2030",
+    ),
+    Edge(
+        in_node="geosearch",
+        out_node="resolve",
+        output_slot="geosearch_links",
+        input_slot="resolve_geosearch_links",
+    ),
+    Edge(
+        in_node="namesearch",
+        out_node="resolve",
+        output_slot="namesearch_links",
+        input_slot="resolve_namesearch_links",
+    ),
+    Edge(
+        in_node="preprocess",
+        out_node="evaluate",
+        output_slot="preprocess_records",
+        input_slot="evaluate_records",
+    ),
+    Edge(
+        in_node="resolve",
+        out_node="evaluate",
+        output_slot="resolve_census_2030_with_piks",
+        input_slot="evaluate_census_2030_with_piks",
+    ),
+    Edge(
+        in_node="input_data",
+        out_node="evaluate",
+        output_slot="census_2030_ground_truth",
+        input_slot="evaluate_census_2030_ground_truth",
+    ),
+    Edge(
+        in_node="input_data",
+        out_node="evaluate",
+        output_slot="reference_file_ground_truth",
+        input_slot="evaluate_reference_file_ground_truth",
+    ),
+    Edge(
+        in_node="evaluate",
+        out_node="results",
+        output_slot="evaluate_census_2030_with_piks",
+        input_slot="result",
+    ),
+]
+SCHEMA_PARAMS = (NODES, EDGES)
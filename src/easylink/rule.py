@@ -1,8 +1,26 @@
 import os
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
+from dataclasses import dataclass, field, replace
+from pathlib import Path
 from typing import Callable, Dict, List, Optional
 
+from easylink.utilities.validation_utils import TableSchema
+
+# Wildcard used by Snakemake's scatter/gather for the shards of a partitioned step
+SCATTERITEM = "{scatteritem}"
+
+
+def format_output(output: List[str], output_directories: List[str]) -> str:
+    """Formats a list of output paths for a rule's output directive, marking
+    those that are directories (e.g. partitioned parquet datasets) as such."""
+    if not output_directories:
+        return str(output)
+    formatted = [
+        f"directory('{path}')" if path in output_directories else f"'{path}'"
+        for path in output
+    ]
+    return f"[{', '.join(formatted)}]"
+
 
 class Rule(ABC):
     """
@@ -29,11 +47,13 @@ class TargetRule(Rule):
     Parameters:
     target_files: List of file paths
     validation: name of file created by InputValidationRule
+    output_directories: Subset of target_files that are directories
     """
 
     target_files: List[str]
     validation: str
     requires_spark: bool
+    output_directories: List[str] = field(default_factory=list)
 
     def _build_rule(self) -> str:
         outputs = [os.path.basename(file_path) for file_path in self.target_files]
@@ -50,8 +70,11 @@ rule all:
         master_log="spark_logs/spark_master_log.txt",
         worker_logs=gather.num_workers("spark_logs/spark_worker_log_{{scatteritem}}.txt",
         ),"""
+        output_directories = [
+            os.path.basename(file_path) for file_path in self.output_directories
+        ]
         rulestring += f"""
-    output: {outputs}
+    output: {format_output(outputs, output_directories)}
     run:
         import os
         for input_path, output_path in zip(input.final_output, output):
@@ -75,6 +98,10 @@ class ImplementedRule(Rule):
     diagnostics_dir: Directory for diagnostic files
     image_path: Path to Singularity image
     script_cmd: Command to execute
+    requires_spark: Whether the implementation requires a spark cluster
+    cache_dir: Step output cache directory; if set, outputs are restored from
+        the cache when available and stored in it otherwise
+    output_directories: Subset of output that are directories
     """
 
     step_name: str
@@ -88,10 +115,33 @@ class ImplementedRule(Rule):
     image_path: str
     script_cmd: str
     requires_spark: bool
+    cache_dir: Optional[str] = None
+    output_directories: List[str] = field(default_factory=list)
 
     def _build_rule(self) -> str:
         return self._build_io() + self._build_resources() + self._build_shell_command()
 
+    @property
+    def is_scattered(self) -> bool:
+        """Whether this rule processes a single shard of a partitioned step."""
+        return any(SCATTERITEM in output for output in self.output)
+
+    @property
+    def cache_key_file(self) -> str:
+        if self.is_scattered:
+            return f"cache_keys/{self.implementation_name}/{SCATTERITEM}.txt"
+        return f"cache_keys/{self.implementation_name}.txt"
+
+    @property
+    def benchmark_file(self) -> str:
+        return f"{self.diagnostics_dir}/{self.implementation_name}-benchmark.tsv"
+
+    @staticmethod
+    def _format_wildcards(string: str) -> str:
+        """Wildcards must be referenced through the wildcards namespace outside of
+        the input, output and log directives."""
+        return string.replace(SCATTERITEM, "{wildcards.scatteritem}")
+
     def _build_io(self) -> str:
         return (
             f"""
@@ -100,8 +150,9 @@ rule:
     message: "Running {self.step_name} implementation: {self.implementation_name}" """
             + self._build_input()
             + f"""        
-    output: {self.output}
+    output: {format_output(self.output, self.output_directories)}
     log: "{self.diagnostics_dir}/{self.implementation_name}-output.log"
+    benchmark: "{self.benchmark_file}"
     container: "{self.image_path}" """
         )
 
@@ -113,6 +164,9 @@ rule:
         {slot_name.lower()}={slot_files},"""
         input_str += f"""
         validations={self.validations}, """
+        if self.cache_dir:
+            input_str += f"""
+        cache_key="{self.cache_key_file}","""
         if self.requires_spark:
             input_str += f"""
         master_trigger=gather.num_workers(rules.wait_for_spark_worker.output),
@@ -123,19 +177,46 @@ rule:
     def _build_resources(self) -> str:
         if not self.resources:
             return ""
+        slurm_extra = (
+            f"\"--output '{self.diagnostics_dir}/{self.implementation_name}-slurm-%j.log'\""
+        )
+        if self.is_scattered:
+            slurm_extra = f"lambda wildcards: f{self._format_wildcards(slurm_extra)}"
         return f"""
     resources:
         slurm_partition={self.resources['slurm_partition']},
         mem_mb={self.resources['mem_mb']},
         runtime={self.resources['runtime']},
         cpus_per_task={self.resources['cpus_per_task']},
-        slurm_extra="--output '{self.diagnostics_dir}/{self.implementation_name}-slurm-%j.log'" """
+        slurm_extra={slurm_extra} """
 
     def _build_shell_command(self) -> str:
-        shell_cmd = f"""
+        shell_cmd = (
+            f"""
     shell:
-        '''
-        export DUMMY_CONTAINER_OUTPUT_PATHS={",".join(self.output)}
+        '''"""
+            + self._build_environment()
+        )
+        # Log stdout/stderr to diagnostics directory
+        if self.cache_dir:
+            shell_cmd += self._build_cached_script_cmd()
+        else:
+            shell_cmd += f"""
+        {self.script_cmd} > {{log}} 2>&1"""
+        shell_cmd += f"""
+        '''"""
+
+        return self._format_wildcards(shell_cmd)
+
+    def _build_environment(self) -> str:
+        """Export the environment variables that the implementation reads its
+        inputs, outputs and configuration from."""
+        # Directory outputs are passed with a trailing slash
+        output_paths = [
+            f"{path}/" if path in self.output_directories else path for path in self.output
+        ]
+        shell_cmd = f"""
+        export DUMMY_CONTAINER_OUTPUT_PATHS={",".join(output_paths)}
         export DUMMY_CONTAINER_DIAGNOSTICS_DIRECTORY={self.diagnostics_dir}"""
         for slot_name, slot_files in self.input_slots.items():
             shell_cmd += f"""
@@ -147,13 +228,258 @@ rule:
         for var_name, var_value in self.envvars.items():
             shell_cmd += f"""
         export {var_name}={var_value}"""
-        # Log stdout/stderr to diagnostics directory
+        return shell_cmd
+
+    def _build_cached_script_cmd(self) -> str:
+        """Restore outputs from the step output cache if they exist; otherwise run
+        the script and store its outputs. Files are hard-linked where possible and
+        copied (reflinked on supporting filesystems) otherwise."""
+        return f"""
+        read -r CACHE_KEY < {{input.cache_key}}
+        CACHE_ENTRY={self.cache_dir}/outputs/$CACHE_KEY
+        if [[ -e $CACHE_ENTRY/.complete ]]; then
+            echo "Restoring cached outputs from $CACHE_ENTRY" > {{log}}
+            touch $CACHE_ENTRY/.complete
+            for output_path in {{output}}; do
+                cached_path=$CACHE_ENTRY/$(basename $output_path)
+                cp -al $cached_path $output_path 2>/dev/null || cp -r --reflink=auto $cached_path $output_path
+            done
+        else
+            {self.script_cmd} > {{log}} 2>&1
+            CACHE_STAGING=$(mktemp -d {self.cache_dir}/outputs/.staging.XXXXXX)
+            for output_path in {{output}}; do
+                cp -al $output_path $CACHE_STAGING/ 2>/dev/null || cp -r --reflink=auto $output_path $CACHE_STAGING/
+            done
+            echo {self.implementation_name} > $CACHE_STAGING/.complete
+            mv -T $CACHE_STAGING $CACHE_ENTRY 2>/dev/null || rm -rf $CACHE_STAGING
+        fi"""
+
+
+@dataclass
+class FusedImplementedRule(Rule):
+    """
+    A rule that runs a linear chain of implementations that share a container
+    back-to-back in a single job, and so a single container invocation. Files
+    passed between the implementations are written to a local scratch directory
+    that is removed when the job finishes.
+
+    Parameters:
+    rules: Rules of the implementations, in the order they are run
+    scratch_files: Files passed between the implementations
+    validations: List of validation files
+    resources: Computational resources used by executor (e.g. slurm) for the job
+    """
+
+    rules: List[ImplementedRule]
+    scratch_files: List[str]
+    validations: List[str]
+    resources: Optional[dict]
+
+    @property
+    def name(self) -> str:
+        return "__".join(rule.implementation_name for rule in self.rules)
+
+    @property
+    def output(self) -> List[str]:
+        return [
+            file
+            for rule in self.rules
+            for file in rule.output
+            if file not in self.scratch_files
+        ]
+
+    @property
+    def benchmark_file(self) -> str:
+        return f"{self.rules[-1].diagnostics_dir}/{self.name}-benchmark.tsv"
+
+    def _build_rule(self) -> str:
+        return self._build_io() + self._build_resources() + self._build_shell_command()
+
+    def _build_io(self) -> str:
+        implementation_names = ", ".join(rule.implementation_name for rule in self.rules)
+        io_str = f"""
+rule:
+    name: "{self.name}"
+    message: "Running fused implementations: {implementation_names}"
+    input:"""
+        for rule in self.rules:
+            for slot_name, slot_files in rule.input_slots.items():
+                files = [file for file in slot_files if file not in self.scratch_files]
+                if files:
+                    io_str += f"""
+        {rule.implementation_name}_{slot_name.lower()}={files},"""
+        output_directories = [
+            directory for rule in self.rules for directory in rule.output_directories
+        ]
+        io_str += f"""
+        validations={self.validations},
+    output: {format_output(self.output, output_directories)}
+    log:"""
+        for rule in self.rules:
+            io_str += f"""
+        {rule.implementation_name}="{rule.diagnostics_dir}/{rule.implementation_name}-output.log","""
+        io_str += f"""
+    benchmark: "{self.benchmark_file}"
+    container: "{self.rules[0].image_path}" """
+        return io_str
+
+    def _build_resources(self) -> str:
+        if not self.resources:
+            return ""
+        diagnostics_dir = self.rules[-1].diagnostics_dir
+        return f"""
+    resources:
+        slurm_partition={self.resources['slurm_partition']},
+        mem_mb={self.resources['mem_mb']},
+        runtime={self.resources['runtime']},
+        cpus_per_task={self.resources['cpus_per_task']},
+        slurm_extra="--output '{diagnostics_dir}/{self.name}-slurm-%j.log'" """
+
+    def _build_shell_command(self) -> str:
+        scratch_dirs = list(
+            dict.fromkeys(str(Path(file).parent) for file in self.scratch_files)
+        )
+        shell_cmd = f"""
+    shell:
+        '''
+        SCRATCH_DIR=$(mktemp -d -t easylink.XXXXXX)
+        trap 'rm -rf $SCRATCH_DIR' EXIT
+        mkdir -p {" ".join(f"$SCRATCH_DIR/{directory}" for directory in scratch_dirs)}"""
+        for rule in self.rules:
+            # Each implementation runs in a subshell so that its environment
+            # variables are not seen by the next
+            shell_cmd += f"""
+        ({self._in_scratch(rule)._build_environment()}
+        {rule.script_cmd} > {{log.{rule.implementation_name}}} 2>&1
+        )"""
         shell_cmd += f"""
-        {self.script_cmd} > {{log}} 2>&1
         '''"""
-
         return shell_cmd
 
+    def _in_scratch(self, rule: ImplementedRule) -> ImplementedRule:
+        """Return a copy of an implementation's rule that reads and writes the files
+        passed between implementations from the scratch directory."""
+
+        def in_scratch(files: List[str]) -> List[str]:
+            return [
+                f"$SCRATCH_DIR/{file}" if file in self.scratch_files else file
+                for file in files
+            ]
+
+        return replace(
+            rule,
+            input_slots={slot: in_scratch(files) for slot, files in rule.input_slots.items()},
+            output=in_scratch(rule.output),
+            output_directories=in_scratch(rule.output_directories),
+        )
+
+
+@dataclass
+class ScatterRule(Rule):
+    """
+    A rule that hash-partitions the input files of an implementation on a key
+    column so that the implementation can be run on each shard in parallel
+
+    Parameters:
+    name: Name of implementation (and of its scattergather group)
+    input: List of file paths to partition
+    output: List of shard file path patterns, one per input file, each
+        containing the '{scatteritem}' wildcard
+    key_column: Name of the column to partition on
+    """
+
+    name: str
+    input: List[str]
+    output: List[str]
+    key_column: str
+
+    def _build_rule(self) -> str:
+        outputs = ", ".join(f'scatter.{self.name}("{path}")' for path in self.output)
+        return f"""
+rule:
+    name: "{self.name}_scatter"
+    message: "Partitioning inputs of {self.name} on '{self.key_column}'"
+    input: {self.input}
+    output: {outputs}
+    run:
+        partition_utils.split_files(list(input), "{self.key_column}", list(output))"""
+
+
+@dataclass
+class GatherRule(Rule):
+    """
+    A rule that concatenates the per-shard outputs of a partitioned implementation
+
+    Parameters:
+    name: Name of implementation (and of its scattergather group)
+    input: List of shard file path patterns, one per output file, each
+        containing the '{scatteritem}' wildcard
+    output: List of file paths created by implementation
+    output_directories: Subset of output that are directories
+    """
+
+    name: str
+    input: List[str]
+    output: List[str]
+    output_directories: List[str] = field(default_factory=list)
+
+    def _build_rule(self) -> str:
+        inputs = ", ".join(f'gather.{self.name}("{path}")' for path in self.input)
+        return f"""
+rule:
+    name: "{self.name}_gather"
+    message: "Gathering partitioned outputs of {self.name}"
+    input: {inputs}
+    output: {format_output(self.output, self.output_directories)}
+    run:
+        partition_utils.gather_files(list(input), list(output))"""
+
+
+@dataclass
+class CacheKeyRule(Rule):
+    """
+    A rule that computes the step output cache key of an implementation from
+    its configuration and the contents of its input files
+
+    Parameters:
+    name: Name of implementation
+    input: List of file paths read by the implementation
+    output: file path to write the cache key to
+    cache_dir: Step output cache directory
+    image_path: Path to Singularity image
+    script_cmd: Command to execute
+    envvars: Dictionary of environment variables to set
+    outputs: List of file paths created by implementation
+    """
+
+    name: str
+    input: List[str]
+    output: str
+    cache_dir: str
+    image_path: str
+    script_cmd: str
+    envvars: dict
+    outputs: List[str]
+
+    def _build_rule(self) -> str:
+        return f"""
+rule:
+    name: "{self.name}_cache_key"
+    input: {self.input}
+    output: "{self.output}"
+    localrule: True
+    message: "Computing cache key for {self.name}"
+    run:
+        cache_utils.write_cache_key(
+            output[0],
+            list(input),
+            cache_dir={self.cache_dir!r},
+            image_path={self.image_path!r},
+            script_cmd={self.script_cmd!r},
+            envvars={self.envvars},
+            outputs={self.outputs},
+        )"""
+
 
 @dataclass
 class InputValidationRule(Rule):
@@ -166,6 +492,8 @@ class InputValidationRule(Rule):
     input: List of file paths to validate
     output: file path to touch on successful validation. Must be used as an input for next rule.
     validator: Callable that takes a file path as input. Raises an error if invalid.
+        Registered TableSchemas are looked up by name; other validators must be
+        functions defined in validation_utils.
     """
 
     name: str
@@ -173,6 +501,13 @@ class InputValidationRule(Rule):
     output: str
     validator: Callable
 
+    @property
+    def validator_call(self) -> str:
+        """The validator as it is referred to from within the Snakefile."""
+        if isinstance(self.validator, TableSchema):
+            return f'validation_utils.get_schema("{self.validator.name}")'
+        return f"validation_utils.{self.validator.__name__}"
+
     def _build_rule(self) -> str:
         return f"""
 rule:
@@ -183,4 +518,48 @@ rule:
     message: "Validating {self.name}"
     run:
         for f in input:
-            validation_utils.{self.validator.__name__}(f)"""
+            {self.validator_call}(f)"""
+
+
+@dataclass
+class BatchedInputValidationRule(Rule):
+    """
+    A single local rule that runs several input validations in-process, e.g.
+    all of those of an implementation or of a level of the pipeline graph.
+    Each validation still touches its own output file and errors are reported
+    per validation.
+
+    Parameters:
+    name: Name
+    validations: The validation rules to batch
+    """
+
+    name: str
+    validations: List[InputValidationRule]
+
+    def _build_rule(self) -> str:
+        input_files = list(
+            dict.fromkeys(
+                file for validation in self.validations for file in validation.input
+            )
+        )
+        outputs = ", ".join(
+            f'touch("{validation.output}")' for validation in self.validations
+        )
+        batch = "".join(
+            f"""
+            "{Path(validation.output).parent.name}/{validation.name}": ({validation.validator_call}, {validation.input}),"""
+            for validation in self.validations
+        )
+        return f"""
+rule:
+    name: "{self.name}_validator"
+    input: {input_files}
+    output: {outputs}
+    localrule: True
+    message: "Validating {self.name}"
+    run:
+        validation_utils.validate_batch(
+            {{{batch}
+            }}
+        )"""
@@ -1,17 +1,36 @@
+import csv
 import os
 import socket
+import subprocess
+import sys
+import tempfile
+import time
 from pathlib import Path
-from typing import List
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from loguru import logger
-from snakemake.cli import main as snake_main
 
-from easylink.configuration import Config, load_params_from_specification
+from easylink.configuration import Config, get_cache_dir, load_params_from_specification
 from easylink.pipeline import Pipeline
-from easylink.utilities.data_utils import copy_configuration_files_to_results_directory
-from easylink.utilities.general_utils import is_on_slurm
+from easylink.utilities import spark_utils
+from easylink.utilities.cache_utils import (
+    OUTPUTS_DIR,
+    get_pipeline_cache_key,
+    load_cached_pipeline,
+    prune_cache,
+    store_cached_pipeline,
+)
+from easylink.utilities.data_utils import (
+    copy_configuration_files_to_results_directory,
+    get_mismatched_configuration_files,
+)
+from easylink.utilities.general_utils import exit_with_validation_error, is_on_slurm
 from easylink.utilities.paths import EASYLINK_TEMP
 
+RESUME_ERRORS_KEY = "RESUME ERRORS"
+# The plan of an output in snakemake's summary if it would be (re)built
+PENDING_PLAN = "update pending"
+
 
 def main(
     pipeline_specification: str,
@@ -19,21 +38,52 @@ def main(
     computing_environment: str,
     results_dir: str,
     debug=False,
+    resume=False,
+    unlock=False,
+    retries=0,
 ) -> None:
-    """Set up and run the pipeline"""
+    """Set up and run the pipeline.
+
+    If ``resume`` is True, the pipeline is resumed in place in an existing
+    results directory: its Snakefile and any completed intermediate outputs and
+    input validations are reused so that only the incomplete jobs are run. A run
+    that died mid-pipeline leaves the results directory locked; it is only
+    unlocked if ``unlock`` is True, since the lock may instead belong to a run
+    that is still active there.
+
+    Failed jobs are resubmitted up to ``retries`` times; see the
+    ``memory_growth_factor`` and ``time_limit_growth_factor`` resources for
+    requesting more resources on each attempt.
+
+    If the step output cache is enabled, resolving a pipeline (i.e. matching it to
+    a pipeline schema, building its graph and writing its Snakefile) is skipped if
+    the same specifications have been resolved before; see
+    ``cache_utils.get_pipeline_cache_key``.
+    """
     config_params = load_params_from_specification(
         pipeline_specification, input_data, computing_environment, results_dir
     )
-    config = Config(config_params)
-    pipeline = Pipeline(config)
-    # Now that all validation is done, create results dir and copy the configuration files to the results directory
-    copy_configuration_files_to_results_directory(
-        Path(pipeline_specification),
-        Path(input_data),
-        Path(computing_environment),
-        Path(results_dir),
-    )
-    snakefile = pipeline.build_snakefile()
+    pipeline_cache_key = get_pipeline_cache_key(config_params)
+    pipeline, cached_pipeline = load_pipeline(config_params, pipeline_cache_key)
+    config = pipeline.config
+    if resume:
+        snakefile = prepare_resume(
+            pipeline,
+            Path(pipeline_specification),
+            Path(input_data),
+            Path(computing_environment) if computing_environment else None,
+        )
+    else:
+        # Now that all validation is done, create results dir and copy the configuration files to the results directory
+        copy_configuration_files_to_results_directory(
+            Path(pipeline_specification),
+            Path(input_data),
+            Path(computing_environment),
+            Path(results_dir),
+        )
+        snakefile = write_snakefile(pipeline, pipeline_cache_key, cached_pipeline)
+    if config.cache_dir:
+        prepare_cache(config)
     environment_args = get_environment_args(config)
     singularity_args = get_singularity_args(config)
     # Set source cache in appropriate location to avoid jenkins failures
@@ -41,6 +91,11 @@ def main(
     # We need to set a dummy environment variable to avoid logging a wall of text.
     # TODO [MIC-4920]: Remove when https://github.com/snakemake/snakemake-interface-executor-plugins/issues/55 merges
     os.environ["foo"] = "bar"
+    if pipeline.spark_is_required and config.spark_cluster_dir:
+        prepare_spark_cluster(pipeline, environment_args, singularity_args)
+    # Snakemake is slow to import and so is only imported once a run starts
+    from snakemake.cli import main as snake_main
+
     argv = [
         "--snakefile",
         str(snakefile),
@@ -51,6 +106,8 @@ def main(
         "--jobs",
         "unlimited",
         "--latency-wait=120",
+        "--retries",
+        str(retries),
         ## See above
         "--envvars",
         "foo",
@@ -58,6 +115,16 @@ def main(
         "--singularity-args",
         singularity_args,
     ]
+    if resume:
+        if unlock:
+            unlock_results_directory(snake_main, argv, results_dir)
+        elif is_locked(results_dir):
+            logger.warning(
+                f"{results_dir} is locked by another run. If no other run is active "
+                "there (e.g. the previous run died), resume it with --unlock."
+            )
+        # Jobs that were running when the previous run died left partial outputs behind
+        argv += ["--rerun-incomplete"]
     if not debug:
         # Suppress some of the snakemake output
         argv += [
@@ -69,6 +136,252 @@ def main(
     snake_main(argv)
 
 
+def is_locked(results_dir: str) -> bool:
+    """Whether a snakemake run holds (or, if it died, left behind) a lock on the
+    results directory."""
+    return any((Path(results_dir) / ".snakemake" / "locks").glob("*.lock"))
+
+
+def unlock_results_directory(snake_main: Callable, argv: List[str], results_dir: str) -> None:
+    """Remove the locks on the results directory. Snakemake always exits, so a
+    failure is told apart by its exit code."""
+    logger.info(f"Unlocking {results_dir}")
+    try:
+        snake_main(argv + ["--unlock", "--quiet", "all"])
+    except SystemExit as e:
+        if e.code:
+            logger.warning(
+                f"Failed to unlock {results_dir}: snakemake exited with code {e.code}"
+            )
+
+
+def dry_run(
+    pipeline_specification: str,
+    input_data: str,
+    computing_environment: Optional[str],
+    results_dir: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Plan a pipeline run without running anything.
+
+    The pipeline is resolved and its Snakefile written to a temporary directory
+    before snakemake determines which outputs would need to be (re)built in
+    ``results_dir`` (e.g. a previous or interrupted run) or, if not given, in a
+    new results directory. Jobs whose outputs would be restored from the step
+    output cache (see ``Pipeline.get_cache_hits``) are reported separately from
+    those that would run. See ``Pipeline.get_plan`` for the estimated cost of the
+    latter.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        config_params = load_params_from_specification(
+            pipeline_specification, input_data, computing_environment, tmp_dir
+        )
+        pipeline_cache_key = get_pipeline_cache_key(config_params)
+        pipeline, cached_pipeline = load_pipeline(config_params, pipeline_cache_key)
+        # Nothing is added to the pipeline cache since nothing is run
+        snakefile = write_snakefile(
+            pipeline, pipeline_cache_key, cached_pipeline, store=False
+        )
+        summary = get_snakemake_summary(snakefile, Path(results_dir or tmp_dir))
+        pending_outputs = {
+            row["output_file"] for row in summary if row["plan"] == PENDING_PLAN
+        }
+        cache_hits = pipeline.get_cache_hits(pending_outputs, Path(results_dir or tmp_dir))
+    cache_hit_rules = {
+        pipeline.pipeline_graph.nodes[node]["implementation"].name for node in cache_hits
+    }
+    cached_outputs = {
+        row["output_file"] for row in summary if row["rule"] in cache_hit_rules
+    } & pending_outputs
+    pending_rules = {row["rule"] for row in summary if row["output_file"] in pending_outputs}
+    return {
+        "pending_jobs": sorted(pending_rules - cache_hit_rules),
+        "cache_hit_jobs": sorted(cache_hit_rules),
+        "up_to_date_jobs": sorted({row["rule"] for row in summary} - pending_rules),
+        "num_outputs": len(summary),
+        "num_pending_outputs": len(pending_outputs - cached_outputs),
+        "num_cached_outputs": len(cached_outputs),
+        **pipeline.get_plan(pending_outputs - cached_outputs),
+    }
+
+
+def get_snakemake_summary(snakefile: Path, results_dir: Path) -> List[Dict[str, str]]:
+    """Get snakemake's summary of a Snakefile's outputs in a results directory,
+    i.e. each output's rule, status and whether it would be (re)built."""
+    process = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "snakemake",
+            "--snakefile",
+            str(snakefile),
+            "--directory",
+            str(results_dir),
+            "--cores",
+            "all",
+            "--nolock",
+            "--summary",
+        ],
+        capture_output=True,
+        text=True,
+    )
+    if process.returncode:
+        raise RuntimeError(f"Snakemake failed to plan the pipeline:\n{process.stderr}")
+    lines = process.stdout.splitlines()
+    header = next(i for i, line in enumerate(lines) if line.startswith("output_file\t"))
+    return list(csv.DictReader(lines[header:], delimiter="\t"))
+
+
+def load_pipeline(
+    config_params: Dict[str, Any], pipeline_cache_key: str
+) -> Tuple[Pipeline, Optional[Dict[str, Any]]]:
+    """Resolve a pipeline from its specifications, reusing the previously resolved
+    pipeline (also returned, if any) from the pipeline cache if possible. Resolved
+    pipelines are only cached alongside the step outputs, i.e. if caching is
+    enabled."""
+    cache_dir = get_cache_dir(config_params["environment"])
+    cached_pipeline = (
+        load_cached_pipeline(cache_dir, pipeline_cache_key) if cache_dir else None
+    )
+    if cached_pipeline:
+        logger.info("Reusing previously resolved pipeline")
+        config = Config(config_params, schema=cached_pipeline["schema"])
+        return (
+            Pipeline(config, pipeline_graph=cached_pipeline["pipeline_graph"]),
+            cached_pipeline,
+        )
+    return Pipeline(Config(config_params)), None
+
+
+def write_snakefile(
+    pipeline: Pipeline,
+    pipeline_cache_key: str,
+    cached_pipeline: Optional[Dict[str, Any]],
+    store: bool = True,
+) -> Path:
+    """Write the pipeline's Snakefile, adding the resolved pipeline to the pipeline
+    cache (if enabled and ``store`` is True) if it was not already there."""
+    if cached_pipeline:
+        pipeline.create_diagnostics_directories()
+        snakefile = pipeline.snakefile_path
+        snakefile.write_text(cached_pipeline["snakefile"])
+        return snakefile
+    snakefile = pipeline.build_snakefile()
+    if not (store and pipeline.config.cache_dir):
+        return snakefile
+    store_cached_pipeline(
+        pipeline.config.cache_dir,
+        pipeline_cache_key,
+        {
+            "schema": pipeline.config.schema,
+            "pipeline_graph": pipeline.pipeline_graph,
+            "snakefile": snakefile.read_text(),
+        },
+    )
+    return snakefile
+
+
+def prepare_resume(
+    pipeline: Pipeline,
+    pipeline_specification: Path,
+    input_data: Path,
+    computing_environment: Optional[Path],
+) -> Path:
+    """Check that an existing results directory can be resumed with the provided
+    configuration and return its Snakefile."""
+    results_dir = pipeline.config.results_dir
+    errors = {}
+    if not pipeline.snakefile_path.is_file():
+        errors[str(pipeline.snakefile_path)] = [
+            "Snakefile not found; only a previously started run can be resumed."
+        ]
+    for filepath in get_mismatched_configuration_files(
+        pipeline_specification, input_data, computing_environment, results_dir
+    ):
+        errors[filepath] = [
+            f"Does not match the copy in the results directory being resumed ({results_dir})."
+        ]
+    if errors:
+        exit_with_validation_error({RESUME_ERRORS_KEY: errors})
+    incomplete_nodes = pipeline.pipeline_graph.get_incomplete_nodes(results_dir)
+    num_nodes = len(pipeline.pipeline_graph.implementation_nodes)
+    logger.info(
+        f"Resuming {results_dir}: {num_nodes - len(incomplete_nodes)} of {num_nodes} "
+        f"implementations already complete. Remaining: {incomplete_nodes}"
+    )
+    return pipeline.snakefile_path
+
+
+def prepare_spark_cluster(
+    pipeline: Pipeline, environment_args: List[str], singularity_args: str
+) -> None:
+    """Attach to the long-lived spark cluster if it is running; otherwise start
+    one in the background (where it keeps running after the pipeline finishes
+    until stopped with ``easylink spark stop``) and wait for it to be ready."""
+    config = pipeline.config
+    cluster_dir = config.spark_cluster_dir
+    if spark_utils.is_cluster_healthy(cluster_dir):
+        state = spark_utils.get_cluster_state(cluster_dir)
+        logger.info(f"Attaching to running spark cluster at {state['master_url']}")
+        if state["num_workers"] != config.spark_resources["num_workers"]:
+            logger.warning(
+                f"The running spark cluster has {state['num_workers']} workers rather "
+                f"than the {config.spark_resources['num_workers']} requested."
+            )
+        return
+
+    logger.info(f"Starting long-lived spark cluster in {cluster_dir}")
+    cluster_dir.mkdir(parents=True, exist_ok=True)
+    # Clear out any remnants of a previous cluster
+    (cluster_dir / spark_utils.TERMINATE_FILE).unlink(missing_ok=True)
+    spark_utils.remove_cluster_state(cluster_dir)
+    snakefile = pipeline.build_spark_cluster_snakefile(cluster_dir)
+    argv = [
+        sys.executable,
+        "-m",
+        "snakemake",
+        "--snakefile",
+        str(snakefile),
+        "--directory",
+        str(cluster_dir),
+        "--cores",
+        "all",
+        "--jobs",
+        "unlimited",
+        "--nolock",
+        "--use-singularity",
+        "--singularity-args",
+        singularity_args,
+        "--quiet",
+        "progress",
+    ] + environment_args
+    with open(cluster_dir / spark_utils.CLUSTER_LOG_FILE, "w") as log:
+        process = subprocess.Popen(
+            argv,
+            cwd=cluster_dir,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+    timeout = config.spark["master_timeout"] + config.spark["worker_timeout"]
+    interval = config.spark["poll_interval"]
+    start = time.time()
+    while not spark_utils.is_cluster_healthy(cluster_dir):
+        if process.poll() is not None:
+            raise RuntimeError(
+                "The spark cluster failed to start; see "
+                f"{cluster_dir / spark_utils.CLUSTER_LOG_FILE} for details."
+            )
+        if time.time() - start > timeout:
+            process.terminate()
+            raise RuntimeError(f"The spark cluster did not start within {timeout} seconds.")
+        time.sleep(interval)
+        interval = min(interval * 2, config.spark["max_poll_interval"])
+    logger.info(
+        "Spark cluster started at "
+        f"{spark_utils.get_cluster_state(cluster_dir)['master_url']}"
+    )
+
+
 def get_singularity_args(config: Config) -> str:
     """Get the singularity arguments for the pipeline run."""
     input_file_paths = ",".join(
@@ -77,10 +390,23 @@ def get_singularity_args(config: Config) -> str:
     singularity_args = "--no-home --containall"
     easylink_tmp_dir = EASYLINK_TEMP[config.computing_environment]
     easylink_tmp_dir.mkdir(parents=True, exist_ok=True)
-    singularity_args += f" -B {easylink_tmp_dir}:/tmp,$(pwd),{input_file_paths} --pwd $(pwd)"
+    cache_bind = f",{config.cache_dir}" if config.cache_dir else ""
+    singularity_args += (
+        f" -B {easylink_tmp_dir}:/tmp,$(pwd),{input_file_paths}{cache_bind} --pwd $(pwd)"
+    )
     return singularity_args
 
 
+def prepare_cache(config: Config) -> None:
+    """Create the step output cache and evict least recently used entries
+    so that it stays within its configured size."""
+    (config.cache_dir / OUTPUTS_DIR).mkdir(parents=True, exist_ok=True)
+    max_size = int(config.cache["max_size"] * 1024**3)
+    evicted = prune_cache(config.cache_dir, max_size)
+    if evicted:
+        logger.info(f"Evicted {len(evicted)} entries from the step output cache")
+
+
 def get_environment_args(config: Config) -> List[str]:
     # Set up computing environment
     if config.computing_environment == "local":
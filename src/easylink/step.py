@@ -5,9 +5,7 @@ import networkx as nx
 from layered_config_tree import LayeredConfigTree
 
 from easylink.graph_components import Edge, InputSlot, OutputSlot, SlotMapping
-from easylink.implementation import Implementation
-from easylink.utilities import paths
-from easylink.utilities.data_utils import load_yaml
+from easylink.implementation import IMPLEMENTATION_REGISTRY, Implementation
 
 
 class Step(ABC):
@@ -118,7 +116,6 @@ class BasicStep(Step):
     def validate_step(self, step_config: LayeredConfigTree) -> Dict[str, List[str]]:
         """Return error strings if the step configuration is incorrect."""
         errors = {}
-        metadata = load_yaml(paths.IMPLEMENTATION_METADATA)
         if not "implementation" in step_config:
             errors[f"step {self.name}"] = [
                 "The step configuration does not contain an 'implementation' key."
@@ -127,10 +124,10 @@ class BasicStep(Step):
             errors[f"step {self.name}"] = [
                 "The implementation configuration does not contain a 'name' key."
             ]
-        elif not step_config["implementation"]["name"] in metadata:
+        elif not step_config["implementation"]["name"] in IMPLEMENTATION_REGISTRY:
             errors[f"step {self.name}"] = [
                 f"Implementation '{step_config['implementation']['name']}' is not supported. "
-                f"Supported implementations are: {list(metadata.keys())}."
+                f"Supported implementations are: {IMPLEMENTATION_REGISTRY.names}."
             ]
         return errors
 
@@ -3,7 +3,9 @@ import logging
 import os
 
 import pandas as pd
+import pyarrow as pa
 import yaml
+from pyarrow import parquet as pq
 
 logging.basicConfig(
     level=logging.INFO,
@@ -11,17 +13,96 @@ logging.basicConfig(
     handlers=[logging.StreamHandler()],
 )
 
+# Inputs are read, transformed and written this many rows at a time so that the
+# whole dataset is never held in memory
+BATCH_SIZE = 100_000
 
-def load_file(file_path, file_format=None):
-    if file_format is None:
-        file_format = file_path.split(".")[-1]
-    if file_format == "parquet":
-        return pd.read_parquet(file_path)
+
+def get_file_format(file_path):
+    if os.path.isdir(file_path):
+        # A partitioned parquet dataset
+        return "dataset"
+    return file_path.split(".")[-1]
+
+
+def get_parquet_files(file_path):
+    if get_file_format(file_path) == "dataset":
+        return sorted(glob.glob(f"{file_path.rstrip('/')}/*.parquet"))
+    return [file_path]
+
+
+def load_columns(file_path):
+    file_format = get_file_format(file_path)
+    if file_format in ("dataset", "parquet"):
+        return pq.read_schema(get_parquet_files(file_path)[0]).names
     if file_format == "csv":
-        return pd.read_csv(file_path)
+        return list(pd.read_csv(file_path, nrows=0).columns)
+    if file_format == "arrow":
+        with pa.memory_map(file_path) as source:
+            return pa.ipc.open_file(source).schema.names
     raise ValueError()
 
 
+def load_batches(file_path):
+    file_format = get_file_format(file_path)
+    if file_format in ("dataset", "parquet"):
+        for parquet_file in get_parquet_files(file_path):
+            for batch in pq.ParquetFile(parquet_file).iter_batches(batch_size=BATCH_SIZE):
+                yield batch.to_pandas()
+    elif file_format == "csv":
+        yield from pd.read_csv(file_path, chunksize=BATCH_SIZE)
+    elif file_format == "arrow":
+        # Arrow IPC files are memory-mapped and converted one record batch at a time,
+        # without consolidating the columns into 2D blocks
+        with pa.memory_map(file_path) as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                yield reader.get_batch(i).to_pandas(split_blocks=True)
+    else:
+        raise ValueError()
+
+
+class OutputWriter:
+    """Writes an output file one batch at a time."""
+
+    def __init__(self, file_path, file_format):
+        self.file_path = file_path
+        self.file_format = file_format
+        self.writer = None
+        self.schema = None
+
+    def write(self, df):
+        if self.schema is None:
+            # The first batch fixes the output schema; later batches are cast to it
+            self.schema = pa.Schema.from_pandas(df, preserve_index=False)
+            if self.file_path.endswith("/"):
+                os.makedirs(self.file_path, exist_ok=True)
+                self.writer = pq.ParquetWriter(
+                    f"{self.file_path}part-00000.parquet", self.schema
+                )
+            elif self.file_format == "parquet":
+                self.writer = pq.ParquetWriter(self.file_path, self.schema)
+            elif self.file_format == "arrow":
+                self.writer = pa.ipc.new_file(self.file_path, self.schema)
+            elif self.file_format == "csv":
+                df.to_csv(self.file_path, index=False)
+                return
+            else:
+                raise ValueError()
+        if self.writer is None:
+            df.to_csv(self.file_path, mode="a", header=False, index=False)
+        else:
+            self.writer.write_table(
+                pa.Table.from_pandas(df, schema=self.schema, preserve_index=False)
+            )
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        if self.file_path.endswith("/"):
+            open(f"{self.file_path}_SUCCESS", "w").close()
+
+
 diagnostics = {}
 
 if "DUMMY_CONTAINER_MAIN_INPUT_FILE_PATHS" in os.environ:
@@ -29,13 +110,7 @@ if "DUMMY_CONTAINER_MAIN_INPUT_FILE_PATHS" in os.environ:
 else:
     main_input_file_paths = glob.glob("/input_data/main_input*")
 
-logging.info("Loading main input")
 diagnostics["num_main_input_files"] = len(main_input_file_paths)
-df = load_file(main_input_file_paths[0])
-
-for path in main_input_file_paths[1:]:
-    logging.info("Loading additional primary input")
-    df = pd.concat([df, load_file(path)], ignore_index=True).fillna(0)
 
 if "DUMMY_CONTAINER_SECONDARY_INPUT_FILE_PATHS" in os.environ:
     secondary_input_file_paths = os.environ[
@@ -46,10 +121,6 @@ else:
 
 diagnostics["num_secondary_input_files"] = len(secondary_input_file_paths)
 
-for path in secondary_input_file_paths:
-    logging.info("Loading secondary input")
-    df = pd.concat([df, load_file(path)], ignore_index=True).fillna(0)
-
 extra_implementation_specific_input_glob = glob.glob(
     "/extra_implementation_specific_input_data/input*"
 )
@@ -64,31 +135,28 @@ extra_implementation_specific_input_file_path = os.getenv(
 diagnostics["extra_implementation_specific_input"] = (
     extra_implementation_specific_input_file_path is not None
 )
+
+input_file_paths = main_input_file_paths + secondary_input_file_paths
 if extra_implementation_specific_input_file_path is not None:
-    logging.info("Loading extra, implementation-specific input")
-    df = pd.concat(
-        [df, load_file(extra_implementation_specific_input_file_path)], ignore_index=True
-    ).fillna(0)
+    input_file_paths.append(extra_implementation_specific_input_file_path)
 
-logging.info(f"Total input length is {len(df)}")
+# The inputs are stacked: the output has the union of their columns and, when there
+# is more than one input, missing values are filled with 0
+columns = []
+for path in input_file_paths:
+    columns += [c for c in load_columns(path) if c not in columns]
+fill_missing = len(input_file_paths) > 1
 
 broken = os.getenv("DUMMY_CONTAINER_BROKEN", "false").lower() in ("true", "yes", "1")
 diagnostics["broken"] = broken
-if broken:
-    df = df.rename(
-        columns={
-            "foo": "wrong",
-            "bar": "column",
-            "counter": "names",
-        }
-    )
-else:
+if not broken:
     increment = int(os.getenv("DUMMY_CONTAINER_INCREMENT", "1"))
     diagnostics["increment"] = increment
     logging.info(f"Increment is {increment}")
-    df["counter"] = df.counter + increment
 
-    added_columns_existing = [c for c in df.columns if "added_column_" in c]
+    # The added columns depend only on the input columns, so they are worked out
+    # once rather than per batch
+    added_columns_existing = [c for c in columns if "added_column_" in c]
     diagnostics["added_columns_existing"] = added_columns_existing
     added_columns_existing_ints = [int(c.split("_")[-1]) for c in added_columns_existing]
     max_added_column = max(added_columns_existing_ints, default=0) + increment
@@ -96,17 +164,36 @@ else:
     added_columns_desired = range(min_added_column, max_added_column + 1)
     added_columns_desired_names = [f"added_column_{i}" for i in added_columns_desired]
     diagnostics["added_columns_desired_names"] = added_columns_desired_names
-    diagnostics["new_columns"] = []
-    for column_index, column_name in zip(added_columns_desired, added_columns_desired_names):
-        if column_name not in df.columns:
-            diagnostics["new_columns"].append(column_name)
-            df[column_name] = column_index
+    new_columns = {
+        column_name: column_index
+        for column_index, column_name in zip(
+            added_columns_desired, added_columns_desired_names
+        )
+        if column_name not in columns
+    }
+    diagnostics["new_columns"] = list(new_columns)
 
     columns_to_drop = [
-        c for c in df.columns if "added_column_" in c and c not in added_columns_desired_names
+        c for c in columns if "added_column_" in c and c not in added_columns_desired_names
     ]
     diagnostics["columns_to_drop"] = columns_to_drop
-    df.drop(columns=columns_to_drop, inplace=True)
+
+
+def transform(df):
+    df = df.reindex(columns=columns)
+    if fill_missing:
+        df = df.fillna(0)
+    if broken:
+        return df.rename(
+            columns={
+                "foo": "wrong",
+                "bar": "column",
+                "counter": "names",
+            }
+        )
+    df["counter"] = df.counter + increment
+    return df.assign(**new_columns).drop(columns=columns_to_drop)
+
 
 output_file_format = os.getenv("DUMMY_CONTAINER_OUTPUT_FILE_FORMAT", "parquet")
 output_file_paths = os.getenv(
@@ -116,14 +203,31 @@ output_file_paths = os.getenv(
 diagnostics["num_output_files"] = len(output_file_paths)
 diagnostics["output_file_paths"] = output_file_paths
 
+writers = []
 for output_file_path in output_file_paths:
     logging.info(f"Writing output to {output_file_path} in {output_file_format} format")
-    if output_file_format == "parquet":
-        df.to_parquet(output_file_path)
-    elif output_file_format == "csv":
-        df.to_csv(output_file_path, index=False)
-    else:
-        raise ValueError()
+    writers.append(OutputWriter(output_file_path, output_file_format))
+
+input_length = 0
+for path in input_file_paths:
+    logging.info(f"Loading input {path}")
+    for df in load_batches(path):
+        input_length += len(df)
+        df = transform(df)
+        for writer in writers:
+            writer.write(df)
+
+if input_length == 0:
+    # Write the (empty) output with the right columns
+    df = transform(pd.DataFrame(columns=columns))
+    for writer in writers:
+        writer.write(df)
+
+# The dataset _SUCCESS markers are only written once all the batches are
+for writer in writers:
+    writer.close()
+
+logging.info(f"Total input length is {input_length}")
 
 diagnostics_dir = os.getenv("DUMMY_CONTAINER_DIAGNOSTICS_DIRECTORY", "/diagnostics")
 try:
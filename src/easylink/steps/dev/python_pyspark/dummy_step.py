@@ -3,6 +3,7 @@ import logging
 import os
 
 import pandas as pd
+import pyarrow as pa
 import yaml
 from pyspark.sql import SparkSession
 from pyspark.sql.functions import col, lit
@@ -24,12 +25,24 @@ spark = SparkSession.builder.master(
 
 
 def load_file(file_path, file_format=None):
+    if os.path.isdir(file_path):
+        # A partitioned parquet dataset
+        return spark.read.parquet(file_path)
     if file_format is None:
         file_format = file_path.split(".")[-1]
     if file_format == "parquet":
         return spark.read.parquet(file_path)
     if file_format == "csv":
         return spark.read.csv(file_path, header=True, inferSchema=True)
+    if file_format == "arrow":
+        # Spark has no Arrow IPC reader, so go via a memory-mapped pyarrow table. It
+        # is converted column by column, releasing each Arrow column once converted,
+        # so that the data is not held twice.
+        with pa.memory_map(file_path) as source:
+            table = pa.ipc.open_file(source).read_all()
+            df = table.to_pandas(self_destruct=True, split_blocks=True)
+            del table
+            return spark.createDataFrame(df)
     raise ValueError()
 
 
@@ -128,11 +141,16 @@ diagnostics["output_file_paths"] = output_file_paths
 
 for output_file_path in output_file_paths:
     logging.info(f"Writing output to {output_file_path} in {output_file_format} format")
+    if output_file_path.endswith("/"):
+        # A partitioned parquet dataset, written in parallel by the executors
+        df.write.mode("overwrite").parquet(output_file_path)
     # NOTE: Go back to pandas in order to save a single file
-    if output_file_format == "parquet":
+    elif output_file_format == "parquet":
         df.toPandas().to_parquet(output_file_path)
     elif output_file_format == "csv":
         df.toPandas().to_csv(output_file_path, index=False)
+    elif output_file_format == "arrow":
+        df.toPandas().to_feather(output_file_path, compression="uncompressed")
     else:
         raise ValueError()
 
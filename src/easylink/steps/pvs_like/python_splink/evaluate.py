@@ -0,0 +1,69 @@
+"""Evaluates the PIKs assigned to census records against the ground truth.
+
+The census records are passed through with the simulant each record truly is
+and the simulant of the reference file record its PIK belongs to; summary
+metrics, and the census records that were assigned a wrong PIK alongside the
+reference file records they were confused for, are written as diagnostics.
+"""
+
+from pvs_like_utils import (
+    REFERENCE_FILE,
+    get_diagnostics_dir,
+    get_input_path,
+    get_output_path,
+    load_file,
+    write_diagnostics,
+    write_file,
+)
+
+census_2030 = load_file(get_input_path("DUMMY_CONTAINER_CENSUS_2030_WITH_PIKS_FILE_PATHS"))
+census_2030_ground_truth = load_file(
+    get_input_path("DUMMY_CONTAINER_CENSUS_2030_GROUND_TRUTH_FILE_PATHS")
+).set_index("record_id")["simulant_id"]
+reference_file_ground_truth = load_file(
+    get_input_path("DUMMY_CONTAINER_REFERENCE_FILE_GROUND_TRUTH_FILE_PATHS")
+).set_index("record_id")["simulant_id"]
+records = load_file(get_input_path("DUMMY_CONTAINER_RECORDS_FILE_PATHS"))
+reference_file = records[records.dataset_name == REFERENCE_FILE]
+# In the reference file, PIKs identify records
+simulant_id_of_pik = reference_file.record_id.map(reference_file_ground_truth)
+simulant_id_of_pik.index = reference_file.pik
+
+census_2030 = census_2030.assign(
+    simulant_id=census_2030.record_id.map(census_2030_ground_truth),
+    pik_simulant_id=census_2030.pik.map(simulant_id_of_pik),
+)
+piked = census_2030.pik.notnull()
+correct = piked & (census_2030.pik_simulant_id == census_2030.simulant_id)
+# Census records truly not in the reference file cannot be PIKed
+linkable = census_2030.simulant_id.isin(reference_file_ground_truth)
+# Multiple census records assigned the same PIK, indicating the model thinks they
+# are duplicates in the census
+pik_counts = census_2030.pik.value_counts()
+
+errors = census_2030[piked & ~correct]
+comparison_columns = [c for c in records.columns if c in census_2030.columns and c != "pik"]
+confused_for = (
+    reference_file.set_index("pik")
+    .loc[errors.pik, comparison_columns]
+    .set_index(errors.index)
+)
+errors[comparison_columns].compare(
+    confused_for,
+    keep_shape=True,
+    keep_equal=True,
+    result_names=("census_2030", REFERENCE_FILE),
+).to_csv(f"{get_diagnostics_dir()}/errors.csv")
+
+write_file(census_2030, get_output_path())
+write_diagnostics(
+    {
+        "num_records": len(census_2030),
+        "fraction_piked": float(piked.mean()),
+        "fraction_linkable": float(linkable.mean()),
+        "recall": float(correct.sum() / linkable.sum()) if linkable.any() else None,
+        "precision": float(correct.sum() / piked.sum()) if piked.any() else None,
+        "num_errors": len(errors),
+        "num_piks_assigned_to_multiple_records": int((pik_counts > 1).sum()),
+    }
+)
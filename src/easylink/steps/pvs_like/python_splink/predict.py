@@ -0,0 +1,188 @@
+"""Runs the matching passes of a search (geosearch or namesearch, the first
+argument) and writes every link scored above the model's probability threshold,
+labelled with the (1-based) number of the pass that found it.
+
+Within a search, census records found by one pass are not considered by later
+passes. Passes of different searches are independent; which links each census
+record ends up with is decided downstream, by the resolve step.
+"""
+
+import itertools
+import json
+import logging
+import os
+import sys
+
+import duckdb
+import pandas as pd
+from pvs_like_utils import (
+    CENSUS_2030,
+    REFERENCE_FILE,
+    create_splink_tables,
+    get_diagnostics_dir,
+    get_input_path,
+    get_output_path,
+    load_file,
+    write_diagnostics,
+    write_file,
+)
+from splink.duckdb.duckdb_linker import DuckDBLinker
+
+# The columns each search always blocks on ("cuts the database" by), followed
+# by the additional blocking columns of each of its passes, in order
+SEARCHES = {
+    "geosearch": (
+        ["zip3"],
+        [
+            ["first_name", "middle_initial", "last_name", "geokey"],
+            ["first_name", "geokey"],
+            ["first_name", "middle_initial", "last_name", "street_number", "street_name"],
+            ["first_name", "street_number", "street_name"],
+            ["first_name", "last_name"],
+        ],
+    ),
+    "namesearch": (
+        ["first_initial_cut", "last_initial_cut"],
+        [
+            ["first_name", "middle_initial", "last_name", "date_of_birth"],
+            ["first_name", "date_of_birth"],
+            ["last_name", "date_of_birth"],
+            ["date_of_birth"],
+        ],
+    ),
+}
+TERM_FREQUENCY_COLUMNS = ["first_name", "last_name"]
+# Whether each pass reports the mean match probability of each combination of
+# column similarity values (which requires scoring every blocked pair, not only the links)
+GAMMA_DIAGNOSTICS = os.getenv("PVS_LIKE_GAMMA_DIAGNOSTICS", "true").lower() in [
+    "true",
+    "1",
+]
+
+search = sys.argv[1]
+cut_cols, passes = SEARCHES[search]
+
+with open(get_input_path("DUMMY_CONTAINER_MODEL_FILE_PATHS")) as f:
+    model = json.load(f)
+splink_settings = model["splink_settings"]
+probability_threshold = model["probability_threshold"]
+
+records = load_file(get_input_path("DUMMY_CONTAINER_RECORDS_FILE_PATHS"))
+piks = records.loc[records.dataset_name == REFERENCE_FILE].set_index("record_id").pik
+connection = duckdb.connect()
+create_splink_tables(connection, records)
+del records
+
+# Term frequencies are computed once, from the full tables, rather than in every pass
+linker = DuckDBLinker(
+    [REFERENCE_FILE, CENSUS_2030],
+    splink_settings,
+    connection=connection,
+    input_table_aliases=[REFERENCE_FILE, CENSUS_2030],
+)
+term_frequency_tables = {
+    col: linker.compute_tf_table(col).as_pandas_dataframe() for col in TERM_FREQUENCY_COLUMNS
+}
+
+# Census records that have been found by a previous pass; only the rest are
+# eligible to match in the next pass
+connection.execute(
+    f"CREATE TABLE census_2030_found AS SELECT record_id FROM {CENSUS_2030} WHERE false"
+)
+pass_numbers = itertools.count(1)
+
+
+def matching_pass(blocking_cols):
+    pass_number = next(pass_numbers)
+    # The view is named by pass since splink caches tables by their SQL
+    unfound_census = f"census_2030_unfound_{pass_number}"
+    connection.execute(
+        f"""
+        CREATE VIEW {unfound_census} AS
+        SELECT * FROM {CENSUS_2030}
+        WHERE record_id NOT IN (SELECT record_id FROM census_2030_found)
+        """
+    )
+    blocking_rule = " and ".join(f"l.{col} = r.{col}" for col in blocking_cols)
+    linker = DuckDBLinker(
+        [REFERENCE_FILE, unfound_census],
+        {**splink_settings, "blocking_rules_to_generate_predictions": [blocking_rule]},
+        connection=connection,
+        # Must match order of the input tables
+        input_table_aliases=[REFERENCE_FILE, CENSUS_2030],
+    )
+    for col, term_frequency_table in term_frequency_tables.items():
+        linker.register_term_frequency_lookup(term_frequency_table, col)
+
+    if GAMMA_DIAGNOSTICS:
+        # Score every blocked pair once: the links are those above the threshold and
+        # the diagnostic is aggregated from all of them
+        predictions = linker.predict()
+    else:
+        predictions = linker.predict(threshold_match_probability=probability_threshold)
+    # Either dataset can be on either side of a scored pair
+    links = connection.execute(
+        f"""
+        SELECT
+            {pass_number} AS pass_number,
+            CASE WHEN source_dataset_l = '{CENSUS_2030}' THEN record_id_l ELSE record_id_r END
+                AS record_id_census_2030,
+            CASE WHEN source_dataset_l = '{CENSUS_2030}' THEN record_id_r ELSE record_id_l END
+                AS record_id_reference_file,
+            match_probability
+        FROM {predictions.physical_name}
+        WHERE match_probability >= ?
+        """,
+        [probability_threshold],
+    ).df()
+    links["pik"] = piks.loc[links.record_id_reference_file].values
+    logging.info(
+        f"Pass {pass_number}: {len(links)} links above threshold for "
+        f"{links.record_id_census_2030.nunique()} census records"
+    )
+
+    if GAMMA_DIAGNOSTICS:
+        # The predicted values for each combination of column similarity values,
+        # aggregated in DuckDB so that only one row per combination is materialized
+        columns = (
+            connection.execute(f"SELECT * FROM {predictions.physical_name} LIMIT 0")
+            .df()
+            .columns
+        )
+        gamma_cols = [c for c in columns if c.startswith("gamma_")]
+        all_combos = connection.execute(
+            f"""
+            SELECT {", ".join(gamma_cols)},
+                avg(match_probability) AS mean,
+                count(*) AS count
+            FROM {predictions.physical_name}
+            GROUP BY {", ".join(gamma_cols)}
+            ORDER BY mean
+            """
+        ).df()
+        all_combos.to_parquet(
+            f"{get_diagnostics_dir()}/pass_{pass_number}_gamma_combinations.parquet"
+        )
+    predictions.drop_table_from_database()
+
+    connection.register("links", links)
+    connection.execute(
+        "INSERT INTO census_2030_found SELECT DISTINCT record_id_census_2030 FROM links"
+    )
+    connection.unregister("links")
+    return links
+
+
+all_links = [matching_pass(cut_cols + blocking_cols) for blocking_cols in passes]
+links = pd.concat(all_links, ignore_index=True)
+write_file(links, get_output_path())
+write_diagnostics(
+    {
+        "search": search,
+        "gamma_diagnostics": GAMMA_DIAGNOSTICS,
+        "links_per_pass": [len(pass_links) for pass_links in all_links],
+        "census_records_found_per_pass": [
+            int(pass_links.record_id_census_2030.nunique()) for pass_links in all_links
+        ],
+    }
+)
@@ -0,0 +1,50 @@
+"""Prepares the census and reference file for linkage: the columns that splink
+compares and those used to block ("cut the database") in each matching pass,
+for both datasets stacked into a single table of records. The derived columns
+are built by the pvs_like_features module shared with the case study
+implementations."""
+
+import numpy as np
+import pandas as pd
+from pvs_like_features import add_features
+from pvs_like_utils import (
+    CENSUS_2030,
+    REFERENCE_FILE,
+    get_input_path,
+    get_output_path,
+    load_file,
+    write_diagnostics,
+    write_file,
+)
+
+census_2030 = load_file(get_input_path("DUMMY_CONTAINER_CENSUS_2030_FILE_PATHS"))
+reference_file = load_file(get_input_path("DUMMY_CONTAINER_REFERENCE_FILE_PATHS"))
+
+# Use NaN for all forms of missingness, including empty string
+reference_file = reference_file.fillna(np.nan).replace("", np.nan)
+census_2030 = census_2030.fillna(np.nan).replace("", np.nan)
+
+# We want to compare mailing address with physical address
+reference_file = reference_file.rename(columns=lambda c: c.replace("mailing_address_", ""))
+
+common_cols = [c for c in reference_file.columns if c in census_2030.columns]
+records = pd.concat(
+    [
+        reference_file[common_cols + ["pik"]].assign(dataset_name=REFERENCE_FILE),
+        # Census records have yet to be assigned a PIK
+        census_2030[common_cols].assign(dataset_name=CENSUS_2030),
+    ],
+    ignore_index=True,
+).astype({"pik": "Int64"})
+# Computed on the stacked records so that both datasets share the categories of
+# each blocking column
+records = add_features(records)
+
+write_file(records, get_output_path())
+write_diagnostics(
+    {
+        "num_census_2030_records": len(census_2030),
+        "num_reference_file_records": len(reference_file),
+        "columns": list(records.columns),
+    }
+)
@@ -0,0 +1,84 @@
+"""Utilities shared by the pvs_like pipeline schema's step implementations.
+
+Each implementation reads its inputs from (comma-separated) file paths in
+environment variables named by its schema input slots and writes its single
+output to DUMMY_CONTAINER_OUTPUT_PATHS.
+"""
+
+import logging
+import os
+
+import pandas as pd
+import pyarrow as pa
+import yaml
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(message)s",
+    handlers=[logging.StreamHandler()],
+)
+
+# The datasets being linked, as named in the preprocessed records
+CENSUS_2030 = "census_2030"
+REFERENCE_FILE = "reference_file"
+
+
+def get_input_path(env_var):
+    """Returns the single file passed to an input slot."""
+    paths = os.environ[env_var].split(",")
+    if len(paths) != 1:
+        raise ValueError(f"Expected a single file in {env_var} but got {paths}")
+    return paths[0]
+
+
+def get_output_path():
+    return os.environ["DUMMY_CONTAINER_OUTPUT_PATHS"].split(",")[0]
+
+
+def load_file(file_path, columns=None):
+    logging.info(f"Loading {file_path}")
+    if os.path.isdir(file_path) or file_path.endswith(".parquet"):
+        return pd.read_parquet(file_path, columns=columns)
+    if file_path.endswith(".csv"):
+        return pd.read_csv(file_path, usecols=columns)
+    if file_path.endswith(".arrow"):
+        # Arrow IPC files are memory-mapped rather than read and decoded
+        with pa.memory_map(file_path) as source:
+            table = pa.ipc.open_file(source).read_all()
+        return (table.select(columns) if columns else table).to_pandas()
+    raise ValueError(f"Unsupported file type: {file_path}")
+
+
+def write_file(df, file_path):
+    logging.info(f"Writing {len(df)} rows to {file_path}")
+    if file_path.endswith(".parquet"):
+        df.to_parquet(file_path, index=False)
+    elif file_path.endswith(".csv"):
+        df.to_csv(file_path, index=False)
+    elif file_path.endswith(".arrow"):
+        df.reset_index(drop=True).to_feather(file_path, compression="uncompressed")
+    else:
+        raise ValueError(f"Unsupported file type: {file_path}")
+
+
+def get_diagnostics_dir():
+    return os.getenv("DUMMY_CONTAINER_DIAGNOSTICS_DIRECTORY", "/diagnostics")
+
+
+def write_diagnostics(diagnostics):
+    try:
+        with open(f"{get_diagnostics_dir()}/diagnostics.yaml", "w") as f:
+            yaml.dump(diagnostics, f, default_flow_style=False)
+    except (PermissionError, OSError):
+        pass
+
+
+def create_splink_tables(connection, records):
+    """Registers the preprocessed records of each dataset as a DuckDB table, named
+    by dataset, with the (same) columns that splink compares."""
+    splink_columns = [c for c in records.columns if c != "pik"]
+    for dataset_name in [REFERENCE_FILE, CENSUS_2030]:
+        table = records.loc[records.dataset_name == dataset_name, splink_columns]
+        connection.register(f"{dataset_name}_df", table)
+        connection.execute(f"CREATE TABLE {dataset_name} AS SELECT * FROM {dataset_name}_df")
+        connection.unregister(f"{dataset_name}_df")
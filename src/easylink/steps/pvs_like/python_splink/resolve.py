@@ -0,0 +1,57 @@
+"""Assigns each census record the PIK found for it by the first matching pass,
+geosearch passes first, to find any links for it. According to the report, a
+record is not linkable if that pass found it multiple PIKs; it is then left
+without a PIK, as are records that no pass found."""
+
+import pandas as pd
+from pvs_like_utils import (
+    get_input_path,
+    get_output_path,
+    load_file,
+    write_diagnostics,
+    write_file,
+)
+
+SEARCHES = ["geosearch", "namesearch"]
+
+census_2030 = load_file(get_input_path("DUMMY_CONTAINER_CENSUS_2030_FILE_PATHS"))
+links = pd.concat(
+    [
+        load_file(get_input_path(f"DUMMY_CONTAINER_{search.upper()}_LINKS_FILE_PATHS"))
+        .assign(search=search)
+        .astype({"search": pd.CategoricalDtype(SEARCHES, ordered=True)})
+        for search in SEARCHES
+    ],
+    ignore_index=True,
+)
+
+# Number the passes of all searches in the order they take precedence
+links["pass_rank"] = links.groupby(["search", "pass_number"], observed=True).ngroup()
+first_pass = links.groupby("record_id_census_2030").pass_rank.transform("min")
+links = links[links.pass_rank == first_pass]
+
+found = links.groupby("record_id_census_2030").agg(
+    pass_rank=("pass_rank", "first"),
+    num_piks=("pik", "nunique"),
+    pik=("pik", "first"),
+)
+linked = found[found.num_piks == 1]
+census_2030 = census_2030.assign(pik=census_2030.record_id.map(linked.pik).astype("Int64"))
+
+write_file(census_2030, get_output_path())
+pass_names = {
+    row.pass_rank: f"{row.search}_{row.pass_number}"
+    for row in links.drop_duplicates("pass_rank").itertuples()
+}
+write_diagnostics(
+    {
+        "num_linked": len(linked),
+        # Found multiple PIKs by the first pass to find them
+        "num_unlinkable": int((found.num_piks > 1).sum()),
+        "fraction_linked": float(census_2030.pik.notnull().mean()),
+        "linked_per_pass": {
+            pass_names[pass_rank]: int(count)
+            for pass_rank, count in linked.pass_rank.value_counts().sort_index().items()
+        },
+    }
+)
@@ -0,0 +1,105 @@
+"""Trains the splink model used by every matching pass, or passes through a model
+trained by a previous run (the optional model input slot) so that reruns only pay
+for prediction."""
+
+import importlib.metadata
+import json
+import logging
+import os
+
+import duckdb
+from pvs_like_utils import (
+    CENSUS_2030,
+    REFERENCE_FILE,
+    create_splink_tables,
+    get_input_path,
+    get_output_path,
+    load_file,
+    write_diagnostics,
+)
+from splink.duckdb.duckdb_comparison_library import (
+    exact_match,
+    levenshtein_at_thresholds,
+)
+from splink.duckdb.duckdb_linker import DuckDBLinker
+
+MODEL_FORMAT_VERSION = 1
+MODEL_INPUT_FILE = (
+    get_input_path("DUMMY_CONTAINER_MODEL_FILE_PATHS")
+    if "DUMMY_CONTAINER_MODEL_FILE_PATHS" in os.environ
+    else None
+)
+PROBABILITY_THRESHOLD = float(os.getenv("PVS_LIKE_PROBABILITY_THRESHOLD", "0.85"))
+
+if MODEL_INPUT_FILE:
+    with open(MODEL_INPUT_FILE) as f:
+        model = json.load(f)
+    if model.get("format_version") != MODEL_FORMAT_VERSION:
+        raise ValueError(
+            f"{MODEL_INPUT_FILE} is not a version {MODEL_FORMAT_VERSION} model: "
+            f"found version {model.get('format_version')}"
+        )
+    logging.info(f"Using the model trained with splink {model['splink_version']}")
+else:
+    records = load_file(get_input_path("DUMMY_CONTAINER_RECORDS_FILE_PATHS"))
+    num_census_2030 = (records.dataset_name == CENSUS_2030).sum()
+    num_reference_file = (records.dataset_name == REFERENCE_FILE).sum()
+    connection = duckdb.connect()
+    create_splink_tables(connection, records)
+    del records
+
+    # estimate_probability_two_random_records_match did not seem to give me a reasonable estimate
+    # we estimate that around 90% of the census are present in the reference file
+    probability_two_random_records_match = (0.90 * num_census_2030) / (
+        num_reference_file * num_census_2030
+    )
+    settings = {
+        "link_type": "link_only",
+        "comparisons": [
+            levenshtein_at_thresholds("first_name", 2, term_frequency_adjustments=True),
+            exact_match("middle_initial"),
+            levenshtein_at_thresholds("last_name", 2, term_frequency_adjustments=True),
+            # For some reason, this makes everything crash!?
+            # levenshtein_at_thresholds("date_of_birth", 1),
+            exact_match("date_of_birth"),
+            levenshtein_at_thresholds("geokey", 5),
+        ],
+        "probability_two_random_records_match": probability_two_random_records_match,
+        "unique_id_column_name": "record_id",
+    }
+    linker = DuckDBLinker(
+        [REFERENCE_FILE, CENSUS_2030],
+        settings,
+        connection=connection,
+        input_table_aliases=[REFERENCE_FILE, CENSUS_2030],
+    )
+
+    # NOTE: This is not reproducible!
+    linker.estimate_u_using_random_sampling(max_pairs=1e5)
+    # NOTE: EM appears to be finding people in the same family instead of the same person!
+    # See first_name m probabilities.
+    # For now, I address this by almost always blocking on first name.
+    for blocking_rule_for_training in [
+        "l.first_name = r.first_name and l.last_name = r.last_name",
+        "l.geokey = r.geokey",
+    ]:
+        linker.estimate_parameters_using_expectation_maximisation(
+            blocking_rule_for_training, fix_probability_two_random_records_match=True
+        )
+
+    model = {
+        "format_version": MODEL_FORMAT_VERSION,
+        "splink_version": importlib.metadata.version("splink"),
+        "splink_settings": linker._settings_obj.as_dict(),
+        "probability_threshold": PROBABILITY_THRESHOLD,
+    }
+
+with open(get_output_path(), "w") as f:
+    json.dump(model, f, indent=2)
+write_diagnostics(
+    {
+        "pretrained": bool(MODEL_INPUT_FILE),
+        "splink_version": model["splink_version"],
+        "probability_threshold": model["probability_threshold"],
+    }
+)
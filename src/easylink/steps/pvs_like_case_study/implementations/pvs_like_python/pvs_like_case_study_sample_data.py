@@ -6,10 +6,15 @@
 # or they will be overwritten the next time this script is generated.
 
 
+import importlib.metadata
+import itertools
+import json
+import os
 import re
 
 import numpy as np
 import pandas as pd
+from pvs_like_features import add_features
 
 # ! pip freeze
 
@@ -30,49 +35,12 @@ census_2030 = census_2030.fillna(np.nan).replace("", np.nan)
 reference_file = reference_file.rename(columns=lambda c: c.replace("mailing_address_", ""))
 
 
-# My working theory: the purpose of the "geokey" is because address parts violate conditional independence
-get_geokey = (
-    lambda x: (
-        x.street_number
-        + " "
-        + x.street_name
-        + " "
-        + x.unit_number.fillna("")
-        + " "
-        + x.city
-        + " "
-        + x.state.astype(str)
-        + " "
-        + x.zipcode
-    )
-    .str.strip()
-    .str.split()
-    .str.join(" ")
-)
-reference_file = reference_file.assign(geokey=get_geokey)
-census_2030 = census_2030.assign(geokey=get_geokey)
-
-
-# Add columns used to "cut the database": ZIP3 and a grouping of first and last initial
-reference_file = reference_file.assign(zip3=lambda x: x.zipcode.str[:3])
-census_2030 = census_2030.assign(zip3=lambda x: x.zipcode.str[:3])
-
-# Page 20 of the NORC report: "Name-cuts are defined by combinations of the first characters of the first and last names. The twenty letter groupings
-# for the first character are: A-or-blank, B, C, D, E, F, G, H, I, J, K, L, M, N, O, P, Q, R, S, T, and U-Z."
-initial_cut = (
-    lambda x: x.fillna("A")
-    .str[0]
-    .replace("A", "A-or-blank")
-    .replace(["U", "V", "W", "X", "Y", "Z"], "U-Z")
-)
-reference_file = reference_file.assign(
-    first_initial_cut=lambda x: initial_cut(x.first_name),
-    last_initial_cut=lambda x: initial_cut(x.last_name),
-)
-census_2030 = census_2030.assign(
-    first_initial_cut=lambda x: initial_cut(x.first_name),
-    last_initial_cut=lambda x: initial_cut(x.last_name),
-)
+# Add the "geokey", which combines the address parts since they violate conditional independence,
+# and the columns used to "cut the database": ZIP3 and a grouping of first and last initial.
+# These are built with Arrow compute kernels by the shared pvs_like_features module; the cut
+# columns are categorical.
+reference_file = add_features(reference_file)
+census_2030 = add_features(census_2030)
 
 
 reference_file
@@ -106,12 +74,21 @@ probability_two_random_records_match = (0.90 * len(census_2030)) / (
 probability_two_random_records_match
 
 
+import duckdb
 from splink.duckdb.duckdb_comparison_library import (
     exact_match,
     levenshtein_at_thresholds,
 )
 from splink.duckdb.duckdb_linker import DuckDBLinker
 
+# A single DuckDB connection is shared by the training linker and every matching pass,
+# so that the (large) input tables are only registered with DuckDB once
+connection = duckdb.connect()
+for table_name, table in zip(["reference_file", "census_2030"], tables_for_splink):
+    connection.register(f"{table_name}_df", table)
+    connection.execute(f"CREATE TABLE {table_name} AS SELECT * FROM {table_name}_df")
+    connection.unregister(f"{table_name}_df")
+
 settings = {
     "link_type": "link_only",
     "comparisons": [
@@ -127,22 +104,48 @@ settings = {
     "unique_id_column_name": "record_id",
 }
 
+# A model trained by a previous run (see MODEL_OUTPUT_FILE below), if any, is used as is
+# so that reruns only pay for prediction
+MODEL_FORMAT_VERSION = 1
+MODEL_INPUT_FILE = os.environ.get(
+    "PVS_LIKE_MODEL_INPUT_FILE", "/input_data/pvs_like_model.json"
+)
+MODEL_OUTPUT_FILE = os.environ.get(
+    "PVS_LIKE_MODEL_OUTPUT_FILE", "/results/pvs_like_model.json"
+)
+pretrained_model = None
+if os.path.exists(MODEL_INPUT_FILE):
+    with open(MODEL_INPUT_FILE) as f:
+        pretrained_model = json.load(f)
+    if pretrained_model.get("format_version") != MODEL_FORMAT_VERSION:
+        raise ValueError(
+            f"{MODEL_INPUT_FILE} is not a version {MODEL_FORMAT_VERSION} model: "
+            f"found version {pretrained_model.get('format_version')}"
+        )
+    print(f"Using the model trained with splink {pretrained_model['splink_version']}")
+
 linker = DuckDBLinker(
-    tables_for_splink, settings, input_table_aliases=["reference_file", "census_2030"]
+    ["reference_file", "census_2030"],
+    pretrained_model["splink_settings"] if pretrained_model else settings,
+    connection=connection,
+    input_table_aliases=["reference_file", "census_2030"],
 )
 
-# NOTE: This is not reproducible!
-linker.estimate_u_using_random_sampling(max_pairs=1e5)
+if not pretrained_model:
+    # NOTE: This is not reproducible!
+    linker.estimate_u_using_random_sampling(max_pairs=1e5)
 
-blocking_rule_for_training = "l.first_name = r.first_name and l.last_name = r.last_name"
-linker.estimate_parameters_using_expectation_maximisation(
-    blocking_rule_for_training, fix_probability_two_random_records_match=True
-)
+    blocking_rule_for_training = (
+        "l.first_name = r.first_name and l.last_name = r.last_name"
+    )
+    linker.estimate_parameters_using_expectation_maximisation(
+        blocking_rule_for_training, fix_probability_two_random_records_match=True
+    )
 
-blocking_rule_for_training = "l.geokey = r.geokey"
-linker.estimate_parameters_using_expectation_maximisation(
-    blocking_rule_for_training, fix_probability_two_random_records_match=True
-)
+    blocking_rule_for_training = "l.geokey = r.geokey"
+    linker.estimate_parameters_using_expectation_maximisation(
+        blocking_rule_for_training, fix_probability_two_random_records_match=True
+    )
 
 
 linker.match_weights_chart()
@@ -155,13 +158,43 @@ linker.match_weights_chart()
 linker.m_u_parameters_chart()
 
 
-linker.parameter_estimate_comparisons_chart()
+if not pretrained_model:
+    linker.parameter_estimate_comparisons_chart()
 
 
 splink_settings = linker._settings_obj.as_dict()
 
+# Term frequencies are computed once, from the full tables, rather than in every pass
+TERM_FREQUENCY_COLUMNS = ["first_name", "last_name"]
+term_frequency_tables = {
+    col: linker.compute_tf_table(col).as_pandas_dataframe()
+    for col in TERM_FREQUENCY_COLUMNS
+}
 
-PROBABILITY_THRESHOLD = 0.85
+
+PROBABILITY_THRESHOLD = (
+    pretrained_model["probability_threshold"] if pretrained_model else 0.85
+)
+
+# Save the model so that later runs can skip training
+with open(MODEL_OUTPUT_FILE, "w") as f:
+    json.dump(
+        {
+            "format_version": MODEL_FORMAT_VERSION,
+            "splink_version": importlib.metadata.version("splink"),
+            "splink_settings": splink_settings,
+            "probability_threshold": PROBABILITY_THRESHOLD,
+        },
+        f,
+        indent=2,
+    )
+
+# Whether each matching pass reports the mean match probability of each combination of
+# column similarity values (which requires scoring every blocked pair, not only the links)
+GAMMA_DIAGNOSTICS = os.environ.get("PVS_LIKE_GAMMA_DIAGNOSTICS", "true").lower() in [
+    "true",
+    "1",
+]
 
 
 # Save these variables; this means that if you restart the kernel, you don't need to run this first part of the notebook again.
@@ -172,31 +205,55 @@ PROBABILITY_THRESHOLD = 0.85
 reference_file_index_of_ids = reference_file.reset_index().set_index("record_id")["index"]
 census_index_of_ids = census_2030.reset_index().set_index("record_id")["index"]
 
+# Census records that have been linked (or found to be unlinkable) by a previous pass;
+# only the rest are eligible to match in the next pass
+connection.execute(
+    "CREATE TABLE census_2030_linked AS SELECT record_id FROM census_2030 WHERE false"
+)
+pass_numbers = itertools.count()
+
 
 # TODO: Have this function output more charts and diagnostics
 def pvs_matching_pass(blocking_cols):
-    tables_for_splink = [
-        prep_table_for_splink(reference_file, "reference_file"),
-        prep_table_for_splink(census_2030[census_2030.pik.isnull()], "census_2030"),
-    ]
+    # Each pass only swaps the blocking rule and the census records still eligible to
+    # match; the view is named by pass since splink caches tables by their SQL
+    unlinked_census = f"census_2030_unlinked_{next(pass_numbers)}"
+    connection.execute(
+        f"""
+        CREATE VIEW {unlinked_census} AS
+        SELECT * FROM census_2030
+        WHERE record_id NOT IN (SELECT record_id FROM census_2030_linked)
+        """
+    )
 
     blocking_rule_parts = [f"l.{col} = r.{col}" for col in blocking_cols]
     blocking_rule = " and ".join(blocking_rule_parts)
     linker = DuckDBLinker(
-        tables_for_splink,
+        ["reference_file", unlinked_census],
         {
             **splink_settings,
             **{
                 "blocking_rules_to_generate_predictions": [blocking_rule],
             },
         },
-        # Must match order of tables_for_splink
+        connection=connection,
+        # Must match order of the input tables
         input_table_aliases=["reference_file", "census_2030"],
     )
-
-    potential_links = linker.predict(
-        threshold_match_probability=PROBABILITY_THRESHOLD
-    ).as_pandas_dataframe()
+    for col, term_frequency_table in term_frequency_tables.items():
+        linker.register_term_frequency_lookup(term_frequency_table, col)
+
+    if GAMMA_DIAGNOSTICS:
+        # Score every blocked pair once: the links are those above the threshold and
+        # the diagnostic (see below) is aggregated from all of them
+        predictions = linker.predict()
+        potential_links = connection.execute(
+            f"SELECT * FROM {predictions.physical_name} WHERE match_probability >= ?",
+            [PROBABILITY_THRESHOLD],
+        ).df()
+    else:
+        predictions = linker.predict(threshold_match_probability=PROBABILITY_THRESHOLD)
+        potential_links = predictions.as_pandas_dataframe()
     # Name the columns better than "_r" and "_l"
     # In practice it seems to always be one dataset on the right and another on the left,
     # but it's "backwards" relative to the order above and I don't want to rely on it
@@ -263,13 +320,32 @@ def pvs_matching_pass(blocking_cols):
         f"Matched {len(links)} records; {census_2030.pik.isnull().mean():.2%} still eligible to match"
     )
 
-    # Diagnostic showing the predicted values for each combination of column similarity values
-    all_predictions = linker.predict().as_pandas_dataframe()
-    all_combos = (
-        all_predictions.groupby(list(all_predictions.filter(like="gamma_").columns))
-        .match_probability.agg(["mean", "count"])
-        .sort_values("mean")
+    # Diagnostic showing the predicted values for each combination of column similarity values,
+    # aggregated in DuckDB so that only one row per combination is materialized
+    all_combos = None
+    if GAMMA_DIAGNOSTICS:
+        gamma_cols = [c for c in potential_links.columns if c.startswith("gamma_")]
+        all_combos = (
+            connection.execute(
+                f"""
+                SELECT {", ".join(gamma_cols)},
+                    avg(match_probability) AS mean,
+                    count(*) AS count
+                FROM {predictions.physical_name}
+                GROUP BY {", ".join(gamma_cols)}
+                ORDER BY mean
+                """
+            )
+            .df()
+            .set_index(gamma_cols)
+        )
+    predictions.drop_table_from_database()
+
+    connection.register("links", links)
+    connection.execute(
+        "INSERT INTO census_2030_linked SELECT record_id_census_2030 FROM links"
     )
+    connection.unregister("links")
 
     return all_combos, links
 
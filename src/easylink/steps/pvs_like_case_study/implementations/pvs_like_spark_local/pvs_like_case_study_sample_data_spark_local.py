@@ -9,6 +9,7 @@ import re
 
 import numpy as np
 import pandas as pd
+from pvs_like_features import add_features
 
 reference_file = pd.read_parquet("/input_data/reference_file_sample.parquet")
 census_2030 = pd.read_parquet("/input_data/census_2030_sample.parquet")
@@ -20,48 +21,12 @@ census_2030 = census_2030.fillna(np.nan).replace("", np.nan)
 # We want to compare mailing address with physical address
 reference_file = reference_file.rename(columns=lambda c: c.replace("mailing_address_", ""))
 
-# My working theory: the purpose of the "geokey" is because address parts violate conditional independence
-get_geokey = (
-    lambda x: (
-        x.street_number
-        + " "
-        + x.street_name
-        + " "
-        + x.unit_number.fillna("")
-        + " "
-        + x.city
-        + " "
-        + x.state.astype(str)
-        + " "
-        + x.zipcode
-    )
-    .str.strip()
-    .str.split()
-    .str.join(" ")
-)
-reference_file = reference_file.assign(geokey=get_geokey)
-census_2030 = census_2030.assign(geokey=get_geokey)
-
-# Add columns used to "cut the database": ZIP3 and a grouping of first and last initial
-reference_file = reference_file.assign(zip3=lambda x: x.zipcode.str[:3])
-census_2030 = census_2030.assign(zip3=lambda x: x.zipcode.str[:3])
-
-# Page 20 of the NORC report: "Name-cuts are defined by combinations of the first characters of the first and last names. The twenty letter groupings
-# for the first character are: A-or-blank, B, C, D, E, F, G, H, I, J, K, L, M, N, O, P, Q, R, S, T, and U-Z."
-initial_cut = (
-    lambda x: x.fillna("A")
-    .str[0]
-    .replace("A", "A-or-blank")
-    .replace(["U", "V", "W", "X", "Y", "Z"], "U-Z")
-)
-reference_file = reference_file.assign(
-    first_initial_cut=lambda x: initial_cut(x.first_name),
-    last_initial_cut=lambda x: initial_cut(x.last_name),
-)
-census_2030 = census_2030.assign(
-    first_initial_cut=lambda x: initial_cut(x.first_name),
-    last_initial_cut=lambda x: initial_cut(x.last_name),
-)
+# Add the "geokey", which combines the address parts since they violate conditional independence,
+# and the columns used to "cut the database": ZIP3 and a grouping of first and last initial.
+# These are built with Arrow compute kernels by the shared pvs_like_features module; the cut
+# columns are categorical.
+reference_file = add_features(reference_file)
+census_2030 = add_features(census_2030)
 
 reference_file
 
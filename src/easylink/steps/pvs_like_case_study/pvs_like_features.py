@@ -0,0 +1,112 @@
+"""Builds the columns that the PVS-like case study implementations compare
+("geokey") and block on ("zip3" and the first and last initial cuts).
+
+The columns are computed with Arrow compute kernels rather than row-wise pandas
+string methods. The blocking columns take only a handful of distinct values, so
+they are dictionary-encoded (pandas categoricals) and only the distinct values of
+their source columns are transformed.
+
+This module is shared by the case study implementations: each image copies it
+alongside its scripts (see the Dockerfiles, which are built from the
+src/easylink/steps directory).
+"""
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+ADDRESS_COLUMNS = ["street_number", "street_name", "unit_number", "city", "state", "zipcode"]
+# The characters Python's str.split splits on, in RE2 syntax
+WHITESPACE = r"[\t\n\v\f\r\x1c-\x1f\x85\p{Z}]+"
+# Page 20 of the NORC report: "Name-cuts are defined by combinations of the first characters of the first and last names. The twenty letter groupings
+# for the first character are: A-or-blank, B, C, D, E, F, G, H, I, J, K, L, M, N, O, P, Q, R, S, T, and U-Z."
+BLANK_INITIAL_CUT = "A-or-blank"
+LATE_INITIALS = pa.array(["U", "V", "W", "X", "Y", "Z"])
+
+
+def _to_strings(array: pa.Array) -> pa.Array:
+    if pa.types.is_dictionary(array.type):
+        array = array.dictionary_decode()
+    return array if pa.types.is_string(array.type) else pc.cast(array, pa.string())
+
+
+def _map_distinct(array: pa.Array, function, null_value: str | None = None) -> pa.Array:
+    """Applies a vectorized string function to only the distinct values of an
+    array, returning the result dictionary-encoded. Nulls are mapped to
+    null_value if it is given and stay null otherwise."""
+    if not pa.types.is_dictionary(array.type):
+        array = pc.dictionary_encode(_to_strings(array))
+    mapped = function(_to_strings(array.dictionary))
+    dictionary = pc.unique(
+        mapped if null_value is None else pa.concat_arrays([mapped, pa.array([null_value])])
+    )
+    indices = pc.take(pc.index_in(mapped, value_set=dictionary), array.indices)
+    if null_value is not None:
+        indices = pc.fill_null(
+            indices, pc.index_in(pa.scalar(null_value), value_set=dictionary)
+        )
+    return pa.DictionaryArray.from_arrays(indices, dictionary)
+
+
+def get_geokey(
+    street_number: pa.Array,
+    street_name: pa.Array,
+    unit_number: pa.Array,
+    city: pa.Array,
+    state: pa.Array,
+    zipcode: pa.Array,
+) -> pa.Array:
+    """The "geokey" combines the address parts, which violate conditional
+    independence, into one space-separated string. It is null if any part but the
+    unit number is missing; a missing state is rendered as "nan", as it was when
+    the state column was cast to str."""
+    joined = pc.binary_join_element_wise(
+        _to_strings(street_number),
+        _to_strings(street_name),
+        pc.fill_null(_to_strings(unit_number), ""),
+        _to_strings(city),
+        pc.fill_null(_to_strings(state), "nan"),
+        _to_strings(zipcode),
+        " ",
+    )
+    # Collapse runs of whitespace, e.g. around a missing unit number, and strip the ends
+    return pc.utf8_trim(pc.replace_substring_regex(joined, WHITESPACE, " "), " ")
+
+
+def get_zip3(zipcode: pa.Array) -> pa.DictionaryArray:
+    """The first three digits of the ZIP code."""
+    return _map_distinct(zipcode, lambda values: pc.utf8_slice_codeunits(values, 0, 3))
+
+
+def get_initial_cut(name: pa.Array) -> pa.DictionaryArray:
+    """The letter grouping of the first character of a name: its first character,
+    except that blank names and those starting with A are "A-or-blank" and those
+    starting with U through Z are "U-Z"."""
+
+    def initial_cut(values: pa.Array) -> pa.Array:
+        initials = pc.utf8_slice_codeunits(values, 0, 1)
+        initials = pc.if_else(
+            pc.is_in(initials, value_set=pa.array(["", "A"])), BLANK_INITIAL_CUT, initials
+        )
+        return pc.if_else(pc.is_in(initials, value_set=LATE_INITIALS), "U-Z", initials)
+
+    return _map_distinct(name, initial_cut, null_value=BLANK_INITIAL_CUT)
+
+
+def add_features(df: pd.DataFrame) -> pd.DataFrame:
+    """Returns the records with the geokey, zip3, first_initial_cut and
+    last_initial_cut columns added; all but the geokey are categorical."""
+
+    def column(name: str) -> pa.Array:
+        array = pa.array(df[name], from_pandas=True)
+        return array.combine_chunks() if isinstance(array, pa.ChunkedArray) else array
+
+    features = {
+        "geokey": get_geokey(*(column(name) for name in ADDRESS_COLUMNS)),
+        "zip3": get_zip3(column("zipcode")),
+        "first_initial_cut": get_initial_cut(column("first_name")),
+        "last_initial_cut": get_initial_cut(column("last_name")),
+    }
+    return df.assign(
+        **{name: feature.to_pandas().set_axis(df.index) for name, feature in features.items()}
+    )
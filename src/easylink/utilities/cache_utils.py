@@ -0,0 +1,282 @@
+import functools
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from loguru import logger
+
+from easylink import __version__
+from easylink.implementation import IMPLEMENTATION_REGISTRY
+from easylink.utilities.paths import SPARK_SNAKEFILE
+
+# Subdirectories of the step output cache
+OUTPUTS_DIR = "outputs"
+DIGESTS_DIR = "digests"
+# Resolved pipelines (i.e. pipeline graphs and Snakefiles); see get_pipeline_cache_key
+PIPELINES_DIR = "pipelines"
+# Marker written into a cache entry once all of its outputs have been stored. Its
+# mtime is touched on every cache hit and so doubles as the entry's last-used time.
+COMPLETE_MARKER = ".complete"
+
+CACHE_KEY_VERSION = 2
+PIPELINE_CACHE_VERSION = 1
+# Number of resolved pipelines to keep; the least recently used are evicted first
+MAX_CACHED_PIPELINES = 50
+_CHUNK_SIZE = 2**20
+
+
+def get_file_digest(
+    filepath: Union[str, Path], cache_dir: Union[str, Path, None] = None
+) -> str:
+    """Returns the sha256 digest of a file's (or directory's) contents.
+
+    If a cache directory is provided, digests are memoized there keyed on the
+    file's resolved path, size and modification time so that large, unchanged
+    files (e.g. container images and raw input data) are only hashed once.
+    """
+    filepath = Path(filepath).resolve()
+    if filepath.is_dir():
+        digest = hashlib.sha256()
+        for child in sorted(p for p in filepath.rglob("*") if p.is_file()):
+            digest.update(str(child.relative_to(filepath)).encode())
+            digest.update(get_file_digest(child, cache_dir).encode())
+        return digest.hexdigest()
+
+    memo_file = None
+    if cache_dir is not None:
+        stat = filepath.stat()
+        memo_key = f"{filepath}:{stat.st_size}:{stat.st_mtime_ns}"
+        memo_file = (
+            Path(cache_dir) / DIGESTS_DIR / hashlib.sha256(memo_key.encode()).hexdigest()
+        )
+        if memo_file.is_file():
+            return memo_file.read_text().strip()
+
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    hexdigest = digest.hexdigest()
+
+    if memo_file is not None:
+        memo_file.parent.mkdir(parents=True, exist_ok=True)
+        memo_file.write_text(hexdigest)
+    return hexdigest
+
+
+def get_cache_key(
+    input_files: List[str],
+    cache_dir: Union[str, Path],
+    image_path: str,
+    script_cmd: str,
+    envvars: Dict[str, Any],
+    outputs: List[str],
+) -> str:
+    """Returns the content-addressed key of an implementation's outputs.
+
+    The key covers everything that determines what an implementation writes:
+    the container image contents, the command run inside it, the environment
+    variables it is configured with, the names of the outputs it produces and
+    the contents of every upstream file it reads.
+
+    Environment variables are included as strings, along with the contents of any
+    that are absolute paths to files (e.g. a configuration file). Directories
+    named by environment variables are not hashed; data an implementation reads
+    from one must be passed to it through an input slot to be covered by the key.
+    """
+    key_data = {
+        "version": CACHE_KEY_VERSION,
+        "image": get_file_digest(image_path, cache_dir),
+        "script_cmd": script_cmd,
+        "envvars": {str(k): str(v) for k, v in envvars.items()},
+        "envvar_files": {
+            str(k): get_file_digest(v, cache_dir)
+            for k, v in envvars.items()
+            if os.path.isabs(str(v)) and os.path.isfile(str(v))
+        },
+        "outputs": [Path(output).name for output in outputs],
+        "inputs": [get_file_digest(f, cache_dir) for f in input_files],
+    }
+    return hashlib.sha256(json.dumps(key_data, sort_keys=True).encode()).hexdigest()
+
+
+def get_complete_entry(cache_dir: Union[str, Path], key: str) -> Optional[Path]:
+    """Returns the directory of the cache entry of the given key if all of its
+    outputs have been stored, i.e. if a job with that key would restore them."""
+    entry = Path(cache_dir) / OUTPUTS_DIR / key
+    return entry if (entry / COMPLETE_MARKER).is_file() else None
+
+
+def write_cache_key(
+    output_path: str,
+    input_files: List[str],
+    cache_dir: Union[str, Path],
+    image_path: str,
+    script_cmd: str,
+    envvars: Dict[str, Any],
+    outputs: List[str],
+) -> None:
+    """Writes an implementation's cache key to a file so that its (containerized)
+    rule can look up previously-computed outputs."""
+    key = get_cache_key(input_files, cache_dir, image_path, script_cmd, envvars, outputs)
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w") as f:
+        # Trailing newline is required for bash's `read` to succeed
+        f.write(f"{key}\n")
+
+
+def get_pipeline_cache_key(config_params: Dict[str, Any]) -> str:
+    """Returns the key of a resolved pipeline.
+
+    The key covers everything that determines the pipeline graph and Snakefile:
+    the (parsed) pipeline, input data and computing environment specifications,
+    the implementation metadata files and the version and source code of easylink
+    itself. The results directory is not included since it does not affect
+    either.
+    """
+    key_data = {
+        "version": PIPELINE_CACHE_VERSION,
+        "easylink": __version__,
+        "source": _get_source_digest(),
+        "implementation_metadata": [
+            get_file_digest(file) for file in IMPLEMENTATION_REGISTRY.metadata_files
+        ],
+        "specifications": {
+            key: value for key, value in config_params.items() if key != "results_dir"
+        },
+    }
+    return hashlib.sha256(
+        json.dumps(key_data, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def load_cached_pipeline(cache_dir: Union[str, Path], key: str) -> Optional[Dict[str, Any]]:
+    """Returns the cached resolved pipeline of the given key, if any. Entries that
+    cannot be loaded (e.g. pickled by an incompatible version) are ignored."""
+    entry = Path(cache_dir) / PIPELINES_DIR / f"{key}.pkl"
+    if not entry.is_file():
+        return None
+    try:
+        with open(entry, "rb") as f:
+            cached_pipeline = pickle.load(f)
+    except Exception as e:
+        logger.debug(f"Ignoring unreadable cached pipeline {entry}: {e}")
+        return None
+    entry.touch()
+    return cached_pipeline
+
+
+def store_cached_pipeline(
+    cache_dir: Union[str, Path], key: str, cached_pipeline: Dict[str, Any]
+) -> None:
+    """Stores a resolved pipeline and evicts all but the most recently used
+    ``MAX_CACHED_PIPELINES``."""
+    pipelines_dir = Path(cache_dir) / PIPELINES_DIR
+    pipelines_dir.mkdir(parents=True, exist_ok=True)
+    # Write atomically since concurrent runs may share the cache
+    fd, staging_path = tempfile.mkstemp(dir=pipelines_dir, suffix=".staging")
+    with os.fdopen(fd, "wb") as f:
+        pickle.dump(cached_pipeline, f)
+    os.replace(staging_path, pipelines_dir / f"{key}.pkl")
+    entries = sorted(pipelines_dir.glob("*.pkl"), key=lambda entry: entry.stat().st_mtime)
+    for entry in entries[:-MAX_CACHED_PIPELINES]:
+        entry.unlink(missing_ok=True)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_source_digest() -> str:
+    """Digest of easylink's source code so that development installs, whose
+    version may not change between edits, do not reuse stale pipelines."""
+    package_dir = Path(__file__).parent.parent
+    digest = hashlib.sha256()
+    for source_file in sorted(package_dir.rglob("*.py")) + [SPARK_SNAKEFILE]:
+        digest.update(str(source_file.relative_to(package_dir)).encode())
+        digest.update(source_file.read_bytes())
+    return digest.hexdigest()
+
+
+def get_cache_entries(cache_dir: Union[str, Path]) -> List[Dict[str, Any]]:
+    """Returns a summary of each complete entry in the cache, least recently used first."""
+    outputs_dir = Path(cache_dir) / OUTPUTS_DIR
+    if not outputs_dir.is_dir():
+        return []
+    entries = []
+    for entry in outputs_dir.iterdir():
+        marker = entry / COMPLETE_MARKER
+        if not marker.is_file():
+            continue
+        entries.append(
+            {
+                "key": entry.name,
+                "implementation": marker.read_text().strip(),
+                "size": _get_size(entry),
+                "last_used": marker.stat().st_mtime,
+                "path": entry,
+            }
+        )
+    return sorted(entries, key=lambda entry: entry["last_used"])
+
+
+def get_cache_stats(cache_dir: Union[str, Path]) -> Dict[str, Any]:
+    """Returns aggregate statistics about the cache."""
+    entries = get_cache_entries(cache_dir)
+    digests_dir = Path(cache_dir) / DIGESTS_DIR
+    pipelines_dir = Path(cache_dir) / PIPELINES_DIR
+    return {
+        "directory": str(cache_dir),
+        "num_entries": len(entries),
+        "total_size": sum(entry["size"] for entry in entries),
+        "num_implementations": len({entry["implementation"] for entry in entries}),
+        "num_memoized_digests": (
+            len(list(digests_dir.iterdir())) if digests_dir.is_dir() else 0
+        ),
+        "num_cached_pipelines": (
+            len(list(pipelines_dir.glob("*.pkl"))) if pipelines_dir.is_dir() else 0
+        ),
+    }
+
+
+def prune_cache(cache_dir: Union[str, Path], max_size: int) -> List[Dict[str, Any]]:
+    """Evicts least recently used entries until the cache is no larger than
+    ``max_size`` bytes. Returns the evicted entries.
+
+    Entries that were never completed (e.g. from a job that was killed while
+    storing its outputs) are removed once they are more than a day old. A
+    ``max_size`` of 0 also clears the memoized file digests and the resolved
+    pipelines.
+    """
+    if max_size <= 0:
+        shutil.rmtree(Path(cache_dir) / DIGESTS_DIR, ignore_errors=True)
+        shutil.rmtree(Path(cache_dir) / PIPELINES_DIR, ignore_errors=True)
+    outputs_dir = Path(cache_dir) / OUTPUTS_DIR
+    if not outputs_dir.is_dir():
+        return []
+    for entry in outputs_dir.iterdir():
+        if not (entry / COMPLETE_MARKER).is_file() and _is_stale(entry):
+            shutil.rmtree(entry, ignore_errors=True)
+
+    entries = get_cache_entries(cache_dir)
+    total_size = sum(entry["size"] for entry in entries)
+    evicted = []
+    for entry in entries:
+        if total_size <= max_size:
+            break
+        shutil.rmtree(entry["path"], ignore_errors=True)
+        total_size -= entry["size"]
+        evicted.append(entry)
+    return evicted
+
+
+def _get_size(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+def _is_stale(path: Path, max_age: int = 24 * 60 * 60) -> bool:
+    """Incomplete entries may still be being written by a running job."""
+    return time.time() - path.stat().st_mtime > max_age
@@ -1,11 +1,20 @@
+import filecmp
 import os
 import shutil
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Optional, Union
+from typing import Dict, List, Optional, Union
 
 import yaml
 
+# Formats in which implementations may hand off intermediate data to one another
+# and their file extensions. Arrow IPC files are written uncompressed so that
+# downstream steps can memory-map them rather than decode them.
+INTERMEDIATE_FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+# Marker written into a directory (partitioned parquet dataset) output once it
+# is complete. Spark writes this by default.
+DATASET_COMPLETE_MARKER = "_SUCCESS"
+
 
 def copy_configuration_files_to_results_directory(
     pipeline_specification: Path,
@@ -26,6 +35,26 @@ def copy_configuration_files_to_results_directory(
         os.umask(old_umask)
 
 
+def get_mismatched_configuration_files(
+    pipeline_specification: Path,
+    input_data: Path,
+    computing_environment: Optional[Path],
+    results_dir: Path,
+) -> List[str]:
+    """Returns the configuration files that differ from (or are missing) the copies
+    written to the results directory by a previous run."""
+    mismatched = []
+    for filepath in [pipeline_specification, input_data, computing_environment]:
+        if not filepath:
+            continue
+        copied_filepath = results_dir / filepath.name
+        if not copied_filepath.is_file() or not filecmp.cmp(
+            filepath, copied_filepath, shallow=False
+        ):
+            mismatched.append(str(filepath))
+    return mismatched
+
+
 def get_results_directory(output_dir: Optional[str], timestamp: bool) -> Path:
     results_dir = Path("results" if output_dir is None else output_dir).resolve()
     if timestamp:
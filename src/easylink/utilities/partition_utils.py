@@ -0,0 +1,116 @@
+import os
+import shutil
+from pathlib import Path
+from typing import List
+
+import pandas as pd
+import pyarrow as pa
+from pyarrow import csv
+from pyarrow import parquet as pq
+
+from easylink.utilities.data_utils import DATASET_COMPLETE_MARKER
+
+
+def split_files(input_paths: List[str], key_column: str, output_paths: List[str]) -> None:
+    """Hash-partitions each input file on a key column into an equal number of shards.
+
+    ``output_paths`` holds the shards of each input file in turn, i.e. the first
+    ``len(output_paths) // len(input_paths)`` paths are the shards of the first
+    input file. Because rows are assigned to shards by the hash of their key,
+    rows sharing a key land in the same-numbered shard of every input file so
+    that each shard can be processed independently. Note that this requires the
+    key column to have the same type in every input file.
+    """
+    num_partitions = len(output_paths) // len(input_paths)
+    for i, input_path in enumerate(input_paths):
+        shard_paths = output_paths[i * num_partitions : (i + 1) * num_partitions]
+        split_file(input_path, key_column, shard_paths)
+
+
+def split_file(input_path: str, key_column: str, output_paths: List[str]) -> None:
+    """Hash-partitions a single file on a key column into one parquet file per output path."""
+    table = _read_table(input_path)
+    if key_column not in table.column_names:
+        raise LookupError(
+            f"Data file {input_path} is missing partition key column {key_column}"
+        )
+    partitions = pd.util.hash_pandas_object(
+        table.column(key_column).to_pandas(), index=False
+    ).to_numpy() % len(output_paths)
+    for i, output_path in enumerate(output_paths):
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        pq.write_table(table.filter(pa.array(partitions == i)), output_path)
+
+
+def gather_files(input_paths: List[str], output_paths: List[str]) -> None:
+    """Concatenates the shards of each output in turn.
+
+    ``input_paths`` holds the shards of each output path in turn, mirroring
+    :func:`split_files`.
+    """
+    num_partitions = len(input_paths) // len(output_paths)
+    for i, output_path in enumerate(output_paths):
+        shard_paths = input_paths[i * num_partitions : (i + 1) * num_partitions]
+        gather_file(shard_paths, output_path)
+
+
+def gather_file(input_paths: List[str], output_path: str) -> None:
+    """Concatenates shards into a single file, one shard at a time.
+
+    Shards that are directories (partitioned parquet datasets) are instead
+    combined by linking (or copying) their files into a single dataset.
+    """
+    extension = Path(output_path).suffix
+    if Path(input_paths[0]).is_dir():
+        _gather_datasets(input_paths, output_path)
+    elif extension == ".csv":
+        with open(output_path, "wb") as f:
+            for i, input_path in enumerate(input_paths):
+                csv.write_csv(
+                    _read_table(input_path),
+                    f,
+                    write_options=csv.WriteOptions(include_header=(i == 0)),
+                )
+    elif extension == ".parquet":
+        schema = pq.read_schema(input_paths[0])
+        with pq.ParquetWriter(output_path, schema) as writer:
+            for input_path in input_paths:
+                writer.write_table(pq.read_table(input_path).cast(schema))
+    elif extension == ".arrow":
+        schema = _read_table(input_paths[0]).schema
+        with pa.ipc.new_file(output_path, schema) as writer:
+            for input_path in input_paths:
+                writer.write_table(_read_table(input_path).cast(schema))
+    else:
+        raise NotImplementedError(
+            f"Data file type {extension} is not supported. Convert to Parquet, Arrow or CSV instead"
+        )
+
+
+def _gather_datasets(input_paths: List[str], output_path: str) -> None:
+    Path(output_path).mkdir(parents=True, exist_ok=True)
+    for i, input_path in enumerate(input_paths):
+        for j, part in enumerate(sorted(Path(input_path).glob("*.parquet"))):
+            gathered_part = Path(output_path) / f"part-{i:05d}-{j:05d}.parquet"
+            try:
+                os.link(part, gathered_part)
+            except OSError:
+                shutil.copy(part, gathered_part)
+    (Path(output_path) / DATASET_COMPLETE_MARKER).touch()
+
+
+def _read_table(filepath: str) -> pa.Table:
+    extension = Path(filepath).suffix
+    if Path(filepath).is_dir():
+        # A partitioned parquet dataset; files starting with '_' or '.' are ignored
+        return pq.read_table(filepath)
+    elif extension == ".parquet":
+        return pq.read_table(filepath)
+    elif extension == ".arrow":
+        # Memory-mapped, so this does not read the file into memory
+        return pa.ipc.open_file(pa.memory_map(filepath)).read_all()
+    elif extension == ".csv":
+        return csv.read_csv(filepath)
+    raise NotImplementedError(
+        f"Data file type {extension} is not supported. Convert to Parquet, Arrow or CSV instead"
+    )
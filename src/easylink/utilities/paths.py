@@ -7,4 +7,10 @@ IMPLEMENTATION_METADATA = Path(__file__).parent.parent / "implementation_metadat
 # For now, put slurm in /tmp to avoid creating a subdir with a prolog script
 EASYLINK_TEMP = {"local": Path("/tmp/easylink"), "slurm": Path("/tmp")}
 
+# Default location of the step output cache shared across pipeline runs
+EASYLINK_CACHE = Path.home() / ".cache" / "easylink"
+
+# Default location of the long-lived ('keep_alive') spark cluster shared across pipeline runs
+EASYLINK_SPARK_CLUSTER = Path.home() / ".easylink" / "spark_cluster"
+
 SPARK_SNAKEFILE = Path(__file__).parent / "spark.smk"
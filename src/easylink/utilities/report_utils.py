@@ -0,0 +1,206 @@
+import csv
+import glob
+import html
+import json
+import re
+import subprocess
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+# Reports written to the results directory when a pipeline run finishes
+RUN_REPORT_JSON = "run_report.json"
+RUN_REPORT_HTML = "run_report.html"
+# Where snakemake's slurm executor writes each job's log, named by slurm job ID
+SLURM_LOGS_DIR = ".snakemake/slurm_logs"
+SACCT_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+
+def write_run_report(
+    jobs: Dict[str, Dict[str, Any]],
+    status: str,
+    results_dir: Union[str, Path] = ".",
+) -> Dict[str, Any]:
+    """Aggregates the benchmarks of a pipeline run's jobs into a report of each
+    job's wall time, queue wait, CPU efficiency and memory headroom and writes it
+    to the results directory as both JSON and HTML.
+
+    ``jobs`` maps the name of each implementation job to the implementations it
+    runs, its benchmark file (which may contain the scatter/gather wildcard of a
+    partitioned implementation's shards) and the memory (MB), cpus and time
+    limit (hours) requested per shard. Queue waits are only known for jobs
+    submitted to slurm (and then only if ``sacct`` is available).
+    """
+    results_dir = Path(results_dir)
+    queue_waits = get_slurm_queue_waits(results_dir / SLURM_LOGS_DIR)
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "status": status,
+        "jobs": [
+            _summarize_job(name, job, results_dir, queue_waits.get(name))
+            for name, job in jobs.items()
+        ],
+    }
+    report["total_wall_time"] = sum(job["wall_time"] or 0 for job in report["jobs"])
+    report["total_cpu_time"] = sum(job["cpu_time"] or 0 for job in report["jobs"])
+    with open(results_dir / RUN_REPORT_JSON, "w") as f:
+        json.dump(report, f, indent=2)
+    (results_dir / RUN_REPORT_HTML).write_text(_format_html(report))
+    return report
+
+
+def read_benchmarks(benchmark_file: Union[str, Path]) -> List[Dict[str, float]]:
+    """Reads the snakemake benchmarks of a job (or, for a partitioned
+    implementation, of each of its shards). Jobs that have not run have none."""
+    benchmarks = []
+    for path in sorted(glob.glob(str(benchmark_file).replace("{scatteritem}", "*"))):
+        with open(path) as f:
+            rows = list(csv.DictReader(f, delimiter="\t"))
+        if rows:
+            # Only the most recent attempt of a retried job is recorded
+            benchmarks.append(
+                {key: _to_float(value) for key, value in rows[-1].items() if key != "h:m:s"}
+            )
+    return benchmarks
+
+
+def get_slurm_queue_waits(slurm_logs_dir: Union[str, Path]) -> Dict[str, float]:
+    """Returns the total time (in seconds) that the jobs of each rule spent queued
+    on slurm, as reported by ``sacct``. This is best effort: nothing is returned
+    if no jobs were submitted to slurm or if ``sacct`` fails."""
+    job_ids = [
+        match.group(1)
+        for match in (
+            re.match(r"(\d+)", log.name) for log in Path(slurm_logs_dir).glob("*/*.log")
+        )
+        if match
+    ]
+    if not job_ids:
+        return {}
+    try:
+        sacct = subprocess.run(
+            [
+                "sacct",
+                "--jobs",
+                ",".join(job_ids),
+                "--allocations",
+                "--noheader",
+                "--parsable2",
+                "--format=Comment,Submit,Start",
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return {}
+    queue_waits = {}
+    for line in sacct.stdout.splitlines():
+        # The slurm executor sets each job's comment to its rule
+        rule, submit, start = line.split("|")
+        try:
+            wait = (
+                datetime.strptime(start, SACCT_TIME_FORMAT)
+                - datetime.strptime(submit, SACCT_TIME_FORMAT)
+            ).total_seconds()
+        except ValueError:
+            # e.g. a job that never started
+            continue
+        queue_waits[rule] = queue_waits.get(rule, 0) + wait
+    return queue_waits
+
+
+def _summarize_job(
+    name: str, job: Dict[str, Any], results_dir: Path, queue_wait: Optional[float]
+) -> Dict[str, Any]:
+    benchmarks = read_benchmarks(results_dir / job["benchmark"])
+    summary = {
+        "name": name,
+        "implementations": job["implementations"],
+        "num_shards": len(benchmarks),
+        "requested_memory_mb": job["memory"],
+        "requested_cpus": job["cpus"],
+        "requested_time_limit": job["time_limit"] * 3600,
+        "queue_wait": queue_wait,
+        "wall_time": None,
+        "cpu_time": None,
+        "max_rss_mb": None,
+        "cpu_efficiency": None,
+        "memory_headroom_mb": None,
+    }
+    if not benchmarks:
+        return summary
+    wall_time = sum(benchmark["s"] for benchmark in benchmarks)
+    cpu_time = sum(benchmark["cpu_time"] or 0 for benchmark in benchmarks)
+    max_rss = max(benchmark["max_rss"] or 0 for benchmark in benchmarks)
+    summary.update(
+        wall_time=wall_time,
+        cpu_time=cpu_time,
+        max_rss_mb=max_rss,
+        cpu_efficiency=cpu_time / (wall_time * job["cpus"]) if wall_time else None,
+        memory_headroom_mb=round(job["memory"] - max_rss, 2),
+    )
+    return summary
+
+
+def _to_float(value: str) -> Optional[float]:
+    # Snakemake records metrics that could not be measured as "NA"
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def _format_html(report: Dict[str, Any]) -> str:
+    columns = {
+        "name": "Job",
+        "implementations": "Implementations",
+        "num_shards": "Shards",
+        "queue_wait": "Queue wait (s)",
+        "wall_time": "Wall time (s)",
+        "requested_time_limit": "Time limit (s)",
+        "cpu_time": "CPU time (s)",
+        "requested_cpus": "CPUs",
+        "cpu_efficiency": "CPU efficiency",
+        "max_rss_mb": "Peak memory (MB)",
+        "requested_memory_mb": "Requested memory (MB)",
+        "memory_headroom_mb": "Memory headroom (MB)",
+    }
+
+    def format_value(value: Any) -> str:
+        if value is None:
+            return "-"
+        if isinstance(value, list):
+            return ", ".join(value)
+        if isinstance(value, float):
+            return f"{value:.2f}"
+        return str(value)
+
+    header = "".join(f"<th>{title}</th>" for title in columns.values())
+    rows = "\n".join(
+        "<tr>"
+        + "".join(f"<td>{html.escape(format_value(job[key]))}</td>" for key in columns)
+        + "</tr>"
+        for job in report["jobs"]
+    )
+    return f"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>EasyLink run report</title>
+<style>
+table {{ border-collapse: collapse; }}
+th, td {{ border: 1px solid #ccc; padding: 4px 8px; text-align: right; }}
+</style>
+</head>
+<body>
+<h1>EasyLink run report</h1>
+<p>Created {report["created"]} (status: {report["status"]}). Total wall time:
+{report["total_wall_time"]:.2f} s; total CPU time: {report["total_cpu_time"]:.2f} s.</p>
+<table>
+<tr>{header}</tr>
+{rows}
+</table>
+</body>
+</html>
+"""
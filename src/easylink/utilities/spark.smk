@@ -21,8 +21,6 @@ rule start_spark_master:
         """
     echo "Starting spark master - logging to {output}"
     SPARK_ROOT=/opt/spark
-    SPARK_MASTER_PORT=28508
-    SPARK_MASTER_WEBUI_PORT=28509
     SPARK_MASTER_HOST=$(hostname -f)
 
 
@@ -30,8 +28,8 @@ rule start_spark_master:
 
     $SPARK_ROOT/bin/spark-class org.apache.spark.deploy.master.Master \
     --host $SPARK_MASTER_HOST \
-    --port $SPARK_MASTER_PORT \
-    --webui-port $SPARK_MASTER_WEBUI_PORT \
+    --port 0 \
+    --webui-port 0 \
     &> {output} &
     spid=$!
 
@@ -49,7 +47,7 @@ rule start_spark_master:
             break
         fi
 
-        sleep 1
+        sleep 0.2
     done
     """
 
@@ -59,36 +57,41 @@ rule wait_for_spark_master:
         temp("spark_logs/spark_master_uri.txt"),
     params:
         spark_master_log_file=rules.start_spark_master.output,
-        max_attempts=20,
-        attempt_sleep_time=10,
+        timeout=210,
+        poll_interval=0.1,
+        max_poll_interval=5,
     localrule: True
     shell:
         """
         echo "Searching for Spark master URL in {params.spark_master_log_file}"
-        sleep {params.attempt_sleep_time}
-        num_attempts=1
+        # The master binds to free ports so we publish the ones it chose: its URL
+        # on the first line of the URI file and its web UI URL on the second.
+        # Poll with exponential backoff so that a quickly-started master is found
+        # in well under a second without hammering the filesystem on a slow start
+        interval={params.poll_interval}
         while true; do
 
             if [[ -e {params.spark_master_log_file} ]]; then
-                found=`grep -o "\(spark://.*$\)" {params.spark_master_log_file} || true`
-
-                if [[ ! -z $found ]]; then
-                    echo "Spark master URL found: $found"
-                    echo $found > {output}
+                found=`grep -m1 -o "\(spark://.*$\)" {params.spark_master_log_file} || true`
+                webui=`grep -m1 "MasterWebUI" {params.spark_master_log_file} | grep -o "http://[^ ]*" || true`
+                # The master is only ALIVE once its web UI (if any) is bound
+                alive=`grep -m1 -o "ALIVE" {params.spark_master_log_file} || true`
+
+                if [[ ! -z $found ]] && [[ ! -z $webui || ! -z $alive ]]; then
+                    echo "Spark master URL found after $SECONDS seconds: $found"
+                    echo "Spark master web UI: $webui"
+                    printf "%s\n%s\n" "$found" "$webui" > {output}
                     break
                 fi
             fi
 
-            if (( $num_attempts > {params.max_attempts})); then
-                echo "Couldn't find Spark master after {params.max_attempts} attempts. Exiting."
+            if (( $SECONDS >= {params.timeout} )); then
+                echo "Couldn't find Spark master after {params.timeout} seconds. Exiting."
                 exit 2
-            
             fi
 
-            echo "Unable to find Spark master URL in logfile. Waiting {params.attempt_sleep_time} seconds and retrying..."
-            echo "(attempt $num_attempts/{params.max_attempts})"
-            sleep {params.attempt_sleep_time}
-            num_attempts=$((num_attempts + 1))
+            sleep $interval
+            interval=`awk -v i=$interval -v m={params.max_poll_interval} 'BEGIN {{ i *= 2; print (i > m) ? m : i }}'`
 
         done
         """
@@ -126,7 +129,6 @@ rule start_spark_worker:
         """
         echo " Starting Spark Worker {wildcards.scatteritem}"
         SPARK_ROOT=/opt/spark
-        SPARK_WORKER_WEBUI_PORT=28510
         read -r MASTER_URL < {input.masterurl}
 
          rm -f {output} || true
@@ -134,7 +136,7 @@ rule start_spark_worker:
 
         $SPARK_ROOT/bin/spark-class org.apache.spark.deploy.worker.Worker \
         --cores {params.cores} --memory '{params.memory}M' \
-        --webui-port $SPARK_WORKER_WEBUI_PORT \
+        --webui-port 0 \
         --work-dir /tmp/singularity_spark_{params.user}/spark_work \
         $MASTER_URL \
         &> {output} &
@@ -154,7 +156,7 @@ rule start_spark_worker:
             break
         fi
 
-        sleep 1
+        sleep 0.2
     done
         """
 
@@ -166,37 +168,35 @@ rule wait_for_spark_worker:
         temp("spark_logs/spark_worker_started_{scatteritem}.txt"),
     params:
         spark_worker_log_file="spark_logs/spark_worker_log_{scatteritem}.txt",
-        max_attempts=20,
-        attempt_sleep_time=20,
+        timeout=420,
+        poll_interval=0.1,
+        max_poll_interval=5,
     localrule: True
     shell:
         """
         echo "Waiting for Spark Worker {wildcards.scatteritem} to start..."
-        sleep {params.attempt_sleep_time}
-        num_attempts=1
         read -r MASTER_URL < {input}
+        # Poll with exponential backoff (see wait_for_spark_master)
+        interval={params.poll_interval}
         while true; do
 
             if [[ -e {params.spark_worker_log_file} ]]; then
                 found=`grep -o "\(Worker: Successfully registered with master $MASTER_URL\)" {params.spark_worker_log_file} || true`
 
                 if [[ ! -z $found ]]; then
-                    echo "Spark Worker {wildcards.scatteritem} registered successfully"
+                    echo "Spark Worker {wildcards.scatteritem} registered successfully after $SECONDS seconds"
                     touch {output}
                     break
                 fi
             fi
 
-            if (( $num_attempts > {params.max_attempts})); then
-                echo "Couldn't find Spark worker {wildcards.scatteritem} after {params.max_attempts} attempts. Exiting."
+            if (( $SECONDS >= {params.timeout} )); then
+                echo "Couldn't find Spark worker {wildcards.scatteritem} registration after {params.timeout} seconds. Exiting."
                 exit 2
-            
             fi
-            
-            echo "Unable to find Spark worker {wildcards.scatteritem} registration. Waiting {params.attempt_sleep_time} seconds and retrying..."
-            echo "(attempt $num_attempts/{params.max_attempts})"
-            sleep {params.attempt_sleep_time}
-            num_attempts=$((num_attempts + 1))
+
+            sleep $interval
+            interval=`awk -v i=$interval -v m={params.max_poll_interval} 'BEGIN {{ i *= 2; print (i > m) ? m : i }}'`
 
         done
         """
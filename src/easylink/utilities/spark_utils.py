@@ -0,0 +1,94 @@
+import json
+import os
+import socket
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+from urllib.parse import urlparse
+
+# Files written to a long-lived ('keep_alive') spark cluster's directory
+CLUSTER_STATE_FILE = "spark_cluster.json"
+CLUSTER_LOG_FILE = "spark_cluster.log"
+TERMINATE_FILE = "spark_logs/spark_master_terminated.txt"
+
+
+def write_cluster_state(
+    output_path: Union[str, Path], master_url_file: Union[str, Path], num_workers: int
+) -> None:
+    """Registers a running spark cluster so that pipeline runs can attach to it.
+
+    The master URL file holds the master URL on its first line and, if known,
+    the URL of the master's web UI on its second.
+    """
+    with open(master_url_file) as f:
+        lines = f.read().splitlines() + [""]
+    state = {
+        "master_url": lines[0].strip(),
+        "web_ui_url": lines[1].strip(),
+        "num_workers": num_workers,
+        "host": socket.gethostname(),
+        "pid": os.getpid(),
+        "started": time.time(),
+    }
+    with open(output_path, "w") as f:
+        json.dump(state, f, indent=2)
+
+
+def remove_cluster_state(cluster_dir: Union[str, Path]) -> None:
+    """Deregisters a spark cluster once it has shut down."""
+    (Path(cluster_dir) / CLUSTER_STATE_FILE).unlink(missing_ok=True)
+
+
+def get_cluster_state(cluster_dir: Union[str, Path]) -> Optional[Dict[str, Any]]:
+    """Returns the registered state of the spark cluster, if any."""
+    state_file = Path(cluster_dir) / CLUSTER_STATE_FILE
+    if not state_file.is_file():
+        return None
+    try:
+        with open(state_file) as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        # The state file is still being written
+        return None
+
+
+def is_cluster_healthy(cluster_dir: Union[str, Path]) -> bool:
+    """Whether a registered spark cluster is running, has not been asked to stop
+    and is accepting connections at its master URL."""
+    state = get_cluster_state(cluster_dir)
+    if not state or (Path(cluster_dir) / TERMINATE_FILE).exists():
+        return False
+    return is_master_reachable(state["master_url"])
+
+
+def is_master_reachable(master_url: str, timeout: float = 2) -> bool:
+    """Whether a connection can be opened to a spark master, e.g. 'spark://host:7077'."""
+    url = urlparse(master_url)
+    if not url.hostname or not url.port:
+        return False
+    try:
+        with socket.create_connection((url.hostname, url.port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+def write_master_url(cluster_dir: Union[str, Path], output_path: Union[str, Path]) -> None:
+    """Writes the master URL of a running long-lived spark cluster to a file so
+    that implementations can attach to it."""
+    if not is_cluster_healthy(cluster_dir):
+        raise RuntimeError(f"No running spark cluster found in {cluster_dir}.")
+    state = get_cluster_state(cluster_dir)
+    with open(output_path, "w") as f:
+        f.write(f"{state['master_url']}\n{state.get('web_ui_url', '')}\n")
+
+
+def stop_cluster(cluster_dir: Union[str, Path]) -> bool:
+    """Asks a long-lived spark cluster to shut down. Returns whether there was
+    a registered cluster to stop."""
+    if get_cluster_state(cluster_dir) is None:
+        return False
+    terminate_file = Path(cluster_dir) / TERMINATE_FILE
+    terminate_file.parent.mkdir(parents=True, exist_ok=True)
+    terminate_file.touch()
+    return True
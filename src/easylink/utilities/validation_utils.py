@@ -1,23 +1,400 @@
+import functools
+import json
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple, Union
 
-import pandas as pd
+import pyarrow as pa
+from pyarrow import dataset as ds
 from pyarrow import parquet as pq
 
+from easylink.utilities.data_utils import DATASET_COMPLETE_MARKER
 
-def validate_input_file_dummy(filepath: str) -> None:
-    extension = Path(filepath).suffix
-    if extension == ".parquet":
-        output_columns = set(pq.ParquetFile(filepath).schema.names)
-    elif extension == ".csv":
-        output_columns = set(pd.read_csv(filepath).columns)
-    else:
-        raise NotImplementedError(
-            f"Data file type {extension} is not supported. Convert to Parquet or CSV instead"
+# Families of Arrow types that a ColumnSpec's dtype can refer to; any other dtype
+# must match the Arrow type's string representation exactly, e.g. "int32"
+DTYPE_FAMILIES = {
+    "integer": pa.types.is_integer,
+    "floating": pa.types.is_floating,
+    "string": lambda t: pa.types.is_string(t) or pa.types.is_large_string(t),
+    "boolean": pa.types.is_boolean,
+    "timestamp": pa.types.is_timestamp,
+    "date": pa.types.is_date,
+}
+
+
+@dataclass(frozen=True)
+class ColumnSpec:
+    """A column that a data file is required to have.
+
+    Parameters:
+    name: Name of the column
+    dtype: Required type of the column, either one of DTYPE_FAMILIES or an exact
+        Arrow type or alias, e.g. "int64". Dictionary-encoded (categorical) columns are
+        checked on their value type. None allows any type.
+    nullable: Whether the column may contain nulls
+    """
+
+    name: str
+    dtype: Optional[str] = None
+    nullable: bool = True
+
+
+@dataclass(frozen=True)
+class TableSchema:
+    """A declarative validator for an input slot.
+
+    A TableSchema is called with a file path like any other validator. It is
+    checked using file metadata (parquet footers and row group statistics, or
+    Arrow IPC record batch headers) so that data is only decoded when the
+    metadata cannot tell: a non-nullable column without null count statistics
+    (e.g. in a CSV file, or a parquet file written without statistics) has that
+    one column scanned for nulls. The types and number of rows of CSV files are
+    not checked.
+
+    Parameters:
+    name: Name under which the schema is registered in TABLE_SCHEMAS
+    columns: Required columns
+    min_rows: Minimum number of rows, if any
+    max_rows: Maximum number of rows, if any
+    """
+
+    name: str
+    columns: Tuple[ColumnSpec, ...]
+    min_rows: Optional[int] = None
+    max_rows: Optional[int] = None
+
+    def __call__(self, filepath: str) -> None:
+        summary = _summarize(filepath)
+        missing_columns = {column.name for column in self.columns} - set(summary.types)
+        if missing_columns:
+            raise LookupError(
+                f"Data file {filepath} is missing required column(s) {missing_columns}"
+            )
+        errors = []
+        for column in self.columns:
+            dtype = summary.types[column.name]
+            if column.dtype and dtype is not None and not _matches_dtype(dtype, column.dtype):
+                errors.append(
+                    f"column '{column.name}' has type {dtype} but must be {column.dtype}"
+                )
+            if column.nullable:
+                continue
+            null_count = summary.null_counts.get(column.name)
+            if null_count is None:
+                null_count = _count_nulls(filepath, column.name)
+            if null_count:
+                errors.append(f"column '{column.name}' has {null_count} null value(s)")
+        if summary.num_rows is not None:
+            if self.min_rows is not None and summary.num_rows < self.min_rows:
+                errors.append(
+                    f"has {summary.num_rows} rows but must have at least {self.min_rows}"
+                )
+            if self.max_rows is not None and summary.num_rows > self.max_rows:
+                errors.append(
+                    f"has {summary.num_rows} rows but must have at most {self.max_rows}"
+                )
+        if errors:
+            raise ValueError(
+                f"Data file {filepath} does not match the '{self.name}' schema: "
+                + "; ".join(errors)
+            )
+
+
+TABLE_SCHEMAS: Dict[str, TableSchema] = {}
+
+
+def register_schema(schema: TableSchema) -> TableSchema:
+    """Registers a table schema so that validation rules can look it up by name."""
+    if schema.name in TABLE_SCHEMAS and TABLE_SCHEMAS[schema.name] != schema:
+        raise ValueError(
+            f"A different table schema named '{schema.name}' is already registered."
         )
+    TABLE_SCHEMAS[schema.name] = schema
+    return schema
+
+
+def get_schema(name: str) -> TableSchema:
+    """Returns the registered table schema of the given name."""
+    return TABLE_SCHEMAS[name]
+
+
+CENSUS_SCHEMA = register_schema(
+    TableSchema(
+        name="census",
+        columns=(
+            ColumnSpec("record_id", "integer", nullable=False),
+            ColumnSpec("first_name", "string"),
+            ColumnSpec("middle_initial", "string"),
+            ColumnSpec("last_name", "string"),
+            ColumnSpec("date_of_birth", "string"),
+            ColumnSpec("street_number", "string"),
+            ColumnSpec("street_name", "string"),
+            ColumnSpec("unit_number", "string"),
+            ColumnSpec("city", "string"),
+            ColumnSpec("state", "string"),
+            ColumnSpec("zipcode", "string"),
+        ),
+        min_rows=1,
+    )
+)
+
+REFERENCE_FILE_SCHEMA = register_schema(
+    TableSchema(
+        name="reference_file",
+        columns=(
+            ColumnSpec("record_id", "integer", nullable=False),
+            ColumnSpec("pik", "integer", nullable=False),
+            ColumnSpec("first_name", "string"),
+            ColumnSpec("middle_initial", "string"),
+            ColumnSpec("last_name", "string"),
+            ColumnSpec("date_of_birth", "string"),
+            ColumnSpec("mailing_address_street_number", "string"),
+            ColumnSpec("mailing_address_street_name", "string"),
+            ColumnSpec("mailing_address_unit_number", "string"),
+            ColumnSpec("mailing_address_city", "string"),
+            ColumnSpec("mailing_address_state", "string"),
+            ColumnSpec("mailing_address_zipcode", "string"),
+        ),
+        min_rows=1,
+    )
+)
+
+GROUND_TRUTH_SCHEMA = register_schema(
+    TableSchema(
+        name="ground_truth",
+        columns=(
+            ColumnSpec("record_id", "integer", nullable=False),
+            ColumnSpec("simulant_id", nullable=False),
+        ),
+        min_rows=1,
+    )
+)
+
+# Intermediate data of the pvs_like pipeline schema
+PVS_LIKE_RECORDS_SCHEMA = register_schema(
+    TableSchema(
+        name="pvs_like_records",
+        columns=(
+            ColumnSpec("record_id", "integer", nullable=False),
+            ColumnSpec("dataset_name", "string", nullable=False),
+            ColumnSpec("pik", "integer"),
+            ColumnSpec("first_name", "string"),
+            ColumnSpec("middle_initial", "string"),
+            ColumnSpec("last_name", "string"),
+            ColumnSpec("date_of_birth", "string"),
+            ColumnSpec("street_number", "string"),
+            ColumnSpec("street_name", "string"),
+            ColumnSpec("geokey", "string"),
+            ColumnSpec("zip3", "string"),
+            ColumnSpec("first_initial_cut", "string", nullable=False),
+            ColumnSpec("last_initial_cut", "string", nullable=False),
+        ),
+        min_rows=1,
+    )
+)
+
+PVS_LIKE_LINKS_SCHEMA = register_schema(
+    TableSchema(
+        name="pvs_like_links",
+        columns=(
+            ColumnSpec("pass_number", "integer", nullable=False),
+            ColumnSpec("record_id_census_2030", "integer", nullable=False),
+            ColumnSpec("record_id_reference_file", "integer", nullable=False),
+            ColumnSpec("pik", "integer", nullable=False),
+            ColumnSpec("match_probability", "floating", nullable=False),
+        ),
+    )
+)
+
+CENSUS_2030_WITH_PIKS_SCHEMA = register_schema(
+    TableSchema(
+        name="census_2030_with_piks",
+        columns=(
+            ColumnSpec("record_id", "integer", nullable=False),
+            ColumnSpec("pik", "integer"),
+        ),
+        min_rows=1,
+    )
+)
+
+
+def validate_splink_model(filepath: str) -> None:
+    """Validates a trained splink model, as saved by the pvs_like schema's train step."""
+    with open(filepath) as f:
+        try:
+            model = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Model file {filepath} is not valid JSON: {e}")
+    if not isinstance(model, dict):
+        raise ValueError(f"Model file {filepath} does not contain a JSON object")
+    missing_keys = {"splink_settings", "probability_threshold"} - set(model)
+    if missing_keys:
+        raise LookupError(f"Model file {filepath} is missing required key(s) {missing_keys}")
+
 
+def validate_input_file_dummy(filepath: str) -> None:
+    output_columns = get_columns(filepath)
     required_columns = {"foo", "bar", "counter"}
     missing_columns = required_columns - output_columns
     if missing_columns:
         raise LookupError(
             f"Data file {filepath} is missing required column(s) {missing_columns}"
         )
+
+
+def validate_batch(validations: Dict[str, Tuple[Callable, List[str]]]) -> None:
+    """Runs several named validations, each a validator and the files it validates,
+    concurrently and in-process.
+
+    Every validation is run even if others fail; failures are then raised together,
+    labelled with the name of the validation and file that failed.
+    """
+    with ThreadPoolExecutor() as executor:
+        futures = [
+            (name, file, executor.submit(validator, file))
+            for name, (validator, files) in validations.items()
+            for file in files
+        ]
+    errors = []
+    for name, file, future in futures:
+        exception = future.exception()
+        if exception is not None:
+            errors.append(f"{name} ({file}): {type(exception).__name__}: {exception}")
+    if errors:
+        raise ValueError(f"{len(errors)} input validation(s) failed:\n" + "\n".join(errors))
+
+
+def get_columns(filepath: Union[str, Path]) -> Set[str]:
+    """Returns the column names of a data file.
+
+    Only the file's schema is read (i.e. parquet footer metadata, the Arrow IPC
+    schema message or the first line of a CSV) and results are cached on the
+    file's path, size and modification time, so this is cheap even for very
+    large files and for files that are validated more than once.
+    """
+    return set(_summarize(filepath).types)
+
+
+@dataclass(frozen=True)
+class _TableSummary:
+    """What can be learned about a data file without decoding its data.
+
+    Types are None for CSV files, as are the number of rows; null counts are only
+    present for columns whose statistics were written.
+    """
+
+    types: Dict[str, Optional[pa.DataType]]
+    num_rows: Optional[int]
+    null_counts: Dict[str, int]
+
+
+def _summarize(filepath: Union[str, Path]) -> _TableSummary:
+    stat = Path(filepath).stat()
+    return _get_summary(str(Path(filepath).resolve()), stat.st_size, stat.st_mtime_ns)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_summary(filepath: str, size: int, mtime_ns: int) -> _TableSummary:
+    # NOTE: size and mtime_ns are unused but key the cache
+    extension = Path(filepath).suffix
+    if Path(filepath).is_dir():
+        # A partitioned parquet dataset
+        if not (Path(filepath) / DATASET_COMPLETE_MARKER).exists():
+            raise FileNotFoundError(
+                f"Data directory {filepath} is missing its {DATASET_COMPLETE_MARKER} "
+                "marker and so may be incomplete"
+            )
+        dataset = ds.dataset(filepath, format="parquet")
+        return _summarize_parquet(
+            dataset.schema, [pq.read_metadata(file) for file in dataset.files]
+        )
+    elif extension == ".parquet":
+        metadata = pq.read_metadata(filepath)
+        return _summarize_parquet(metadata.schema.to_arrow_schema(), [metadata])
+    elif extension == ".arrow":
+        with pa.memory_map(filepath) as source:
+            reader = pa.ipc.open_file(source)
+            # Record batches are memory-mapped, so only their headers are read
+            batches = [reader.get_batch(i) for i in range(reader.num_record_batches)]
+            return _TableSummary(
+                types={field.name: field.type for field in reader.schema},
+                num_rows=sum(batch.num_rows for batch in batches),
+                null_counts={
+                    name: sum(batch.column(name).null_count for batch in batches)
+                    for name in reader.schema.names
+                },
+            )
+    elif extension == ".csv":
+        # pandas is slow to import and only needed for CSVs
+        import pandas as pd
+
+        return _TableSummary(
+            types={name: None for name in pd.read_csv(filepath, nrows=0).columns},
+            num_rows=None,
+            null_counts={},
+        )
+    raise NotImplementedError(
+        f"Data file type {extension} is not supported. Convert to Parquet, Arrow or CSV instead"
+    )
+
+
+def _count_nulls(filepath: Union[str, Path], column: str) -> int:
+    """Counts the nulls in one column of a data file by reading only that column."""
+    stat = Path(filepath).stat()
+    return _get_null_count(
+        str(Path(filepath).resolve()), column, stat.st_size, stat.st_mtime_ns
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _get_null_count(filepath: str, column: str, size: int, mtime_ns: int) -> int:
+    # NOTE: size and mtime_ns are unused but key the cache
+    if Path(filepath).suffix == ".csv":
+        # pandas is slow to import and only needed for CSVs
+        import pandas as pd
+
+        return int(pd.read_csv(filepath, usecols=[column])[column].isna().sum())
+    # Parquet files and directories; Arrow IPC null counts are always known
+    return (
+        ds.dataset(filepath, format="parquet")
+        .to_table(columns=[column])
+        .column(column)
+        .null_count
+    )
+
+
+def _summarize_parquet(schema: pa.Schema, metadatas: List[pq.FileMetaData]) -> _TableSummary:
+    """Summarizes parquet file(s) from their footers' row group statistics."""
+    null_counts = {}
+    incomplete = set()
+    for metadata in metadatas:
+        for i in range(metadata.num_row_groups):
+            row_group = metadata.row_group(i)
+            for j in range(row_group.num_columns):
+                column = row_group.column(j)
+                name = column.path_in_schema
+                statistics = column.statistics
+                if statistics is None or not statistics.has_null_count:
+                    incomplete.add(name)
+                    continue
+                null_counts[name] = null_counts.get(name, 0) + statistics.null_count
+    return _TableSummary(
+        types={field.name: field.type for field in schema},
+        num_rows=sum(metadata.num_rows for metadata in metadatas),
+        null_counts={
+            name: count for name, count in null_counts.items() if name not in incomplete
+        },
+    )
+
+
+def _matches_dtype(dtype: pa.DataType, required: str) -> bool:
+    if pa.types.is_dictionary(dtype):
+        dtype = dtype.value_type
+    if required in DTYPE_FAMILIES:
+        return DTYPE_FAMILIES[required](dtype)
+    try:
+        # Resolves aliases, e.g. "float64" for "double"
+        return dtype == pa.type_for_alias(required)
+    except ValueError:
+        return str(dtype) == required
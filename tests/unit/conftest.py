@@ -6,6 +6,29 @@ import pytest
 import yaml
 
 from easylink.configuration import Config, load_params_from_specification
+from easylink.implementation import IMPLEMENTATION_REGISTRY
+
+
+@pytest.fixture(autouse=True)
+def clear_implementation_registry():
+    """Implementation metadata is only loaded once per process; clear it around each
+    test so that tests mocking it (e.g. by patching load_yaml) see their mocks."""
+    IMPLEMENTATION_REGISTRY.clear()
+    yield
+    IMPLEMENTATION_REGISTRY.clear()
+
+
+@pytest.fixture
+def mock_implementation_metadata(mocker):
+    """Returns a function that replaces the implementation metadata, e.g. with a
+    modified copy of it."""
+
+    def _mock_implementation_metadata(metadata: Dict) -> None:
+        mocker.patch("easylink.implementation.load_yaml", return_value=metadata)
+        IMPLEMENTATION_REGISTRY.clear()
+
+    return _mock_implementation_metadata
+
 
 ENV_CONFIG_DICT = {
     "minimum": {
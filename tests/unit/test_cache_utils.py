@@ -0,0 +1,190 @@
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+from easylink.configuration import Config
+from easylink.pipeline import Pipeline
+from easylink.utilities import cache_utils
+from easylink.utilities.cache_utils import (
+    COMPLETE_MARKER,
+    DIGESTS_DIR,
+    OUTPUTS_DIR,
+    PIPELINES_DIR,
+    get_cache_entries,
+    get_cache_key,
+    get_cache_stats,
+    get_file_digest,
+    get_pipeline_cache_key,
+    load_cached_pipeline,
+    prune_cache,
+    store_cached_pipeline,
+    write_cache_key,
+)
+
+
+@pytest.fixture
+def cache_inputs(tmp_path):
+    image = tmp_path / "image.sif"
+    image.write_bytes(b"not really a container")
+    input_file = tmp_path / "input.parquet"
+    input_file.write_bytes(b"some data")
+    return image, input_file
+
+
+def _get_key(cache_dir, image, input_file, **overrides):
+    kwargs = {
+        "input_files": [str(input_file)],
+        "cache_dir": cache_dir,
+        "image_path": str(image),
+        "script_cmd": "python /dummy_step.py",
+        "envvars": {"DUMMY_CONTAINER_INCREMENT": 1},
+        "outputs": ["intermediate/foo/result.parquet"],
+    }
+    kwargs.update(overrides)
+    return get_cache_key(**kwargs)
+
+
+def _add_entry(cache_dir: Path, key: str, size: int, last_used: float) -> None:
+    entry = cache_dir / OUTPUTS_DIR / key
+    entry.mkdir(parents=True)
+    (entry / "result.parquet").write_bytes(b"0" * size)
+    marker = entry / COMPLETE_MARKER
+    marker.write_text("step_1_python_pandas\n")
+    os.utime(marker, (last_used, last_used))
+
+
+def test_get_file_digest_is_memoized(tmp_path, cache_inputs):
+    _, input_file = cache_inputs
+    digest = get_file_digest(input_file, tmp_path / "cache")
+    assert len(list((tmp_path / "cache" / DIGESTS_DIR).iterdir())) == 1
+    assert get_file_digest(input_file, tmp_path / "cache") == digest
+    assert get_file_digest(input_file) == digest
+
+
+def test_get_cache_key(tmp_path, cache_inputs):
+    image, input_file = cache_inputs
+    cache_dir = tmp_path / "cache"
+    key = _get_key(cache_dir, image, input_file)
+    assert key == _get_key(cache_dir, image, input_file)
+    assert key != _get_key(
+        cache_dir, image, input_file, envvars={"DUMMY_CONTAINER_INCREMENT": 2}
+    )
+    assert key != _get_key(cache_dir, image, input_file, script_cmd="python /other.py")
+    # Changing the input contents changes the key
+    time.sleep(0.01)
+    input_file.write_bytes(b"some other data")
+    assert key != _get_key(cache_dir, image, input_file)
+
+
+def test_get_cache_key_envvar_files(tmp_path, cache_inputs):
+    image, input_file = cache_inputs
+    cache_dir = tmp_path / "cache"
+    config_file = tmp_path / "config.yaml"
+    config_file.write_text("threshold: 0.8")
+    envvars = {"CONFIG_FILE": str(config_file), "DATA_DIR": str(tmp_path)}
+    key = _get_key(cache_dir, image, input_file, envvars=envvars)
+    # The contents of files that environment variables point to are part of the key
+    time.sleep(0.01)
+    config_file.write_text("threshold: 0.9")
+    assert key != _get_key(cache_dir, image, input_file, envvars=envvars)
+
+
+def test_write_cache_key(tmp_path, cache_inputs):
+    image, input_file = cache_inputs
+    cache_dir = tmp_path / "cache"
+    output = tmp_path / "cache_keys" / "foo.txt"
+    write_cache_key(
+        str(output),
+        [str(input_file)],
+        cache_dir,
+        str(image),
+        "python /dummy_step.py",
+        {"DUMMY_CONTAINER_INCREMENT": 1},
+        ["intermediate/foo/result.parquet"],
+    )
+    assert output.read_text() == _get_key(cache_dir, image, input_file) + "\n"
+
+
+def test_prune_cache(tmp_path):
+    cache_dir = tmp_path / "cache"
+    now = time.time()
+    _add_entry(cache_dir, "oldest", 100, now - 300)
+    _add_entry(cache_dir, "newest", 100, now)
+    _add_entry(cache_dir, "middle", 100, now - 200)
+    # An incomplete entry left behind by a killed job
+    stale = cache_dir / OUTPUTS_DIR / ".staging.abc123"
+    stale.mkdir()
+    os.utime(stale, (now - 2 * 24 * 60 * 60, now - 2 * 24 * 60 * 60))
+
+    assert [entry["key"] for entry in get_cache_entries(cache_dir)] == [
+        "oldest",
+        "middle",
+        "newest",
+    ]
+    entry_size = 100 + len("step_1_python_pandas\n")
+    evicted = prune_cache(cache_dir, max_size=entry_size + 50)
+    assert [entry["key"] for entry in evicted] == ["oldest", "middle"]
+    assert not stale.exists()
+    stats = get_cache_stats(cache_dir)
+    assert stats["num_entries"] == 1
+    assert stats["total_size"] == entry_size
+    assert stats["num_implementations"] == 1
+
+
+def test_get_pipeline_cache_key(default_config_params):
+    config_params = default_config_params
+    key = get_pipeline_cache_key(config_params)
+    # The results directory does not affect the resolved pipeline
+    assert get_pipeline_cache_key({**config_params, "results_dir": Path("elsewhere")}) == key
+    config_params["pipeline"]["step_1"]["implementation"]["fuse"] = True
+    assert get_pipeline_cache_key(config_params) != key
+
+
+def test_cached_pipeline(default_config_params, mocker, tmp_path):
+    mocker.patch("easylink.implementation.Implementation.validate", return_value={})
+    config = Config(default_config_params)
+    pipeline = Pipeline(config)
+    key = get_pipeline_cache_key(default_config_params)
+    assert load_cached_pipeline(tmp_path, key) is None
+    store_cached_pipeline(
+        tmp_path,
+        key,
+        {"schema": config.schema, "pipeline_graph": pipeline.pipeline_graph},
+    )
+
+    cached_pipeline = load_cached_pipeline(tmp_path, key)
+    mocker.patch.object(Config, "_get_schema", side_effect=AssertionError)
+    mocker.patch("easylink.pipeline.PipelineGraph", side_effect=AssertionError)
+    cached_config = Config(default_config_params, schema=cached_pipeline["schema"])
+    cached = Pipeline(cached_config, pipeline_graph=cached_pipeline["pipeline_graph"])
+    assert cached_config.schema.name == config.schema.name
+    assert (
+        cached.pipeline_graph.implementation_nodes
+        == pipeline.pipeline_graph.implementation_nodes
+    )
+    assert [
+        cached.pipeline_graph.get_input_output_files(node)
+        for node in cached.pipeline_graph.implementation_nodes
+    ] == [
+        pipeline.pipeline_graph.get_input_output_files(node)
+        for node in pipeline.pipeline_graph.implementation_nodes
+    ]
+
+
+def test_cached_pipeline_eviction(tmp_path, mocker):
+    mocker.patch.object(cache_utils, "MAX_CACHED_PIPELINES", 2)
+    for i, key in enumerate(["a", "b", "c"]):
+        store_cached_pipeline(tmp_path, key, {"snakefile": key})
+        entry = tmp_path / PIPELINES_DIR / f"{key}.pkl"
+        os.utime(entry, (i, i))
+    assert load_cached_pipeline(tmp_path, "a") is None
+    assert load_cached_pipeline(tmp_path, "c") == {"snakefile": "c"}
+    # Unreadable entries are ignored
+    (tmp_path / PIPELINES_DIR / "b.pkl").write_bytes(b"not a pickle")
+    assert load_cached_pipeline(tmp_path, "b") is None
+    assert get_cache_stats(tmp_path)["num_cached_pipelines"] == 2
+    # Clearing the cache also clears the resolved pipelines
+    prune_cache(tmp_path, max_size=0)
+    assert get_cache_stats(tmp_path)["num_cached_pipelines"] == 0
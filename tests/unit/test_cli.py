@@ -1,3 +1,6 @@
+import subprocess
+import sys
+
 import pytest
 
 
@@ -6,3 +9,30 @@ import pytest
 )
 def test_easylink_cli():
     pass
+
+
+# Generous so as not to be flaky on busy machines; importing the CLI should take a
+# fraction of this
+IMPORT_TIME_BUDGET = 2  # seconds
+
+
+def test_cli_import_time():
+    """Importing the CLI (e.g. for `easylink --help`) must not import snakemake or
+    the pipeline schemas and their validators' dependencies."""
+    script = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        "import easylink.cli\n"
+        "print(time.perf_counter() - start)\n"
+        "heavy_modules = ['snakemake', 'pandas', 'pyarrow', 'easylink.runner']\n"
+        "print(','.join(module for module in heavy_modules if module in sys.modules))\n"
+        "pipeline_schema = sys.modules['easylink.pipeline_schema']\n"
+        "print(pipeline_schema.get_pipeline_schemas.cache_info().currsize > 0)\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script], capture_output=True, text=True, check=True
+    )
+    import_time, imported_heavy_modules, schemas_built = result.stdout.splitlines()
+    assert imported_heavy_modules == ""
+    assert schemas_built == "False"
+    assert float(import_time) < IMPORT_TIME_BUDGET
@@ -12,6 +12,7 @@ from easylink.configuration import (
     _load_input_data_paths,
 )
 from easylink.pipeline_schema import PIPELINE_SCHEMAS
+from tests.unit.conftest import ENV_CONFIG_DICT
 
 
 def test__get_schema(default_config: Config) -> None:
@@ -146,6 +147,84 @@ def test_implementation_resource_requests(default_config_params, input):
     assert retrieved == expected
 
 
+@pytest.mark.parametrize(
+    "implementation_resources, expected",
+    [
+        # no overrides
+        (None, {"mem_mb": 42 * 1024, "runtime": 42 * 60, "cpus_per_task": 42}),
+        # partial overrides
+        ({"memory": 2}, {"mem_mb": 2 * 1024, "runtime": 42 * 60, "cpus_per_task": 42}),
+        # full overrides
+        (
+            {"memory": 0.5, "cpus": 8, "time_limit": 2, "partition": "long"},
+            {
+                "slurm_partition": "'long'",
+                "mem_mb": 512,
+                "runtime": 120,
+                "cpus_per_task": 8,
+            },
+        ),
+        # growth factors
+        (
+            {"memory": 2, "memory_growth_factor": 2, "time_limit_growth_factor": 1.5},
+            {
+                "mem_mb": "lambda wildcards, attempt: int(2048 * 2 ** (attempt - 1))",
+                "runtime": "lambda wildcards, attempt: int(2520 * 1.5 ** (attempt - 1))",
+                "cpus_per_task": 42,
+            },
+        ),
+    ],
+)
+def test_get_implementation_resources(
+    default_config_params, implementation_resources, expected
+):
+    config_params = default_config_params
+    config_params["environment"] = ENV_CONFIG_DICT["with_spark_and_slurm"]
+    config = Config(config_params)
+    expected = {
+        "slurm_account": "'some-account'",
+        "slurm_partition": "'some-partition'",
+        **expected,
+    }
+    assert config.get_implementation_resources(implementation_resources) == expected
+    if not implementation_resources:
+        assert config.slurm_resources == expected
+
+
+def test_get_implementation_resources_local(default_config):
+    assert default_config.get_implementation_resources({"memory": 2}) == {}
+    assert default_config.get_fused_implementation_resources([{"memory": 2}, {}]) == {}
+
+
+def test_get_fused_implementation_resources(default_config_params):
+    config_params = default_config_params
+    config_params["environment"] = ENV_CONFIG_DICT["with_spark_and_slurm"]
+    config = Config(config_params)
+    assert config.get_fused_implementation_resources(
+        [{"memory": 64, "time_limit": 1}, {"cpus": 4, "memory_growth_factor": 2}, {}]
+    ) == {
+        "slurm_account": "'some-account'",
+        "slurm_partition": "'some-partition'",
+        "mem_mb": "lambda wildcards, attempt: int(65536 * 2 ** (attempt - 1))",
+        "runtime": (1 + 42 + 42) * 60,
+        "cpus_per_task": 42,
+    }
+
+
+def test_get_core_hours(default_config_params):
+    config_params = default_config_params
+    config_params["environment"] = ENV_CONFIG_DICT["with_spark_and_slurm"]
+    config = Config(config_params)
+    assert config.get_core_hours([{}]) == 42 * 42
+    # A single job running several implementations back-to-back
+    assert config.get_core_hours([{"cpus": 64, "time_limit": 1}, {"time_limit": 2}]) == 64 * 3
+    requested_resources = config.get_requested_resources({"time_limit": 2})
+    assert (requested_resources["memory"], requested_resources["cpus"]) == (42, 42)
+    assert requested_resources["time_limit"] == 2
+    # The spark master and its workers
+    assert config.spark_core_hours == (42 + 1) * 42 * 42
+
+
 @pytest.mark.parametrize(
     "input",
     [
@@ -5,6 +5,7 @@ import pytest
 
 from easylink.utilities.data_utils import (
     copy_configuration_files_to_results_directory,
+    get_mismatched_configuration_files,
     get_results_directory,
 )
 
@@ -24,6 +25,25 @@ def test_copy_configuration_files_to_results_directory(default_config_paths, tes
     assert (output_dir / "diagnostics").exists()
 
 
+def test_get_mismatched_configuration_files(default_config_paths, test_dir):
+    output_dir = Path(test_dir + "/some/resumed/dir")
+    config_paths = [
+        default_config_paths["pipeline_specification"],
+        default_config_paths["input_data"],
+        default_config_paths["computing_environment"],
+    ]
+    assert get_mismatched_configuration_files(*config_paths, output_dir) == [
+        str(path) for path in config_paths
+    ]
+    copy_configuration_files_to_results_directory(*config_paths, output_dir)
+    assert get_mismatched_configuration_files(*config_paths, output_dir) == []
+    with open(output_dir / "input_data.yaml", "a") as f:
+        f.write("file3: some/other/file.csv\n")
+    assert get_mismatched_configuration_files(*config_paths, output_dir) == [
+        str(default_config_paths["input_data"])
+    ]
+
+
 @pytest.mark.parametrize(
     "output_dir_provided, timestamp",
     [
@@ -1,3 +1,131 @@
+import os
+
 import pytest
+import yaml
+from layered_config_tree import LayeredConfigTree
+
+import easylink.implementation as implementation_module
+from easylink.implementation import (
+    METADATA_DIRS_ENV_VAR,
+    Implementation,
+    ImplementationRegistry,
+)
+from easylink.utilities import paths
+from easylink.utilities.data_utils import load_yaml
+
+
+@pytest.mark.parametrize(
+    "metadata_resources, pipeline_resources, expected",
+    [
+        (None, None, {}),
+        ({"memory": 4, "cpus": 2}, None, {"memory": 4, "cpus": 2}),
+        (None, {"time_limit": 3}, {"time_limit": 3}),
+        (
+            {"memory": 4, "cpus": 2},
+            {"memory": 8, "partition": "long"},
+            {"memory": 8, "cpus": 2, "partition": "long"},
+        ),
+    ],
+)
+def test_resources(
+    mock_implementation_metadata, metadata_resources, pipeline_resources, expected
+):
+    metadata = load_yaml(paths.IMPLEMENTATION_METADATA)
+    if metadata_resources:
+        metadata["step_1_python_pandas"]["resources"] = metadata_resources
+    mock_implementation_metadata(metadata)
+    implementation_config = {"name": "step_1_python_pandas"}
+    if pipeline_resources:
+        implementation_config["resources"] = pipeline_resources
+    implementation = Implementation("step_1", LayeredConfigTree(implementation_config))
+    assert implementation.resources == expected
+
+
+def test_validate_resources(mocker):
+    mocker.patch(
+        "easylink.implementation.Implementation._validate_container_exists",
+        side_effect=lambda x: x,
+    )
+    implementation = Implementation(
+        "step_1",
+        LayeredConfigTree(
+            {
+                "name": "step_1_python_pandas",
+                "resources": {
+                    "memory": -1,
+                    "cpus": "two",
+                    "partition": 3,
+                    "memory_growth_factor": 0.5,
+                    "gpus": 1,
+                },
+            }
+        ),
+    )
+    assert implementation.validate() == [
+        "Resource 'memory' must be a positive number.",
+        "Resource 'cpus' must be a positive number.",
+        "Resource 'partition' must be a string.",
+        "Resource 'memory_growth_factor' must be at least 1.",
+        "Resource 'gpus' is not supported. Supported resources are: "
+        "['memory', 'cpus', 'time_limit', 'partition', "
+        "'memory_growth_factor', 'time_limit_growth_factor'].",
+    ]
+
+
+def test_validate_fuse(mocker):
+    mocker.patch(
+        "easylink.implementation.Implementation._validate_container_exists",
+        side_effect=lambda x: x,
+    )
+    implementation = Implementation(
+        "step_1",
+        LayeredConfigTree({"name": "step_1_python_pandas", "fuse": "yes"}),
+    )
+    assert implementation.validate() == ["'fuse' must be either true or false."]
+
+
+def test_implementation_registry(mocker):
+    registry = ImplementationRegistry()
+    spy = mocker.spy(implementation_module, "load_yaml")
+    assert "step_1_python_pandas" in registry
+    assert registry.get("step_1_python_pandas")["step"] == "step_1"
+    assert registry.get_step_implementations("step_1") == [
+        "step_1_python_pandas",
+        "step_1_python_pyspark_distributed",
+        "step_1_python_pyspark_distributed_dataset",
+        "step_1_r",
+    ]
+    assert registry.get_step_implementations("foo") == []
+    assert spy.call_count == 1
+
+
+def test_implementation_registry_metadata_directories(tmp_path, monkeypatch):
+    site_metadata = tmp_path / "site"
+    site_metadata.mkdir()
+    (site_metadata / "site.yaml").write_text(
+        yaml.dump({"step_1_site": {"step": "step_1", "image_path": "site.sif"}})
+    )
+    monkeypatch.setenv(METADATA_DIRS_ENV_VAR, str(site_metadata))
+    registry = ImplementationRegistry()
+    assert registry.metadata_files == [
+        paths.IMPLEMENTATION_METADATA,
+        site_metadata / "site.yaml",
+    ]
+    assert registry.get("step_1_site")["image_path"] == "site.sif"
+    assert "step_1_site" in registry.get_step_implementations("step_1")
+
+    # Modified metadata is reloaded
+    (site_metadata / "site.yaml").write_text(
+        yaml.dump({"step_1_site": {"step": "step_1", "image_path": "new_site.sif"}})
+    )
+    os.utime(site_metadata / "site.yaml", ns=(0, 0))
+    assert registry.get("step_1_site")["image_path"] == "new_site.sif"
 
-from easylink.implementation import Implementation
+    other_metadata = tmp_path / "other"
+    other_metadata.mkdir()
+    (other_metadata / "other.yaml").write_text(
+        yaml.dump({"step_1_python_pandas": {"step": "step_1"}})
+    )
+    registry.add_metadata_directory(other_metadata)
+    with pytest.raises(ValueError, match="'step_1_python_pandas' is defined in both"):
+        registry.names
@@ -0,0 +1,75 @@
+import pandas as pd
+import pytest
+
+from easylink.utilities.partition_utils import gather_files, split_files
+
+
+@pytest.mark.parametrize("extension", ["parquet", "arrow", "csv"])
+def test_split_and_gather_files(tmp_path, extension):
+    main = pd.DataFrame({"key": list(range(20)), "value": list(range(20))})
+    secondary = pd.DataFrame({"key": list(range(10, 30)), "other_value": list(range(20))})
+    input_paths = [
+        str(tmp_path / f"main.{extension}"),
+        str(tmp_path / f"secondary.{extension}"),
+    ]
+    for df, path in zip([main, secondary], input_paths):
+        if extension == "parquet":
+            df.to_parquet(path)
+        elif extension == "arrow":
+            df.to_feather(path, compression="uncompressed")
+        else:
+            df.to_csv(path, index=False)
+
+    num_partitions = 3
+    shard_paths = [
+        str(tmp_path / "shards" / f"{i}_{j}.parquet")
+        for i in range(len(input_paths))
+        for j in range(num_partitions)
+    ]
+    split_files(input_paths, "key", shard_paths)
+
+    main_shards = [pd.read_parquet(path) for path in shard_paths[:num_partitions]]
+    secondary_shards = [pd.read_parquet(path) for path in shard_paths[num_partitions:]]
+    assert sum(len(shard) for shard in main_shards) == len(main)
+    # Rows sharing a key land in the same-numbered shard of every input file
+    for main_shard, secondary_shard in zip(main_shards, secondary_shards):
+        for other_shard in secondary_shards:
+            if other_shard is not secondary_shard:
+                assert not set(main_shard.key) & set(other_shard.key)
+
+    output_paths = [str(tmp_path / f"main_gathered.{extension}")]
+    gather_files(shard_paths[:num_partitions], output_paths)
+    if extension == "parquet":
+        gathered = pd.read_parquet(output_paths[0])
+    elif extension == "arrow":
+        gathered = pd.read_feather(output_paths[0])
+    else:
+        gathered = pd.read_csv(output_paths[0])
+    pd.testing.assert_frame_equal(
+        gathered.sort_values("key").reset_index(drop=True), main, check_dtype=False
+    )
+
+
+def test_gather_datasets(tmp_path):
+    shards = []
+    for i in range(2):
+        shard = tmp_path / "shards" / str(i) / "result"
+        shard.mkdir(parents=True)
+        pd.DataFrame({"key": [i, i + 2]}).to_parquet(shard / "part-00000.parquet")
+        (shard / "_SUCCESS").touch()
+        shards.append(str(shard))
+    output = tmp_path / "result"
+    gather_files(shards, [str(output)])
+    assert (output / "_SUCCESS").exists()
+    assert sorted(p.name for p in output.glob("*.parquet")) == [
+        "part-00000-00000.parquet",
+        "part-00001-00000.parquet",
+    ]
+    assert sorted(pd.read_parquet(output).key) == [0, 1, 2, 3]
+
+
+def test_split_files_missing_key(tmp_path):
+    path = str(tmp_path / "main.parquet")
+    pd.DataFrame({"value": [1, 2]}).to_parquet(path)
+    with pytest.raises(LookupError, match="missing partition key column key"):
+        split_files([path], "key", [str(tmp_path / "shard.parquet")])
@@ -4,7 +4,9 @@ from pathlib import Path
 import pytest
 
 from easylink.configuration import Config, load_params_from_specification
+from easylink.implementation import Implementation
 from easylink.pipeline import Pipeline
+from easylink.utilities import cache_utils
 from easylink.utilities.data_utils import copy_configuration_files_to_results_directory
 
 PIPELINE_STRINGS = {
@@ -37,3 +39,104 @@ def test_build_snakefile(default_config_paths, mocker, test_dir, computing_envir
     assert len(snake_str_lines) == len(expected_lines)
     for i, expected_line in enumerate(expected_lines):
         assert snake_str_lines[i].strip() == expected_line.strip()
+
+
+def test_get_plan(default_config, mocker):
+    mocker.patch("easylink.implementation.Implementation.validate", return_value={})
+    pipeline = Pipeline(default_config)
+    assert pipeline.get_plan(set()) == {
+        "implementations": [],
+        "critical_path": [],
+        "critical_path_hours": 0,
+        "core_hours": {"implementations": 0, "spark": 0, "total": 0},
+    }
+    # Only the outputs of step_3 and step_4 need to be rebuilt
+    plan = pipeline.get_plan(
+        {
+            "intermediate/step_3_python_pandas/result.parquet",
+            "intermediate/step_4_python_pandas/result.parquet",
+        }
+    )
+    resources = default_config.environment.implementation_resources
+    assert plan == {
+        "implementations": ["step_3_python_pandas", "step_4_python_pandas"],
+        "critical_path": ["step_3_python_pandas", "step_4_python_pandas"],
+        "critical_path_hours": 2 * resources.time_limit,
+        "core_hours": {
+            "implementations": 2 * resources.cpus * resources.time_limit,
+            "spark": 0,
+            "total": 2 * resources.cpus * resources.time_limit,
+        },
+    }
+
+
+def test_get_cache_hits(default_config_params, tmp_path, mocker):
+    mocker.patch("easylink.implementation.Implementation.validate", return_value={})
+    image = tmp_path / "image.sif"
+    image.write_bytes(b"not really a container")
+    mocker.patch.object(
+        Implementation, "singularity_image_path", new_callable=mocker.PropertyMock
+    ).return_value = str(image)
+    cache_dir = tmp_path / "cache"
+    config_params = default_config_params
+    config_params["environment"]["cache"] = {"enabled": True, "directory": str(cache_dir)}
+    results_dir = tmp_path / "results"
+    pipeline = Pipeline(Config(config_params))
+    nodes = pipeline.pipeline_graph.implementation_nodes
+    pending_outputs = {
+        file
+        for node in nodes
+        for file in pipeline.pipeline_graph.get_input_output_files(node)[1]
+    }
+    assert pipeline.get_cache_hits(pending_outputs, results_dir) == []
+
+    def store_entry(node, input_paths):
+        implementation = pipeline.pipeline_graph.nodes[node]["implementation"]
+        _, output_files = pipeline.pipeline_graph.get_input_output_files(node)
+        key = cache_utils.get_cache_key(
+            input_paths,
+            cache_dir,
+            str(image),
+            implementation.script_cmd,
+            pipeline._get_environment_variables(node),
+            output_files,
+        )
+        entry = cache_dir / cache_utils.OUTPUTS_DIR / key
+        entry.mkdir(parents=True)
+        for file in output_files:
+            (entry / Path(file).name).write_text(f"{node} output")
+        (entry / cache_utils.COMPLETE_MARKER).write_text(implementation.name)
+        return [str(entry / Path(file).name) for file in output_files]
+
+    # The first implementation reads the raw input data
+    input_files, _ = pipeline.pipeline_graph.get_input_output_files(nodes[0])
+    first_outputs = store_entry(nodes[0], input_files)
+    assert pipeline.get_cache_hits(pending_outputs, results_dir) == nodes[:1]
+    # Its restored outputs in turn determine the key of the next one
+    store_entry(nodes[1], first_outputs)
+    assert pipeline.get_cache_hits(pending_outputs, results_dir) == nodes[:2]
+    # Nothing is restored from a disabled cache
+    config_params["environment"]["cache"]["enabled"] = False
+    assert Pipeline(Config(config_params)).get_cache_hits(pending_outputs, results_dir) == []
+
+
+@pytest.mark.parametrize("cache_enabled", [False, True])
+def test_fused_chains_with_cache(
+    default_config_params, tmp_path, mocker, caplog, cache_enabled
+):
+    mocker.patch("easylink.implementation.Implementation.validate", return_value={})
+    config_params = default_config_params
+    for step in ["step_1", "step_2"]:
+        config_params["pipeline"][step]["implementation"]["fuse"] = True
+    config_params["environment"]["cache"] = {
+        "enabled": cache_enabled,
+        "directory": str(tmp_path / "cache"),
+    }
+    pipeline = Pipeline(Config(config_params))
+    if cache_enabled:
+        # Cached implementations must run as separate jobs
+        assert pipeline.fused_chains == []
+        assert "Not fusing implementations" in caplog.text
+    else:
+        assert pipeline.fused_chains == [["step_1_python_pandas", "step_2_python_pandas"]]
+        assert "Not fusing implementations" not in caplog.text
@@ -1,10 +1,16 @@
+import json
 from pathlib import Path
 
 import pytest
 
 from easylink.configuration import Config
 from easylink.pipeline_graph import PipelineGraph
-from easylink.utilities.validation_utils import validate_input_file_dummy
+from easylink.utilities import paths
+from easylink.utilities.data_utils import load_yaml
+from easylink.utilities.validation_utils import (
+    CENSUS_2030_WITH_PIKS_SCHEMA,
+    validate_input_file_dummy,
+)
 
 
 def test__create_graph(default_config: Config, test_dir: str) -> None:
@@ -125,6 +131,133 @@ def test_get_input_output_files(default_config: Config, test_dir: str) -> None:
         assert output_files == expected_output_files
 
 
+def test_intermediate_format(default_config_params, test_dir: str) -> None:
+    config_params = default_config_params
+    config_params["environment"]["intermediate_format"] = "arrow"
+    # Per-implementation overrides take precedence over the environment
+    config_params["pipeline"]["step_2"]["implementation"]["intermediate_format"] = "parquet"
+    pipeline_graph = PipelineGraph(Config(config_params))
+    expected_output_files = {
+        "step_1_python_pandas": ["intermediate/step_1_python_pandas/result.arrow"],
+        "step_2_python_pandas": ["intermediate/step_2_python_pandas/result.parquet"],
+        "step_3_python_pandas": ["intermediate/step_3_python_pandas/result.arrow"],
+        # The final output is always written in its implementation's format
+        "step_4_python_pandas": ["intermediate/step_4_python_pandas/result.parquet"],
+    }
+    for node, expected in expected_output_files.items():
+        _, output_files = pipeline_graph.get_input_output_files(node)
+        assert output_files == expected
+    input_files, _ = pipeline_graph.get_input_output_files("step_4_python_pandas")
+    assert input_files == [
+        f"{test_dir}/input_data1/file1.csv",
+        "intermediate/step_3_python_pandas/result.arrow",
+    ]
+
+
+def test_get_output_directories(default_config: Config, mock_implementation_metadata) -> None:
+    metadata = load_yaml(paths.IMPLEMENTATION_METADATA)
+    metadata["step_2_python_pandas"]["outputs"]["step_2_main_output"] = "result/"
+    mock_implementation_metadata(metadata)
+    pipeline_graph = PipelineGraph(default_config)
+    assert pipeline_graph.get_output_directories("step_2_python_pandas") == [
+        "intermediate/step_2_python_pandas/result"
+    ]
+    input_files, _ = pipeline_graph.get_input_output_files("step_3_python_pandas")
+    assert input_files == ["intermediate/step_2_python_pandas/result"]
+    assert pipeline_graph.get_output_directories("step_3_python_pandas") == []
+
+
+@pytest.mark.parametrize(
+    "implementation_name, expected",
+    [
+        ("step_2_python_pyspark_distributed", []),
+        (
+            "step_2_python_pyspark_distributed_dataset",
+            ["intermediate/step_2_python_pyspark_distributed_dataset/result"],
+        ),
+    ],
+)
+def test_pyspark_output_directories(default_config_params, implementation_name, expected):
+    config_params = default_config_params
+    config_params["pipeline"]["step_2"]["implementation"]["name"] = implementation_name
+    pipeline_graph = PipelineGraph(Config(config_params))
+    assert pipeline_graph.get_output_directories(implementation_name) == expected
+
+
+def test_implementation_generations(default_config: Config) -> None:
+    pipeline_graph = PipelineGraph(default_config)
+    assert pipeline_graph.implementation_generations == [
+        ["step_1_python_pandas"],
+        ["step_2_python_pandas"],
+        ["step_3_python_pandas"],
+        ["step_4_python_pandas"],
+    ]
+
+
+@pytest.mark.parametrize(
+    "fused_steps, expected",
+    [
+        ([], []),
+        (
+            ["step_1", "step_2", "step_3", "step_4"],
+            [
+                [
+                    "step_1_python_pandas",
+                    "step_2_python_pandas",
+                    "step_3_python_pandas",
+                    "step_4_python_pandas",
+                ]
+            ],
+        ),
+        # step_3 opts out
+        (
+            ["step_1", "step_2", "step_4"],
+            [["step_1_python_pandas", "step_2_python_pandas"]],
+        ),
+        # step_4 also depends on the input data, which is fine
+        (["step_3", "step_4"], [["step_3_python_pandas", "step_4_python_pandas"]]),
+    ],
+)
+def test_get_fused_chains(default_config_params, fused_steps, expected) -> None:
+    config_params = default_config_params
+    for step in fused_steps:
+        config_params["pipeline"][step]["implementation"]["fuse"] = True
+    pipeline_graph = PipelineGraph(Config(config_params))
+    assert pipeline_graph.get_fused_chains() == expected
+
+
+def test_get_fused_chains_different_images(default_config_params) -> None:
+    config_params = default_config_params
+    for step in ["step_1", "step_2"]:
+        config_params["pipeline"][step]["implementation"]["fuse"] = True
+    config_params["pipeline"]["step_2"]["implementation"]["name"] = "step_2_r"
+    pipeline_graph = PipelineGraph(Config(config_params))
+    assert pipeline_graph.get_fused_chains() == []
+
+
+def test_get_incomplete_nodes(default_config: Config, tmp_path: Path) -> None:
+    pipeline_graph = PipelineGraph(default_config)
+    assert (
+        pipeline_graph.get_incomplete_nodes(tmp_path) == pipeline_graph.implementation_nodes
+    )
+    for node in ["step_1_python_pandas", "step_2_python_pandas", "step_4_python_pandas"]:
+        (tmp_path / "intermediate" / node).mkdir(parents=True)
+        (tmp_path / "intermediate" / node / "result.parquet").touch()
+    # step_4 is downstream of the missing step_3 output and so must be rerun
+    assert pipeline_graph.get_incomplete_nodes(tmp_path) == [
+        "step_3_python_pandas",
+        "step_4_python_pandas",
+    ]
+
+
+def test_get_critical_path(default_config: Config) -> None:
+    pipeline_graph = PipelineGraph(default_config)
+    assert pipeline_graph.get_critical_path({}) == (["step_1_python_pandas"], 0)
+    assert pipeline_graph.get_critical_path(
+        {"step_2_python_pandas": 2, "step_4_python_pandas": 1.5}
+    ) == (pipeline_graph.implementation_nodes, 3.5)
+
+
 @pytest.mark.parametrize("requires_spark", [True, False])
 def test_spark_is_required(default_config_params, requires_spark):
     config_params = default_config_params
@@ -136,3 +269,85 @@ def test_spark_is_required(default_config_params, requires_spark):
     config = Config(config_params)
     pipeline_graph = PipelineGraph(config)
     assert pipeline_graph.spark_is_required() == requires_spark
+
+
+@pytest.fixture
+def pvs_like_config(default_config_params) -> Config:
+    sample_data_dir = Path(__file__).parents[2] / "sample_data" / "pvs_like_case_study"
+    config_params = default_config_params
+    config_params["pipeline"] = {
+        step: {"implementation": {"name": f"{step}_python_splink"}}
+        for step in ["preprocess", "train", "geosearch", "namesearch", "resolve", "evaluate"]
+    }
+    config_params["input_data"] = {
+        name: sample_data_dir / f"{name}_sample.parquet"
+        for name in [
+            "census_2030",
+            "reference_file",
+            "census_2030_ground_truth",
+            "reference_file_ground_truth",
+        ]
+    }
+    return Config(config_params)
+
+
+def test_pvs_like_graph(pvs_like_config: Config) -> None:
+    assert pvs_like_config.schema.name == "pvs_like"
+    pipeline_graph = PipelineGraph(pvs_like_config)
+    # The searches only depend on preprocessing and training and so run in parallel
+    assert pipeline_graph.implementation_generations == [
+        ["preprocess_python_splink"],
+        ["train_python_splink"],
+        ["geosearch_python_splink", "namesearch_python_splink"],
+        ["resolve_python_splink"],
+        ["evaluate_python_splink"],
+    ]
+    # Each of the several slots joining the same two nodes gets its own file
+    input_files, _ = pipeline_graph.get_input_output_files("preprocess_python_splink")
+    assert input_files == [
+        str(pvs_like_config.input_data["census_2030"]),
+        str(pvs_like_config.input_data["reference_file"]),
+    ]
+    # Outputs used by several downstream implementations are only listed once
+    _, output_files = pipeline_graph.get_input_output_files("preprocess_python_splink")
+    assert output_files == ["intermediate/preprocess_python_splink/records.parquet"]
+    assert pipeline_graph.get_input_slots("resolve_python_splink") == {
+        "DUMMY_CONTAINER_CENSUS_2030_FILE_PATHS": [
+            str(pvs_like_config.input_data["census_2030"])
+        ],
+        "DUMMY_CONTAINER_GEOSEARCH_LINKS_FILE_PATHS": [
+            "intermediate/geosearch_python_splink/links.parquet"
+        ],
+        "DUMMY_CONTAINER_NAMESEARCH_LINKS_FILE_PATHS": [
+            "intermediate/namesearch_python_splink/links.parquet"
+        ],
+    }
+    assert pipeline_graph.get_results_validator() is CENSUS_2030_WITH_PIKS_SCHEMA
+    # The optional pretrained model is left out if not given
+    assert pipeline_graph.get_input_slots("train_python_splink") == {
+        "DUMMY_CONTAINER_RECORDS_FILE_PATHS": [
+            "intermediate/preprocess_python_splink/records.parquet"
+        ]
+    }
+
+
+def test_pvs_like_graph_pretrained_model(
+    pvs_like_config: Config, default_config_params, tmp_path
+) -> None:
+    model_file = tmp_path / "model.json"
+    model_file.write_text(json.dumps({"splink_settings": {}, "probability_threshold": 0.85}))
+    # The pvs_like_config fixture's specifications
+    config_params = default_config_params
+    config_params["input_data"]["pretrained_model"] = model_file
+    config = Config(config_params)
+    pipeline_graph = PipelineGraph(config)
+    assert pipeline_graph.get_input_slots("train_python_splink") == {
+        "DUMMY_CONTAINER_RECORDS_FILE_PATHS": [
+            "intermediate/preprocess_python_splink/records.parquet"
+        ],
+        "DUMMY_CONTAINER_MODEL_FILE_PATHS": [str(model_file)],
+    }
+
+
+def test_get_results_validator(default_config: Config) -> None:
+    assert PipelineGraph(default_config).get_results_validator() is validate_input_file_dummy
@@ -2,8 +2,16 @@ from pathlib import Path
 from re import match
 
 import networkx as nx
+from layered_config_tree import LayeredConfigTree
 
-from easylink.pipeline_schema import PIPELINE_SCHEMAS, PipelineSchema
+from easylink.graph_components import InputSlot, OutputSlot
+from easylink.pipeline_schema import (
+    PIPELINE_SCHEMAS,
+    PipelineSchema,
+    get_candidate_schemas,
+    get_closest_schemas,
+    get_pipeline_schemas,
+)
 from easylink.pipeline_schema_constants import ALLOWED_SCHEMA_PARAMS
 from easylink.step import Step
 
@@ -28,7 +36,10 @@ def test_schema_instantiation() -> None:
 
 
 def test_get_schemas() -> None:
-    supported_schemas = PIPELINE_SCHEMAS
+    supported_schemas = get_pipeline_schemas()
+    # Built once and still available as a module attribute
+    assert get_pipeline_schemas() is supported_schemas
+    assert PIPELINE_SCHEMAS is supported_schemas
     assert isinstance(supported_schemas, list)
     # Ensure list is populated
     assert supported_schemas
@@ -42,6 +53,23 @@ def test_get_schemas() -> None:
             assert step.name
 
 
+def test_get_candidate_schemas() -> None:
+    for schema in PIPELINE_SCHEMAS:
+        assert schema.step_keys == frozenset(schema.step_nodes)
+        pipeline_config = LayeredConfigTree({key: {} for key in schema.step_keys})
+        candidates = get_candidate_schemas(pipeline_config)
+        assert schema in candidates
+        assert all(candidate.step_keys == schema.step_keys for candidate in candidates)
+    assert get_candidate_schemas(LayeredConfigTree({"not_a_step": {}})) == []
+
+
+def test_get_closest_schemas() -> None:
+    schemas = {schema.name: schema for schema in PIPELINE_SCHEMAS}
+    pipeline_config = LayeredConfigTree({"step_1": {}, "step_2": {}, "not_a_step": {}})
+    assert get_closest_schemas(pipeline_config) == [schemas["development"]]
+    assert get_closest_schemas(LayeredConfigTree({"not_a_step": {}})) == PIPELINE_SCHEMAS
+
+
 def test_validate_input(test_dir: str) -> None:
     nodes, edges = ALLOWED_SCHEMA_PARAMS["development"]
     schema = PipelineSchema("development", nodes=nodes, edges=edges)
@@ -56,3 +84,26 @@ def test_validate_input(test_dir: str) -> None:
     assert match(
         "Data file .* is missing required column\\(s\\) .*", errors[str(file_name)][0]
     )
+
+
+def test_validate_input_collects_all_errors(test_dir: str) -> None:
+    def fail_first(file: Path) -> None:
+        raise ValueError("first problem")
+
+    def fail_second(file: Path) -> None:
+        raise ValueError("second", "problem")
+
+    nodes, edges = ALLOWED_SCHEMA_PARAMS["development"]
+    schema = PipelineSchema("development", nodes=nodes, edges=edges)
+    for _, _, edge_attrs in schema.graph.out_edges("input_data", data=True):
+        edge_attrs["input_slot"] = InputSlot("first", None, fail_first)
+    # The same file is also validated by a second slot
+    schema.graph.add_edge(
+        "input_data",
+        "step_2",
+        input_slot=InputSlot("second", None, fail_second),
+        output_slot=OutputSlot("file1"),
+    )
+    file_name = Path(test_dir) / "input_data1/file1.csv"
+    errors = schema.validate_inputs({"file1": file_name})
+    assert errors == {str(file_name): ["first problem", "('second', 'problem')"]}
@@ -0,0 +1,107 @@
+import json
+import subprocess
+
+import pytest
+
+from easylink.utilities.report_utils import (
+    RUN_REPORT_HTML,
+    RUN_REPORT_JSON,
+    SLURM_LOGS_DIR,
+    get_slurm_queue_waits,
+    read_benchmarks,
+    write_run_report,
+)
+
+BENCHMARK_HEADER = (
+    "s\th:m:s\tmax_rss\tmax_vms\tmax_uss\tmax_pss\tio_in\tio_out\tmean_load\tcpu_time"
+)
+
+
+def _write_benchmark(path, seconds, max_rss, cpu_time):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(
+        f"{BENCHMARK_HEADER}\n"
+        f"{seconds}\t0:00:0{seconds}\t{max_rss}\t1\t1\t1\tNA\tNA\t0\t{cpu_time}\n"
+    )
+
+
+@pytest.fixture
+def jobs(tmp_path):
+    _write_benchmark(tmp_path / "diagnostics/foo/foo-benchmark.tsv", 2, 100, 1)
+    for scatteritem, max_rss in [("1-of-2", 300), ("2-of-2", 200)]:
+        _write_benchmark(
+            tmp_path / f"diagnostics/bar/{scatteritem}/bar-benchmark.tsv", 4, max_rss, 6
+        )
+    job = {"memory": 1024, "cpus": 2, "time_limit": 1}
+    return {
+        "foo": {
+            "implementations": ["foo"],
+            "benchmark": "diagnostics/foo/foo-benchmark.tsv",
+            **job,
+        },
+        "bar": {
+            "implementations": ["bar"],
+            "benchmark": "diagnostics/bar/{scatteritem}/bar-benchmark.tsv",
+            **job,
+        },
+        # Never ran
+        "baz": {
+            "implementations": ["baz"],
+            "benchmark": "diagnostics/baz/baz-benchmark.tsv",
+            **job,
+        },
+    }
+
+
+def test_read_benchmarks(tmp_path, jobs):
+    benchmarks = read_benchmarks(tmp_path / jobs["bar"]["benchmark"])
+    assert [benchmark["max_rss"] for benchmark in benchmarks] == [300, 200]
+    assert benchmarks[0]["io_in"] is None
+    assert read_benchmarks(tmp_path / jobs["baz"]["benchmark"]) == []
+
+
+def test_write_run_report(tmp_path, jobs):
+    report = write_run_report(jobs, "success", tmp_path)
+    assert json.loads((tmp_path / RUN_REPORT_JSON).read_text()) == report
+    assert "<td>bar</td>" in (tmp_path / RUN_REPORT_HTML).read_text()
+    assert report["status"] == "success"
+    assert report["total_wall_time"] == 2 + 4 + 4
+    foo, bar, baz = report["jobs"]
+    assert foo["num_shards"] == 1
+    assert foo["cpu_efficiency"] == 1 / (2 * 2)
+    assert foo["memory_headroom_mb"] == 1024 - 100
+    assert foo["queue_wait"] is None
+    # The shards of a partitioned implementation
+    assert bar["num_shards"] == 2
+    assert (bar["wall_time"], bar["cpu_time"]) == (8, 12)
+    assert bar["cpu_efficiency"] == 12 / (8 * 2)
+    assert bar["memory_headroom_mb"] == 1024 - 300
+    assert baz["num_shards"] == 0
+    assert baz["wall_time"] is None
+    assert baz["requested_time_limit"] == 3600
+
+
+def test_get_slurm_queue_waits(tmp_path, mocker):
+    slurm_logs_dir = tmp_path / SLURM_LOGS_DIR
+    assert get_slurm_queue_waits(slurm_logs_dir) == {}
+    for log in ["rule_foo/101.log", "rule_bar/102_1-of-2.log", "rule_bar/103_2-of-2.log"]:
+        (slurm_logs_dir / log).parent.mkdir(parents=True, exist_ok=True)
+        (slurm_logs_dir / log).touch()
+    run = mocker.patch(
+        "easylink.utilities.report_utils.subprocess.run",
+        return_value=subprocess.CompletedProcess(
+            args=[],
+            returncode=0,
+            stdout=(
+                "foo|2024-01-01T00:00:00|2024-01-01T00:01:00\n"
+                "bar|2024-01-01T00:00:00|2024-01-01T00:00:30\n"
+                "bar|2024-01-01T00:00:00|2024-01-01T00:00:10\n"
+                "bar|2024-01-01T00:00:00|Unknown\n"
+            ),
+        ),
+    )
+    assert get_slurm_queue_waits(slurm_logs_dir) == {"foo": 60, "bar": 40}
+    assert set(run.call_args.args[0][2].split(",")) == {"101", "102", "103"}
+    # sacct is not available
+    run.side_effect = FileNotFoundError
+    assert get_slurm_queue_waits(slurm_logs_dir) == {}
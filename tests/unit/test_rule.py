@@ -1,16 +1,35 @@
+import ast
 import os
 from pathlib import Path
 from tempfile import TemporaryDirectory
 
 import pytest
 
-from easylink.rule import ImplementedRule, InputValidationRule, Rule, TargetRule
+from easylink.rule import (
+    BatchedInputValidationRule,
+    CacheKeyRule,
+    FusedImplementedRule,
+    GatherRule,
+    ImplementedRule,
+    InputValidationRule,
+    Rule,
+    ScatterRule,
+    TargetRule,
+    format_output,
+)
+from easylink.utilities.validation_utils import CENSUS_SCHEMA
 
 RULE_STRINGS = {
     "target_rule": "rule_strings/target_rule.txt",
     "implemented_rule_local": "rule_strings/implemented_rule_local.txt",
     "implemented_rule_slurm": "rule_strings/implemented_rule_slurm.txt",
+    "implemented_rule_cached": "rule_strings/implemented_rule_cached.txt",
     "validation_rule": "rule_strings/validation_rule.txt",
+    "batched_validation_rule": "rule_strings/batched_validation_rule.txt",
+    "fused_rule": "rule_strings/fused_rule.txt",
+    "cache_key_rule": "rule_strings/cache_key_rule.txt",
+    "scatter_rule": "rule_strings/scatter_rule.txt",
+    "gather_rule": "rule_strings/gather_rule.txt",
 }
 
 
@@ -102,3 +121,208 @@ def test_validation_rule_build_rule():
     assert len(rulestring_lines) == len(expected_lines)
     for i, expected_line in enumerate(expected_lines):
         assert rulestring_lines[i].strip() == expected_line.strip()
+
+
+def test_validation_rule_build_rule_table_schema():
+    rule = InputValidationRule(
+        name="foo", input=["foo"], output="baz", validator=CENSUS_SCHEMA
+    )
+    assert rule._build_rule().strip().endswith('validation_utils.get_schema("census")(f)')
+
+
+def test_batched_validation_rule_build_rule():
+    rule = BatchedInputValidationRule(
+        name="level_0",
+        validations=[
+            InputValidationRule(
+                name="foo", input=["foo", "bar"], output="step_1/foo_validator", validator=bar
+            ),
+            InputValidationRule(
+                name="baz",
+                input=["bar"],
+                output="step_2/baz_validator",
+                validator=CENSUS_SCHEMA,
+            ),
+        ],
+    )
+    file_path = Path(os.path.dirname(__file__)) / RULE_STRINGS["batched_validation_rule"]
+    with open(file_path) as expected_file:
+        expected = expected_file.read()
+    rulestring = rule._build_rule()
+    rulestring_lines = rulestring.split("\n")
+    expected_lines = expected.split("\n")
+    assert len(rulestring_lines) == len(expected_lines)
+    for i, expected_line in enumerate(expected_lines):
+        assert rulestring_lines[i].strip() == expected_line.strip()
+
+
+def test_fused_implemented_rule_build_rule():
+    rules = [
+        ImplementedRule(
+            step_name=f"{name}_step",
+            implementation_name=name,
+            input_slots={"DUMMY_CONTAINER_MAIN_INPUT_FILE_PATHS": [input_file]},
+            validations=validations,
+            output=[output_file],
+            resources=None,
+            envvars={"eggs": name},
+            diagnostics_dir=f"diagnostics/{name}",
+            image_path="Multipolarity.sif",
+            script_cmd=f"echo {name}",
+            requires_spark=False,
+        )
+        for name, input_file, validations, output_file in [
+            ("foo", "input.parquet", ["foo_validator"], "intermediate/foo/result.parquet"),
+            ("bar", "intermediate/foo/result.parquet", [], "intermediate/bar/result.parquet"),
+        ]
+    ]
+    rule = FusedImplementedRule(
+        rules=rules,
+        scratch_files=["intermediate/foo/result.parquet"],
+        validations=["foo_validator"],
+        resources={
+            "slurm_partition": "'slurmpart'",
+            "runtime": 2,
+            "mem_mb": 5120,
+            "cpus_per_task": 1337,
+        },
+    )
+    file_path = Path(os.path.dirname(__file__)) / RULE_STRINGS["fused_rule"]
+    with open(file_path) as expected_file:
+        expected = expected_file.read()
+    rulestring = rule._build_rule()
+    rulestring_lines = rulestring.split("\n")
+    expected_lines = expected.split("\n")
+    assert len(rulestring_lines) == len(expected_lines)
+    for i, expected_line in enumerate(expected_lines):
+        assert rulestring_lines[i].strip() == expected_line.strip()
+
+
+def test_implemented_rule_build_rule_cached():
+    rule = ImplementedRule(
+        step_name="foo_step",
+        implementation_name="foo",
+        input_slots={"DUMMY_CONTAINER_MAIN_INPUT_FILE_PATHS": ["foo"]},
+        validations=["bar"],
+        output=["baz"],
+        resources=None,
+        envvars={},
+        diagnostics_dir="spam",
+        image_path="Multipolarity.sif",
+        script_cmd="echo hello world",
+        requires_spark=False,
+        cache_dir="/some/cache",
+    )
+    file_path = Path(os.path.dirname(__file__)) / RULE_STRINGS["implemented_rule_cached"]
+    with open(file_path) as expected_file:
+        expected = expected_file.read()
+    rulestring = rule._build_rule()
+    rulestring_lines = rulestring.split("\n")
+    expected_lines = expected.split("\n")
+    assert len(rulestring_lines) == len(expected_lines)
+    for i, expected_line in enumerate(expected_lines):
+        assert rulestring_lines[i].strip() == expected_line.strip()
+
+
+def test_cache_key_rule_quoting():
+    script_cmd = """python -c "print('a\\tb')" """
+    rulestring = CacheKeyRule(
+        name="foo",
+        input=[],
+        output="cache_keys/foo.txt",
+        cache_dir="/some/cache",
+        image_path="Multipolarity.sif",
+        script_cmd=script_cmd,
+        envvars={},
+        outputs=["baz"],
+    )._build_rule()
+    line = next(line for line in rulestring.split("\n") if "script_cmd=" in line)
+    assert ast.literal_eval(line.strip()[len("script_cmd=") : -1]) == script_cmd
+
+
+def test_cache_key_rule_build_rule():
+    rule = CacheKeyRule(
+        name="foo",
+        input=["foo", "bar"],
+        output="cache_keys/foo.txt",
+        cache_dir="/some/cache",
+        image_path="Multipolarity.sif",
+        script_cmd="echo hello world",
+        envvars={"eggs": "coconut"},
+        outputs=["baz"],
+    )
+    file_path = Path(os.path.dirname(__file__)) / RULE_STRINGS["cache_key_rule"]
+    with open(file_path) as expected_file:
+        expected = expected_file.read()
+    rulestring = rule._build_rule()
+    rulestring_lines = rulestring.split("\n")
+    expected_lines = expected.split("\n")
+    assert len(rulestring_lines) == len(expected_lines)
+    for i, expected_line in enumerate(expected_lines):
+        assert rulestring_lines[i].strip() == expected_line.strip()
+
+
+def test_scatter_rule_build_rule():
+    rule = ScatterRule(
+        name="foo",
+        input=["foo.csv", "bar.parquet"],
+        output=["shards/{scatteritem}/0_foo.parquet", "shards/{scatteritem}/1_bar.parquet"],
+        key_column="baz",
+    )
+    file_path = Path(os.path.dirname(__file__)) / RULE_STRINGS["scatter_rule"]
+    with open(file_path) as expected_file:
+        expected = expected_file.read()
+    rulestring = rule._build_rule()
+    rulestring_lines = rulestring.split("\n")
+    expected_lines = expected.split("\n")
+    assert len(rulestring_lines) == len(expected_lines)
+    for i, expected_line in enumerate(expected_lines):
+        assert rulestring_lines[i].strip() == expected_line.strip()
+
+
+def test_gather_rule_build_rule():
+    rule = GatherRule(
+        name="foo",
+        input=["shards/{scatteritem}/result.parquet"],
+        output=["result.parquet"],
+    )
+    file_path = Path(os.path.dirname(__file__)) / RULE_STRINGS["gather_rule"]
+    with open(file_path) as expected_file:
+        expected = expected_file.read()
+    rulestring = rule._build_rule()
+    rulestring_lines = rulestring.split("\n")
+    expected_lines = expected.split("\n")
+    assert len(rulestring_lines) == len(expected_lines)
+    for i, expected_line in enumerate(expected_lines):
+        assert rulestring_lines[i].strip() == expected_line.strip()
+
+
+@pytest.mark.parametrize(
+    "output_directories, expected",
+    [
+        ([], "['foo.parquet', 'bar']"),
+        (["bar"], "['foo.parquet', directory('bar')]"),
+    ],
+)
+def test_format_output(output_directories, expected):
+    assert format_output(["foo.parquet", "bar"], output_directories) == expected
+
+
+def test_implemented_rule_directory_output():
+    rule = ImplementedRule(
+        step_name="foo_step",
+        implementation_name="foo_imp",
+        input_slots={"INPUT_ENV_VAR": ["foo"]},
+        validations=["bar"],
+        output=["intermediate/foo_imp/result"],
+        resources=None,
+        envvars={},
+        diagnostics_dir="diagnostics/foo_imp",
+        image_path="Shrek.sif",
+        script_cmd="echo hello world",
+        requires_spark=False,
+        output_directories=["intermediate/foo_imp/result"],
+    )
+    rulestring = rule._build_rule()
+    assert "output: [directory('intermediate/foo_imp/result')]" in rulestring
+    assert "export DUMMY_CONTAINER_OUTPUT_PATHS=intermediate/foo_imp/result/" in rulestring
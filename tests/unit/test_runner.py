@@ -1,11 +1,26 @@
+import errno
 import os
+import shutil
+import sys
 from pathlib import Path
 from tempfile import TemporaryDirectory
 
 import pytest
 
 from easylink.configuration import Config
-from easylink.runner import get_environment_args, get_singularity_args
+from easylink.pipeline import Pipeline
+from easylink.runner import (
+    RESUME_ERRORS_KEY,
+    get_environment_args,
+    get_singularity_args,
+    is_locked,
+    load_pipeline,
+    prepare_resume,
+    unlock_results_directory,
+    write_snakefile,
+)
+from easylink.utilities.cache_utils import PIPELINES_DIR, get_pipeline_cache_key
+from easylink.utilities.data_utils import copy_configuration_files_to_results_directory
 from easylink.utilities.paths import EASYLINK_TEMP
 from tests.unit.conftest import ENV_CONFIG_DICT
 
@@ -47,3 +62,82 @@ def test_get_environment_args_slurm(default_config_params):
         f"runtime={resources['runtime']}",
         f"cpus_per_task={resources['cpus_per_task']}",
     ]
+
+
+def test_prepare_resume(
+    default_config_params, default_config_paths, tmp_path, mocker, caplog
+):
+    mocker.patch("easylink.implementation.Implementation.validate", return_value={})
+    default_config_params["results_dir"] = tmp_path / "results"
+    config = Config(default_config_params)
+    pipeline = Pipeline(config)
+    config_paths = [
+        default_config_paths["pipeline_specification"],
+        default_config_paths["input_data"],
+        default_config_paths["computing_environment"],
+    ]
+    # Nothing to resume yet
+    with pytest.raises(SystemExit) as e:
+        prepare_resume(pipeline, *config_paths)
+    assert e.value.code == errno.EINVAL
+    assert RESUME_ERRORS_KEY in caplog.text
+    assert "Snakefile not found" in caplog.text
+
+    copy_configuration_files_to_results_directory(*config_paths, config.results_dir)
+    pipeline.build_snakefile()
+    assert prepare_resume(pipeline, *config_paths) == pipeline.snakefile_path
+
+
+@pytest.mark.parametrize("cache_enabled", [True, False])
+def test_pipeline_cache(
+    default_config_params, default_config_paths, tmp_path, mocker, monkeypatch, cache_enabled
+):
+    mocker.patch("easylink.implementation.Implementation.validate", return_value={})
+    monkeypatch.chdir(tmp_path)
+    cache_dir = tmp_path / "cache"
+    default_config_params["environment"]["cache"] = {
+        "enabled": cache_enabled,
+        "directory": str(cache_dir),
+    }
+    default_config_params["results_dir"] = tmp_path / "results"
+    copy_configuration_files_to_results_directory(
+        *list(default_config_paths.values())[:3], tmp_path / "results"
+    )
+    key = get_pipeline_cache_key(default_config_params)
+
+    # Nothing is stored by a dry run
+    pipeline, cached_pipeline = load_pipeline(default_config_params, key)
+    assert cached_pipeline is None
+    write_snakefile(pipeline, key, cached_pipeline, store=False)
+    assert not (cache_dir / PIPELINES_DIR).exists()
+
+    snakefile = write_snakefile(pipeline, key, cached_pipeline)
+    expected_snakefile = snakefile.read_text()
+    assert (cache_dir / PIPELINES_DIR / f"{key}.pkl").is_file() == cache_enabled
+
+    # A reused pipeline still gets its diagnostics directories
+    shutil.rmtree(tmp_path / "diagnostics")
+    pipeline, cached_pipeline = load_pipeline(default_config_params, key)
+    assert (cached_pipeline is not None) == cache_enabled
+    assert write_snakefile(pipeline, key, cached_pipeline).read_text() == expected_snakefile
+    for node in pipeline.pipeline_graph.implementation_nodes:
+        assert (tmp_path / "diagnostics" / node).is_dir()
+
+
+def test_is_locked(tmp_path):
+    assert not is_locked(str(tmp_path))
+    locks_dir = tmp_path / ".snakemake" / "locks"
+    locks_dir.mkdir(parents=True)
+    assert not is_locked(str(tmp_path))
+    (locks_dir / "0.input.lock").touch()
+    assert is_locked(str(tmp_path))
+
+
+@pytest.mark.parametrize("exit_code, warned", [(0, False), (1, True)])
+def test_unlock_results_directory(exit_code, warned, caplog):
+    def snake_main(argv):
+        assert argv == ["--directory", "results", "--unlock", "--quiet", "all"]
+        sys.exit(exit_code)
+
+    unlock_results_directory(snake_main, ["--directory", "results"], "results")
+    assert ("Failed to unlock results" in caplog.text) == warned
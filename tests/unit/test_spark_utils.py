@@ -0,0 +1,70 @@
+import socket
+
+import pytest
+
+from easylink.utilities.spark_utils import (
+    CLUSTER_STATE_FILE,
+    TERMINATE_FILE,
+    get_cluster_state,
+    is_cluster_healthy,
+    remove_cluster_state,
+    stop_cluster,
+    write_cluster_state,
+    write_master_url,
+)
+
+
+@pytest.fixture
+def spark_master():
+    """A listening socket standing in for a spark master."""
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        sock.listen()
+        yield f"spark://localhost:{sock.getsockname()[1]}"
+
+
+@pytest.fixture
+def cluster_dir(tmp_path, spark_master):
+    master_url_file = tmp_path / "spark_master_uri.txt"
+    master_url_file.write_text(f"{spark_master}\nhttp://localhost:4040\n")
+    write_cluster_state(tmp_path / CLUSTER_STATE_FILE, master_url_file, 3)
+    return tmp_path
+
+
+def test_get_cluster_state(cluster_dir, spark_master):
+    state = get_cluster_state(cluster_dir)
+    assert state["master_url"] == spark_master
+    assert state["web_ui_url"] == "http://localhost:4040"
+    assert state["num_workers"] == 3
+    remove_cluster_state(cluster_dir)
+    assert get_cluster_state(cluster_dir) is None
+
+
+def test_is_cluster_healthy(cluster_dir, tmp_path):
+    assert is_cluster_healthy(cluster_dir)
+    assert not is_cluster_healthy(tmp_path / "no_cluster")
+
+
+def test_is_cluster_healthy_unreachable(tmp_path):
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        port = sock.getsockname()[1]
+    master_url_file = tmp_path / "spark_master_uri.txt"
+    master_url_file.write_text(f"spark://localhost:{port}\n")
+    write_cluster_state(tmp_path / CLUSTER_STATE_FILE, master_url_file, 1)
+    assert not is_cluster_healthy(tmp_path)
+
+
+def test_write_master_url(cluster_dir, spark_master, tmp_path):
+    output = tmp_path / "master_url.txt"
+    write_master_url(cluster_dir, output)
+    assert output.read_text() == f"{spark_master}\nhttp://localhost:4040\n"
+
+
+def test_stop_cluster(cluster_dir, tmp_path):
+    assert stop_cluster(cluster_dir)
+    assert (cluster_dir / TERMINATE_FILE).exists()
+    assert not is_cluster_healthy(cluster_dir)
+    with pytest.raises(RuntimeError, match="No running spark cluster"):
+        write_master_url(cluster_dir, tmp_path / "master_url.txt")
+    assert not stop_cluster(tmp_path / "no_cluster")
@@ -0,0 +1,215 @@
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from easylink.utilities.validation_utils import (
+    CENSUS_SCHEMA,
+    GROUND_TRUTH_SCHEMA,
+    REFERENCE_FILE_SCHEMA,
+    ColumnSpec,
+    TableSchema,
+    get_columns,
+    get_schema,
+    register_schema,
+    validate_batch,
+    validate_input_file_dummy,
+    validate_splink_model,
+)
+
+
+@pytest.mark.parametrize("extension", ["csv", "parquet", "arrow"])
+def test_get_columns(tmp_path, extension):
+    filepath = tmp_path / f"data.{extension}"
+    df = pd.DataFrame({"foo": [1, 2], "bar": [3, 4]})
+    if extension == "csv":
+        df.to_csv(filepath, index=False)
+    elif extension == "parquet":
+        df.to_parquet(filepath)
+    else:
+        df.to_feather(filepath, compression="uncompressed")
+    assert get_columns(filepath) == {"foo", "bar"}
+
+
+def test_get_columns_cache(tmp_path):
+    filepath = tmp_path / "data.csv"
+    filepath.write_text("foo,bar\n1,2\n")
+    assert get_columns(filepath) == {"foo", "bar"}
+    # Modified files are re-read
+    filepath.write_text("foo,bar,counter\n1,2,3\n")
+    stat = filepath.stat()
+    os.utime(filepath, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert get_columns(filepath) == {"foo", "bar", "counter"}
+
+
+def test_get_columns_incomplete_dataset(tmp_path):
+    dataset = tmp_path / "result"
+    dataset.mkdir()
+    pd.DataFrame({"foo": [1]}).to_parquet(dataset / "part-00000.parquet")
+    with pytest.raises(FileNotFoundError, match="_SUCCESS"):
+        get_columns(dataset)
+    (dataset / "_SUCCESS").touch()
+    assert get_columns(dataset) == {"foo"}
+
+
+SCHEMA = TableSchema(
+    name="test",
+    columns=(
+        ColumnSpec("id", "integer", nullable=False),
+        ColumnSpec("name", "string"),
+        ColumnSpec("score", "float64"),
+    ),
+    min_rows=2,
+    max_rows=3,
+)
+
+
+def _write(df, filepath):
+    if filepath.suffix == ".parquet":
+        df.to_parquet(filepath)
+    elif filepath.suffix == ".arrow":
+        df.to_feather(filepath, compression="uncompressed")
+    else:
+        df.to_csv(filepath, index=False)
+
+
+@pytest.mark.parametrize("extension", ["parquet", "arrow", "csv"])
+def test_table_schema(tmp_path, extension):
+    filepath = tmp_path / f"data.{extension}"
+    df = pd.DataFrame(
+        {
+            "id": [1, 2],
+            "name": pd.Series(["a", "b"], dtype="category"),
+            "score": [0.5, 1.5],
+        }
+    )
+    _write(df, filepath)
+    SCHEMA(str(filepath))
+
+
+@pytest.mark.parametrize(
+    "df, error, match",
+    [
+        (pd.DataFrame({"id": [1, 2], "score": [0.5, 1.5]}), LookupError, "{'name'}"),
+        (
+            pd.DataFrame({"id": ["1", "2"], "name": ["a", "b"], "score": [0.5, 1.5]}),
+            ValueError,
+            "column 'id' has type .*string but must be integer",
+        ),
+        (
+            pd.DataFrame({"id": [1, None], "name": ["a", "b"], "score": [0.5, 1.5]}),
+            ValueError,
+            "column 'id' has 1 null value",
+        ),
+        (
+            pd.DataFrame({"id": [1], "name": ["a"], "score": [0.5]}),
+            ValueError,
+            "has 1 rows but must have at least 2",
+        ),
+        (
+            pd.DataFrame({"id": range(4), "name": list("abcd"), "score": [0.5] * 4}),
+            ValueError,
+            "has 4 rows but must have at most 3",
+        ),
+    ],
+)
+@pytest.mark.parametrize("extension", ["parquet", "arrow"])
+def test_table_schema_invalid(tmp_path, extension, df, error, match):
+    filepath = tmp_path / f"data.{extension}"
+    if "id" in df and df["id"].isnull().any():
+        df["id"] = df["id"].astype("Int64")
+    _write(df, filepath)
+    with pytest.raises(error, match=match):
+        SCHEMA(str(filepath))
+
+
+@pytest.mark.parametrize("extension", ["csv", "parquet"])
+def test_table_schema_nulls_without_statistics(tmp_path, extension):
+    """Non-nullable columns are scanned when their null counts are not in the metadata."""
+    filepath = tmp_path / f"data.{extension}"
+
+    def write(ids):
+        df = pd.DataFrame(
+            {"id": pd.array(ids, "Int64"), "name": ["a", "b"], "score": [0.5, 1.5]}
+        )
+        if extension == "csv":
+            df.to_csv(filepath, index=False)
+        else:
+            df.to_parquet(filepath, write_statistics=False)
+        # Make sure the file is not considered unchanged
+        stat = filepath.stat()
+        os.utime(filepath, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+
+    write([1, None])
+    with pytest.raises(ValueError, match="column 'id' has 1 null value"):
+        SCHEMA(str(filepath))
+    write([1, 2])
+    SCHEMA(str(filepath))
+
+
+def test_table_schema_dataset(tmp_path):
+    dataset = tmp_path / "result"
+    dataset.mkdir()
+    for i in range(2):
+        pd.DataFrame({"id": [i], "name": ["a"], "score": [0.5]}).to_parquet(
+            dataset / f"part-{i:05}.parquet"
+        )
+    (dataset / "_SUCCESS").touch()
+    SCHEMA(str(dataset))
+    pd.DataFrame({"id": [2, 3], "name": ["a", "b"], "score": [0.5, 1.5]}).to_parquet(
+        dataset / "part-00002.parquet"
+    )
+    with pytest.raises(ValueError, match="has 4 rows but must have at most 3"):
+        SCHEMA(str(dataset))
+
+
+def test_register_schema():
+    assert get_schema("census") is CENSUS_SCHEMA
+    assert register_schema(CENSUS_SCHEMA) is CENSUS_SCHEMA
+    with pytest.raises(ValueError, match="already registered"):
+        register_schema(TableSchema(name="census", columns=()))
+
+
+@pytest.mark.parametrize(
+    "schema, filename",
+    [
+        (CENSUS_SCHEMA, "census_2030_sample.parquet"),
+        (REFERENCE_FILE_SCHEMA, "reference_file_sample.parquet"),
+        (GROUND_TRUTH_SCHEMA, "census_2030_ground_truth_sample.parquet"),
+        (GROUND_TRUTH_SCHEMA, "reference_file_ground_truth_sample.parquet"),
+    ],
+)
+def test_case_study_schemas(schema, filename):
+    filepath = Path(__file__).parents[2] / "sample_data" / "pvs_like_case_study" / filename
+    schema(str(filepath))
+
+
+def test_validate_splink_model(tmp_path):
+    model = tmp_path / "model.json"
+    model.write_text(json.dumps({"splink_settings": {}, "probability_threshold": 0.85}))
+    validate_splink_model(str(model))
+    model.write_text(json.dumps({"splink_settings": {}}))
+    with pytest.raises(
+        LookupError, match="missing required key\\(s\\) {'probability_threshold'}"
+    ):
+        validate_splink_model(str(model))
+    model.write_text("not json")
+    with pytest.raises(ValueError, match="is not valid JSON"):
+        validate_splink_model(str(model))
+
+
+def test_validate_batch(tmp_path):
+    good, bad = tmp_path / "good.csv", tmp_path / "bad.csv"
+    good.write_text("foo,bar,counter\n1,2,3\n")
+    bad.write_text("foo\n1\n")
+    validate_batch({"step_1/main_input": (validate_input_file_dummy, [str(good)])})
+    with pytest.raises(ValueError, match="1 input validation\\(s\\) failed") as e:
+        validate_batch(
+            {
+                "step_1/main_input": (validate_input_file_dummy, [str(good)]),
+                "step_2/main_input": (validate_input_file_dummy, [str(good), str(bad)]),
+            }
+        )
+    assert f"step_2/main_input ({bad}): LookupError" in str(e.value)
@@ -282,6 +282,51 @@ def test_unsupported_container_engine(default_config_params, caplog):
     )
 
 
+def test_unsupported_validation_batching(default_config_params, caplog):
+    config_params = default_config_params
+    config_params["environment"] = {"validation_batching": "foo"}
+    with pytest.raises(SystemExit) as e:
+        Config(config_params)
+    _check_expected_validation_exit(
+        error=e,
+        caplog=caplog,
+        error_no=errno.EINVAL,
+        expected_msg={
+            ENVIRONMENT_ERRORS_KEY: {
+                "validation_batching": [
+                    "The value 'foo' is not supported. "
+                    r"Supported values are: \[slot, node, level\]."
+                ],
+            },
+        },
+    )
+
+
+def test_invalid_implementation_resources(default_config_params, caplog):
+    config_params = default_config_params
+    config_params["environment"] = {
+        "implementation_resources": {
+            "memory_growth_factor": 0.5,
+            "time_limit_growth_factor": "double",
+        }
+    }
+    with pytest.raises(SystemExit) as e:
+        Config(config_params)
+    _check_expected_validation_exit(
+        error=e,
+        caplog=caplog,
+        error_no=errno.EINVAL,
+        expected_msg={
+            ENVIRONMENT_ERRORS_KEY: {
+                "implementation_resources": [
+                    "Resource 'memory_growth_factor' must be at least 1.",
+                    "Resource 'time_limit_growth_factor' must be a positive number.",
+                ],
+            },
+        },
+    )
+
+
 def test_missing_slurm_details(default_config_params, caplog):
     config_params = default_config_params
     config_params["environment"] = {"computing_environment": "slurm"}
@@ -307,13 +352,13 @@ def test_missing_slurm_details(default_config_params, caplog):
 ############
 
 
-def test_no_container(default_config, caplog, mocker):
+def test_no_container(default_config, caplog, mocker, mock_implementation_metadata):
     metadata = load_yaml(paths.IMPLEMENTATION_METADATA)
     metadata["step_1_python_pandas"]["image_path"] = "some/path/with/no/container.sif"
     metadata["step_2_python_pandas"]["image_path"] = "some/path/with/no/container_2.sif"
     metadata["step_3_python_pandas"]["image_path"] = "some/path/with/no/container_3.sif"
     metadata["step_4_python_pandas"]["image_path"] = "some/path/with/no/container_4.sif"
-    mocker.patch("easylink.implementation.load_yaml", return_value=metadata)
+    mock_implementation_metadata(metadata)
     mocker.PropertyMock(
         "easylink.implementation.Implementation._container_engine", return_value="undefined"
     )
@@ -343,11 +388,13 @@ def test_no_container(default_config, caplog, mocker):
     )
 
 
-def test_implemenation_does_not_match_step(default_config, caplog, mocker):
+def test_implemenation_does_not_match_step(
+    default_config, caplog, mocker, mock_implementation_metadata
+):
     metadata = load_yaml(paths.IMPLEMENTATION_METADATA)
     metadata["step_1_python_pandas"]["step"] = "not-the-step-1-name"
     metadata["step_2_python_pandas"]["step"] = "not-the-step-2-name"
-    mocker.patch("easylink.implementation.load_yaml", return_value=metadata)
+    mock_implementation_metadata(metadata)
     mocker.patch(
         "easylink.implementation.Implementation._validate_container_exists",
         side_effect=lambda x: x,